@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent', '0002_alter_agenttransactionhistory_transaction_type'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agenttransactionhistory',
+            index=models.Index(fields=['agent', '-created_at', '-id'], name='agent_txn_agent_recent'),
+        ),
+    ]
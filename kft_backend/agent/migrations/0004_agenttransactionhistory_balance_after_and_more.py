@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent', '0003_agenttransactionhistory_agent_txn_agent_recent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agenttransactionhistory',
+            name='balance_after',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='agenttransactionhistory',
+            name='signed_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent', '0004_agenttransactionhistory_balance_after_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='agenttransactionhistory',
+            name='transaction_type',
+            field=models.TextField(),
+        ),
+    ]
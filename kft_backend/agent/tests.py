@@ -1,3 +1,102 @@
-from django.test import TestCase
-
-# Create your tests here.
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from custom_auth.authentication import principal_cache, token_for_user
+from consumer.models import ConsumerBalance
+from custom_auth.models import Role
+
+from .models import AgentBalance, AgentTransactionHistory
+
+
+ROW_COUNTS = (1, 100, 1000)
+
+
+@override_settings(JWT_PRINCIPAL_CACHE_TIMEOUT=60)
+class QueryBudgetTests(APITestCase):
+    """Each endpoint runs a fixed number of queries however many rows it returns."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("agent", "agent@example.com", "x")
+        Role.objects.create(user=cls.user, type="agent")
+        cls.balance = AgentBalance.objects.create(user=cls.user, balance=100)
+
+    def setUp(self):
+        cache.clear()
+        principal_cache().clear()
+        access = token_for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def grow_history(self, count):
+        existing = AgentTransactionHistory.objects.count()
+        AgentTransactionHistory.objects.bulk_create(
+            AgentTransactionHistory(agent=self.balance, amount=1, transaction_type="Test")
+            for _ in range(count - existing)
+        )
+
+    def assert_budget(self, url, budget):
+        self.client.get(url)  # caches the authenticated principal
+        for count in ROW_COUNTS:
+            with self.subTest(rows=count):
+                self.grow_history(count)
+                with self.assertNumQueries(budget):
+                    response = self.client.get(url, {"page_size": 500})
+                self.assertEqual(response.status_code, 200)
+
+    def test_profile(self):
+        self.assert_budget(reverse("agent:agent_profile"), 1)
+
+    def test_transaction_history(self):
+        self.assert_budget(reverse("agent:agent_transactions"), 2)
+
+
+class BulkCashInTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("agent", "agent@example.com", "x")
+        Role.objects.create(user=cls.user, type="agent")
+        cls.balance = AgentBalance.objects.create(user=cls.user, balance=100)
+        for name in ("first", "second"):
+            consumer = User.objects.create_user(name, f"{name}@example.com", "x")
+            ConsumerBalance.objects.create(user=consumer, balance=0)
+
+    def setUp(self):
+        cache.clear()
+        access = token_for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def cash_in(self, *amounts):
+        rows = [
+            {"consumer_email": email, "amount": amount}
+            for email, amount in zip(("first@example.com", "second@example.com"), amounts)
+        ]
+        rows.append({"consumer_email": "nobody@example.com", "amount": 1})
+        return self.client.post(reverse("agent:agent_bulk_cash_in"), {"rows": rows}, format="json")
+
+    def test_rows_are_ok_once_posted(self):
+        response = self.cash_in(30, 20)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [row["status"] for row in response.data["results"]], ["ok", "ok", "error"]
+        )
+        self.assertEqual(response.data["agent_new_balance"], Decimal("50.00"))
+        self.assertEqual(
+            sorted(ConsumerBalance.objects.values_list("balance", flat=True)),
+            [Decimal("20.00"), Decimal("30.00")],
+        )
+
+    def test_rows_fail_when_balance_is_short(self):
+        response = self.cash_in(60, 50)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [row["status"] for row in response.data["results"]],
+            ["failed", "failed", "error"],
+        )
+        self.balance.refresh_from_db()
+        self.assertEqual(self.balance.balance, 100)
+        self.assertFalse(AgentTransactionHistory.objects.exists())
@@ -1,20 +1,28 @@
-from django.urls import path
-from .views import (
-    AgentCashInView,
-    AgentUtilityPaymentView,
-    AgentTransactionHistoryView,
-    AgentProfileView,
-)
-
-app_name = "agent"
-
-urlpatterns = [
-    path("cash-in/", AgentCashInView.as_view(), name="agent_cash_in"),
-    path("pay-utility/", AgentUtilityPaymentView.as_view(), name="agent_pay_utility"),
-    path(
-        "transactions/",
-        AgentTransactionHistoryView.as_view(),
-        name="agent_transactions",
-    ),
-    path("profile/", AgentProfileView.as_view(), name="agent_profile"),
-]
+from django.urls import path
+from .views import (
+    AgentCashInView,
+    AgentBulkCashInView,
+    AgentUtilityPaymentView,
+    AgentTransactionHistoryView,
+    AgentTransactionHistoryExportView,
+    AgentProfileView,
+)
+
+app_name = "agent"
+
+urlpatterns = [
+    path("cash-in/", AgentCashInView.as_view(), name="agent_cash_in"),
+    path("cash-in/bulk/", AgentBulkCashInView.as_view(), name="agent_bulk_cash_in"),
+    path("pay-utility/", AgentUtilityPaymentView.as_view(), name="agent_pay_utility"),
+    path(
+        "transactions/",
+        AgentTransactionHistoryView.as_view(),
+        name="agent_transactions",
+    ),
+    path(
+        "transactions/export/",
+        AgentTransactionHistoryExportView.as_view(),
+        name="agent_transactions_export",
+    ),
+    path("profile/", AgentProfileView.as_view(), name="agent_profile"),
+]
@@ -1,7 +1,7 @@
-from django.contrib import admin
-from .models import *
-
-# Register your models here.
-
-admin.site.register(ConsumerBalance)
-admin.site.register(TransactionHistory)
+from django.contrib import admin
+from .models import *
+
+# Register your models here.
+
+admin.site.register(ConsumerBalance)
+admin.site.register(TransactionHistory)
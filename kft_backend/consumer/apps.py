@@ -1,6 +1,6 @@
-from django.apps import AppConfig
-
-
-class ConsumerConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
-    name = 'consumer'
+from django.apps import AppConfig
+
+
+class ConsumerConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'consumer'
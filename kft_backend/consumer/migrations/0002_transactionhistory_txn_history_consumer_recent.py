@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consumer', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transactionhistory',
+            index=models.Index(fields=['consumer', '-created_at', '-id'], name='txn_history_consumer_recent'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consumer', '0002_transactionhistory_txn_history_consumer_recent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transactionhistory',
+            name='balance_after',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='transactionhistory',
+            name='signed_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+    ]
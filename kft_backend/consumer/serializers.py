@@ -1,89 +1,155 @@
-from rest_framework import serializers
-from rest_framework.serializers import SerializerMethodField
-from django.contrib.auth.models import User
-from .models import ConsumerBalance, TransactionHistory
-from merchant.models import Product
-from agent.models import AgentBalance # Import AgentBalance
-
-
-class UserProfileSerializer(serializers.ModelSerializer):
-    
-    balance = SerializerMethodField()
-    
-    def get_balance(self,object):
-        return ConsumerBalance.objects.get(user=object).balance
-    
-
-    class Meta:
-        model = User
-        fields = ["id", "username", "email", "first_name", "last_name", "balance"]
-
-
-class TransactionHistorySerializer(serializers.ModelSerializer):
-    
-    consumer_username = serializers.CharField(
-        source="consumer.user.username", read_only=True
-    )
-
-    class Meta:
-        model = TransactionHistory
-        fields = ["id", "consumer_username", "amount", "transaction_type", "created_at"]
-
-
-class UtilityPaymentSerializer(serializers.Serializer):
-    UTILITY_TYPES = [
-        ("electricity", "Electricity"),
-        ("water", "Water"),
-        ("mobile_topup", "Mobile Top-up"),
-        ("cashout", "Cash-out to Agent"),
-    ]
-
-    utility_type = serializers.ChoiceField(choices=UTILITY_TYPES)
-    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
-    
-    meter_number = serializers.CharField(
-        max_length=50, required=False, allow_blank=True
-    )
-    phone_number = serializers.CharField(
-        max_length=20, required=False, allow_blank=True
-    )
-    agent_email = serializers.EmailField(
-        required=False, allow_blank=True
-    )
-    
-
-    def validate(self, data):
-        utility_type = data.get("utility_type")
-        amount = data.get("amount")
-
-        if amount is None or amount <= 0:
-            raise serializers.ValidationError("Amount must be a positive value.")
-
-        if utility_type == 'electricity' and not data.get('meter_number'):
-            raise serializers.ValidationError({"meter_number": "Meter number is required for electricity payments."})
-        if utility_type == 'mobile_topup' and not data.get('phone_number'):
-             raise serializers.ValidationError({"phone_number": "Phone number is required for mobile top-up."})
-        
-        if utility_type == 'cashout':
-            agent_email = data.get('agent_email')
-            if not agent_email:
-                raise serializers.ValidationError({"agent_email": "Agent email is required for cash-out."})
-            try:
-                agent_user = User.objects.get(email=agent_email)
-                if not AgentBalance.objects.filter(user=agent_user).exists():
-                    raise serializers.ValidationError({"agent_email": "Agent account not found for this email."})
-            except User.DoesNotExist:
-                raise serializers.ValidationError({"agent_email": "Agent with this email does not exist."})
-
-        return data
-
-
-class ProductPurchaseSerializer(serializers.Serializer):
-    product_id = serializers.IntegerField()
-
-    def validate_product_id(self, value):
-        try:
-            Product.objects.get(pk=value)
-        except Product.DoesNotExist:
-            raise serializers.ValidationError("Product not found.")
-        return value
+from decimal import Decimal
+
+from rest_framework import serializers
+from rest_framework.serializers import SerializerMethodField
+from django.contrib.auth.models import User
+from .models import ConsumerBalance, TransactionHistory
+from merchant.models import Product
+from agent.models import AgentBalance # Import AgentBalance
+
+
+class UserProfileSerializer(serializers.ModelSerializer):
+    
+    balance = SerializerMethodField()
+    
+    def get_balance(self,object):
+        # ConsumerProfileView annotates the balance onto the user.
+        if hasattr(object, "balance"):
+            return object.balance
+        return ConsumerBalance.objects.get(user=object).balance
+    
+
+    class Meta:
+        model = User
+        fields = ["id", "username", "email", "first_name", "last_name", "balance"]
+
+
+class TransactionHistorySerializer(serializers.ModelSerializer):
+    
+    consumer_username = serializers.CharField(
+        source="consumer.user.username", read_only=True
+    )
+
+    class Meta:
+        model = TransactionHistory
+        fields = [
+            "id",
+            "consumer_username",
+            "amount",
+            "signed_amount",
+            "balance_after",
+            "transaction_type",
+            "created_at",
+        ]
+
+
+class UtilityPaymentSerializer(serializers.Serializer):
+    UTILITY_TYPES = [
+        ("electricity", "Electricity"),
+        ("water", "Water"),
+        ("mobile_topup", "Mobile Top-up"),
+        ("cashout", "Cash-out to Agent"),
+    ]
+
+    utility_type = serializers.ChoiceField(choices=UTILITY_TYPES)
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    
+    meter_number = serializers.CharField(
+        max_length=50, required=False, allow_blank=True
+    )
+    phone_number = serializers.CharField(
+        max_length=20, required=False, allow_blank=True
+    )
+    agent_email = serializers.EmailField(
+        required=False, allow_blank=True
+    )
+
+    _agent_account = None
+
+    def validate(self, data):
+        utility_type = data.get("utility_type")
+        amount = data.get("amount")
+
+        if amount is None or amount <= 0:
+            raise serializers.ValidationError("Amount must be a positive value.")
+
+        if utility_type == 'electricity' and not data.get('meter_number'):
+            raise serializers.ValidationError({"meter_number": "Meter number is required for electricity payments."})
+        if utility_type == 'mobile_topup' and not data.get('phone_number'):
+             raise serializers.ValidationError({"phone_number": "Phone number is required for mobile top-up."})
+        
+        if utility_type == 'cashout':
+            agent_email = data.get('agent_email')
+            if not agent_email:
+                raise serializers.ValidationError({"agent_email": "Agent email is required for cash-out."})
+            agent_account = (
+                AgentBalance.objects.select_related("user")
+                .filter(user__email=agent_email)
+                .first()
+            )
+            if agent_account is None:
+                if User.objects.filter(email=agent_email).exists():
+                    raise serializers.ValidationError({"agent_email": "Agent account not found for this email."})
+                raise serializers.ValidationError({"agent_email": "Agent with this email does not exist."})
+            self._agent_account = agent_account
+
+        return data
+
+
+class ProductPurchaseSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+
+    _product = None
+
+    def validate_product_id(self, value):
+        try:
+            self._product = Product.objects.select_related("owner__user").get(pk=value)
+        except Product.DoesNotExist:
+            raise serializers.ValidationError("Product not found.")
+        return value
+
+
+CHECKOUT_MAX_ITEMS = 100
+
+# Largest amount a history row (and so a ledger posting) can hold.
+_amount_field = TransactionHistory._meta.get_field("amount")
+MAX_POSTING_AMOUNT = (
+    Decimal(10) ** (_amount_field.max_digits - _amount_field.decimal_places)
+    - Decimal(10) ** -_amount_field.decimal_places
+)
+
+
+class CheckoutItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, max_value=1000, default=1)
+
+
+class CheckoutSerializer(serializers.Serializer):
+    items = CheckoutItemSerializer(many=True, allow_empty=False, max_length=CHECKOUT_MAX_ITEMS)
+
+    def validate_items(self, value):
+        # Repeated products are merged; all products are fetched in one query.
+        quantities = {}
+        for item in value:
+            quantities[item["product_id"]] = (
+                quantities.get(item["product_id"], 0) + item["quantity"]
+            )
+        products = Product.objects.select_related("owner__user").in_bulk(list(quantities))
+        missing = [pk for pk in quantities if pk not in products]
+        if missing:
+            raise serializers.ValidationError(
+                f"Products not found: {', '.join(map(str, missing))}."
+            )
+        items = []
+        for pk, quantity in quantities.items():
+            subtotal = products[pk].price * quantity
+            if subtotal > MAX_POSTING_AMOUNT:
+                raise serializers.ValidationError(
+                    f"Subtotal for product {pk} exceeds {MAX_POSTING_AMOUNT}."
+                )
+            items.append(
+                {"product": products[pk], "quantity": quantity, "subtotal": subtotal}
+            )
+        if sum(item["subtotal"] for item in items) > MAX_POSTING_AMOUNT:
+            raise serializers.ValidationError(f"Cart total exceeds {MAX_POSTING_AMOUNT}.")
+        return items
@@ -1,3 +1,248 @@
-from django.test import TestCase
-
-# Create your tests here.
+import csv
+import io
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from custom_auth.authentication import principal_cache, token_for_user
+from custom_auth.models import Role
+from ledger.exports import EXPORT_FIELDS
+from merchant.models import MerchantBalance, MerchantTransactionHistory, Product
+
+from .models import ConsumerBalance, TransactionHistory
+
+
+ROW_COUNTS = (1, 100, 1000)
+
+
+@override_settings(JWT_PRINCIPAL_CACHE_TIMEOUT=60)
+class QueryBudgetTests(APITestCase):
+    """Each endpoint runs a fixed number of queries however many rows it returns."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("consumer", "consumer@example.com", "x")
+        Role.objects.create(user=cls.user, type="consumer")
+        cls.balance = ConsumerBalance.objects.create(user=cls.user, balance=100)
+
+    def setUp(self):
+        cache.clear()
+        principal_cache().clear()
+        access = token_for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def grow_history(self, count):
+        existing = TransactionHistory.objects.count()
+        TransactionHistory.objects.bulk_create(
+            TransactionHistory(consumer=self.balance, amount=1, transaction_type="Test")
+            for _ in range(count - existing)
+        )
+
+    def assert_budget(self, url, budget):
+        self.client.get(url)  # caches the authenticated principal
+        for count in ROW_COUNTS:
+            with self.subTest(rows=count):
+                self.grow_history(count)
+                with self.assertNumQueries(budget):
+                    response = self.client.get(url, {"page_size": 500})
+                self.assertEqual(response.status_code, 200)
+
+    def test_profile(self):
+        self.assert_budget(reverse("consumer:consumer_profile"), 1)
+
+    def test_transaction_history(self):
+        self.assert_budget(reverse("consumer:transaction_history"), 2)
+
+
+class HistoryPaginationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("consumer", "consumer@example.com", "x")
+        cls.balance = ConsumerBalance.objects.create(user=cls.user, balance=0)
+        TransactionHistory.objects.bulk_create(
+            TransactionHistory(consumer=cls.balance, amount=n, transaction_type="Test")
+            for n in range(7)
+        )
+        # Rows written by one posting share their timestamp.
+        TransactionHistory.objects.update(created_at=timezone.now() - timedelta(minutes=1))
+
+    def setUp(self):
+        cache.clear()
+        access = token_for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.url = reverse("consumer:transaction_history")
+
+    def test_pages_do_not_skip_or_repeat_tied_rows(self):
+        expected = list(
+            TransactionHistory.objects.order_by("-id").values_list("id", flat=True)
+        )
+        seen = []
+        response = self.client.get(self.url, {"page_size": 3})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            seen += [row["id"] for row in response.data]
+            if "Link" not in response:
+                break
+            # A newer posting must not shift the pages still to come.
+            TransactionHistory.objects.create(
+                consumer=self.balance, amount=1, transaction_type="Test"
+            )
+            response = self.client.get(response["Link"].split(">")[0].lstrip("<"))
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor_is_not_found(self):
+        for cursor in ("garbage", "WyJub3QtYS1kYXRlIiwgIjEiXQ==", "WzFd"):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(self.url, {"cursor": cursor})
+                self.assertEqual(response.status_code, 404)
+
+
+class HistoryExportTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("consumer", "consumer@example.com", "x")
+        cls.balance = ConsumerBalance.objects.create(user=cls.user, balance=0)
+        for day, amount in ((1, "10.00"), (2, "2.50"), (3, "4.00")):
+            row = TransactionHistory.objects.create(
+                consumer=cls.balance,
+                amount=Decimal(amount),
+                signed_amount=Decimal(amount),
+                transaction_type=f"Cash-in, day {day}",
+            )
+            row.created_at = datetime(2026, 1, day, 12, tzinfo=dt_timezone.utc)
+            row.save(update_fields=["created_at"])
+
+    def setUp(self):
+        cache.clear()
+        access = token_for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.url = reverse("consumer:transaction_history_export")
+
+    def export(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_csv(self):
+        response, body = self.export()
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertEqual(
+            response["Content-Disposition"],
+            'attachment; filename="transactions-consumer.csv"',
+        )
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(rows[0], EXPORT_FIELDS)
+        self.assertEqual([row[2] for row in rows[1:]], ["10.00", "2.50", "4.00"])
+        self.assertEqual(rows[1][1], "2026-01-01T12:00:00+00:00")
+        self.assertEqual(rows[1][5], "Cash-in, day 1")
+
+    def test_ndjson_within_dates(self):
+        response, body = self.export(output="ndjson", **{"from": "2026-01-02", "to": "2026-01-02"})
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["amount"], "2.50")
+        self.assertIsNone(rows[0]["balance_after"])
+        self.assertEqual(set(rows[0]), set(EXPORT_FIELDS))
+
+    def test_bad_parameters(self):
+        for params in ({"output": "xml"}, {"from": "yesterday"}, {"to": "2026-02-30"}):
+            with self.subTest(**params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+
+class CheckoutTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("consumer", "consumer@example.com", "x")
+        Role.objects.create(user=cls.user, type="consumer")
+        cls.balance = ConsumerBalance.objects.create(user=cls.user, balance=1000)
+        cls.products = []
+        for n in range(3):
+            merchant = User.objects.create_user(f"shop{n}", f"shop{n}@example.com", "x")
+            owner = MerchantBalance.objects.create(user=merchant, balance=0)
+            cls.products += Product.objects.bulk_create(
+                Product(name=f"Item {n}.{m}", price=n + 1, description="", owner=owner)
+                for m in range(4)
+            )
+
+    def setUp(self):
+        cache.clear()
+        access = token_for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.url = reverse("consumer:checkout")
+
+    def checkout(self, items):
+        return self.client.post(self.url, {"items": items}, format="json")
+
+    def test_cart_is_one_posting(self):
+        response = self.checkout(
+            [
+                {"product_id": self.products[0].pk, "quantity": 2},
+                {"product_id": self.products[5].pk},
+                {"product_id": self.products[0].pk},
+            ]
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["total"], Decimal("5.00"))
+        self.assertEqual(response.data["consumer_new_balance"], Decimal("995.00"))
+        self.assertEqual(TransactionHistory.objects.count(), 1)
+        self.assertEqual(
+            sorted(MerchantBalance.objects.values_list("balance", flat=True)),
+            [Decimal("0.00"), Decimal("2.00"), Decimal("3.00")],
+        )
+        self.assertEqual(MerchantTransactionHistory.objects.count(), 2)
+
+    def test_queries_do_not_grow_with_cart(self):
+        # Warm the principal cache and the throttle bucket.
+        self.checkout([{"product_id": self.products[0].pk}])
+        counts = []
+        for size in (1, 12):
+            items = [{"product_id": product.pk} for product in self.products[-size:]]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.checkout(items)
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_insufficient_balance_changes_nothing(self):
+        response = self.checkout([{"product_id": self.products[-1].pk, "quantity": 1000}])
+        self.assertEqual(response.status_code, 400)
+        self.balance.refresh_from_db()
+        self.assertEqual(self.balance.balance, 1000)
+        self.assertFalse(MerchantTransactionHistory.objects.exists())
+
+    def test_totals_must_fit_a_posting(self):
+        owner = self.products[0].owner
+        yacht, jet = Product.objects.bulk_create(
+            Product(name=name, price=Decimal("999999.99"), description="", owner=owner)
+            for name in ("Yacht", "Jet")
+        )
+        for items in (
+            [{"product_id": yacht.pk, "quantity": 1000}],
+            [{"product_id": yacht.pk, "quantity": 60}, {"product_id": jet.pk, "quantity": 60}],
+        ):
+            with self.subTest(items=items):
+                self.assertEqual(self.checkout(items).status_code, 400)
+        self.assertFalse(TransactionHistory.objects.exists())
+
+    def test_long_carts_are_described_in_full(self):
+        items = [{"product_id": product.pk} for product in self.products]
+        self.assertEqual(self.checkout(items).status_code, 200)
+        description = TransactionHistory.objects.get().transaction_type
+        for product in self.products:
+            self.assertIn(f"1 x {product.name}", description)
+
+    def test_unknown_products_are_rejected(self):
+        response = self.checkout([{"product_id": 0}, {"product_id": self.products[0].pk}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Products not found: 0.", str(response.data["items"]))
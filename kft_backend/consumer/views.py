@@ -1,230 +1,310 @@
-from rest_framework import generics, status, permissions
-from rest_framework.views import APIView
-from rest_framework.response import Response
-from django.db import transaction
-from django.shortcuts import get_object_or_404
-from merchant.models import Product, MerchantBalance, MerchantTransactionHistory
-from agent.models import AgentBalance, AgentTransactionHistory
-from django.contrib.auth.models import User
-
-from .models import ConsumerBalance, TransactionHistory
-from .serializers import (
-    UserProfileSerializer,
-    TransactionHistorySerializer,
-    UtilityPaymentSerializer,
-    ProductPurchaseSerializer,
-)
-
-# Create your views here.
-
-
-class ConsumerProfileView(generics.RetrieveAPIView):
-    """
-    Retrieve the authenticated user's profile and balance.
-    """
-
-    serializer_class = UserProfileSerializer
-    permission_classes = [permissions.IsAuthenticated]
-
-    def get_object(self):
-        return self.request.user
-
-
-class TransactionHistoryListView(generics.ListAPIView):
-    """
-    List transaction history for the authenticated user.
-    """
-
-    serializer_class = TransactionHistorySerializer
-    permission_classes = [permissions.IsAuthenticated]
-
-    def get_queryset(self):
-
-        user = self.request.user
-        consumer_balance = get_object_or_404(ConsumerBalance, user=user)
-        return TransactionHistory.objects.filter(consumer=consumer_balance).order_by(
-            "-created_at"
-        )
-
-
-class UtilityPaymentView(APIView):
-    """
-    Handle utility payments (electricity, water, mobile top-up).
-    """
-
-    permission_classes = [permissions.IsAuthenticated]
-
-    def post(self, request, *args, **kwargs):
-        serializer = UtilityPaymentSerializer(data=request.data)
-        if serializer.is_valid():
-            utility_type = serializer.validated_data["utility_type"]
-            amount = serializer.validated_data["amount"]
-            phone = serializer.validated_data.get("phone_number")
-            meter = serializer.validated_data.get("meter_number")
-            agent_email = serializer.validated_data.get("agent_email")
-
-            user = request.user
-
-            try:
-                with transaction.atomic():
-                    consumer_balance = get_object_or_404(ConsumerBalance, user=user)
-
-                    if consumer_balance.balance < amount:
-                        return Response(
-                            {"error": "Insufficient balance."},
-                            status=status.HTTP_400_BAD_REQUEST,
-                        )
-
-                    if utility_type == "cashout":
-                        agent_user = get_object_or_404(User, email=agent_email)
-                        agent_balance_account = get_object_or_404(
-                            AgentBalance, user=agent_user
-                        )
-
-                        consumer_balance.balance -= amount
-                        consumer_balance.save()
-
-                        agent_balance_account.balance += amount
-                        agent_balance_account.save()
-
-                        transaction_description = (
-                            f"Payment for Cash-out to Agent: {agent_user.email}"
-                        )
-                        success_message = (
-                            f"Cash-out to agent {agent_user.email} successful."
-                        )
-
-                        AgentTransactionHistory.objects.create(
-                            agent=agent_balance_account,
-                            amount=amount,
-                            transaction_type=transaction_description,
-                        )
-
-                    else:
-                        consumer_balance.balance -= amount
-                        consumer_balance.save()
-                        transaction_description = f"Payment: {utility_type.replace('_', ' ').title()} for {phone or meter}"
-                        success_message = f"{utility_type.replace('_', ' ').title()} payment successful."
-
-                    
-                    TransactionHistory.objects.create(
-                        consumer=consumer_balance,
-                        amount=amount,
-                        transaction_type=transaction_description,
-                    )
-
-                return Response(
-                    {
-                        "message": success_message,
-                        "current_balance": consumer_balance.balance,
-                    },
-                    status=status.HTTP_200_OK,
-                )
-
-            except ConsumerBalance.DoesNotExist:
-                return Response(
-                    {"error": "Consumer not found for this user."},
-                    status=status.HTTP_404_NOT_FOUND,
-                )
-            except (
-                User.DoesNotExist
-            ): 
-                return Response(
-                    {"error": "Agent user not found."}, status=status.HTTP_404_NOT_FOUND
-                )
-            except AgentBalance.DoesNotExist:
-                return Response(
-                    {"error": "Agent account not found."},
-                    status=status.HTTP_404_NOT_FOUND,
-                )
-            except Exception as e:
-                
-                return Response(
-                    {"error": "An error occurred during the payment process."},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                )
-
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-
-class ProductPurchaseView(APIView):
-    """
-    Handle consumer purchasing a product from a merchant.
-    """
-
-    permission_classes = [permissions.IsAuthenticated]
-
-    def post(self, request, *args, **kwargs):
-        serializer = ProductPurchaseSerializer(data=request.data)
-        if serializer.is_valid():
-            product_id = serializer.validated_data["product_id"]
-            
-
-            consumer_user = request.user
-
-            try:
-                with transaction.atomic():
-                    product = get_object_or_404(Product, pk=product_id)
-                    consumer_balance = get_object_or_404(
-                        ConsumerBalance, user=consumer_user
-                    )
-                    merchant_balance_account = product.owner
-                    total_price = product.price
-
-                    if consumer_balance.balance < total_price:
-                        return Response(
-                            {"error": "Insufficient balance to purchase this product."},
-                            status=status.HTTP_400_BAD_REQUEST,
-                        )
-
-                    consumer_balance.balance -= total_price
-                    consumer_balance.save()
-
-                    merchant_balance_account.balance += total_price
-                    merchant_balance_account.save()
-
-                    TransactionHistory.objects.create(
-                        consumer=consumer_balance,
-                        amount=total_price,
-                        transaction_type=f"Purchase: {product.name} from {merchant_balance_account.user.username}",
-                    )
-
-                    MerchantTransactionHistory.objects.create(
-                        consumer=merchant_balance_account,
-                        amount=total_price,
-                        transaction_type=f"Purchase: {product.name} from {consumer_user.username}",
-                    )
-
-                return Response(
-                    {
-                        "message": f"Successfully purchased '{product.name}'.",
-                        "consumer_new_balance": consumer_balance.balance,
-                    },
-                    status=status.HTTP_200_OK,
-                )
-            except (
-                Product.DoesNotExist
-            ): 
-                return Response(
-                    {"error": "Product not found."}, status=status.HTTP_404_NOT_FOUND
-                )
-            except ConsumerBalance.DoesNotExist:
-                return Response(
-                    {"error": "Consumer balance not found for this user."},
-                    status=status.HTTP_404_NOT_FOUND,
-                )
-            except (
-                MerchantBalance.DoesNotExist
-            ): 
-                return Response(
-                    {"error": "Merchant account for product owner not found."},
-                    status=status.HTTP_404_NOT_FOUND,
-                )
-            except Exception as e:
-                
-                return Response(
-                    {"error": f"An error occurred: {str(e)}"},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                )
-
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+from rest_framework import generics, status, permissions
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.shortcuts import get_object_or_404
+from merchant.models import Product, MerchantBalance
+from agent.models import AgentBalance
+from django.contrib.auth.models import User
+from ledger import services as ledger
+from ledger.exports import export_history
+from ledger.idempotency import idempotent
+from custom_auth.throttling import UserRateThrottle
+from kft_backend.pagination import KeysetPagination
+
+from .models import ConsumerBalance, TransactionHistory
+from .serializers import (
+    UserProfileSerializer,
+    TransactionHistorySerializer,
+    UtilityPaymentSerializer,
+    ProductPurchaseSerializer,
+    CheckoutSerializer,
+)
+
+# Create your views here.
+
+
+class ConsumerProfileView(generics.RetrieveAPIView):
+    """
+    Retrieve the authenticated user's profile and balance.
+    """
+
+    serializer_class = UserProfileSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_object(self):
+        balances = ConsumerBalance.objects.filter(user=OuterRef("pk"))
+        return get_object_or_404(
+            User.objects.annotate(balance=Subquery(balances.values("balance")[:1])),
+            pk=self.request.user.pk,
+        )
+
+
+class TransactionHistoryListView(generics.ListAPIView):
+    """
+    List transaction history for the authenticated user.
+    """
+
+    serializer_class = TransactionHistorySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+
+        user = self.request.user
+        consumer_balance = get_object_or_404(ConsumerBalance, user=user)
+        return (
+            TransactionHistory.objects.filter(consumer=consumer_balance)
+            .select_related("consumer__user")
+            .order_by("-created_at")
+        )
+
+
+class TransactionHistoryExportView(APIView):
+    """
+    Stream the authenticated user's full transaction history as CSV or NDJSON.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        consumer_balance = get_object_or_404(ConsumerBalance, user=request.user)
+        return export_history(
+            request,
+            TransactionHistory.objects.filter(consumer=consumer_balance),
+            f"transactions-{request.user.username}",
+        )
+
+
+class UtilityPaymentView(APIView):
+    """
+    Handle utility payments (electricity, water, mobile top-up).
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = "money"
+    throttle_classes = [UserRateThrottle]
+
+    @idempotent
+    def post(self, request, *args, **kwargs):
+        serializer = UtilityPaymentSerializer(data=request.data)
+        if serializer.is_valid():
+            utility_type = serializer.validated_data["utility_type"]
+            amount = serializer.validated_data["amount"]
+            phone = serializer.validated_data.get("phone_number")
+            meter = serializer.validated_data.get("meter_number")
+            agent_email = serializer.validated_data.get("agent_email")
+
+            user = request.user
+
+            try:
+                with transaction.atomic():
+                    consumer_balance = get_object_or_404(ConsumerBalance, user=user)
+
+                    if utility_type == "cashout":
+                        agent_balance_account = serializer._agent_account
+                        agent_user = agent_balance_account.user
+
+                        transaction_description = (
+                            f"Payment for Cash-out to Agent: {agent_user.email}"
+                        )
+                        success_message = (
+                            f"Cash-out to agent {agent_user.email} successful."
+                        )
+                    else:
+                        agent_balance_account = None
+                        transaction_description = f"Payment: {utility_type.replace('_', ' ').title()} for {phone or meter}"
+                        success_message = f"{utility_type.replace('_', ' ').title()} payment successful."
+
+                    ledger.transfer(
+                        amount,
+                        consumer_balance,
+                        agent_balance_account,
+                        transaction_description,
+                        transaction_description,
+                    )
+
+                return Response(
+                    {
+                        "message": success_message,
+                        "current_balance": consumer_balance.balance,
+                    },
+                    status=status.HTTP_200_OK,
+                )
+
+            except ledger.InsufficientFunds:
+                return Response(
+                    {"error": "Insufficient balance."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            except ConsumerBalance.DoesNotExist:
+                return Response(
+                    {"error": "Consumer not found for this user."},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+            except (
+                User.DoesNotExist
+            ): 
+                return Response(
+                    {"error": "Agent user not found."}, status=status.HTTP_404_NOT_FOUND
+                )
+            except AgentBalance.DoesNotExist:
+                return Response(
+                    {"error": "Agent account not found."},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+            except Exception as e:
+                
+                return Response(
+                    {"error": "An error occurred during the payment process."},
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                )
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ProductPurchaseView(APIView):
+    """
+    Handle consumer purchasing a product from a merchant.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = "money"
+    throttle_classes = [UserRateThrottle]
+
+    @idempotent
+    def post(self, request, *args, **kwargs):
+        serializer = ProductPurchaseSerializer(data=request.data)
+        if serializer.is_valid():
+            product = serializer._product
+
+            consumer_user = request.user
+
+            try:
+                with transaction.atomic():
+                    consumer_balance = get_object_or_404(
+                        ConsumerBalance, user=consumer_user
+                    )
+                    merchant_balance_account = product.owner
+                    total_price = product.price
+
+                    ledger.transfer(
+                        total_price,
+                        consumer_balance,
+                        merchant_balance_account,
+                        f"Purchase: {product.name} from {merchant_balance_account.user.username}",
+                        f"Purchase: {product.name} from {consumer_user.username}",
+                    )
+
+                return Response(
+                    {
+                        "message": f"Successfully purchased '{product.name}'.",
+                        "consumer_new_balance": consumer_balance.balance,
+                    },
+                    status=status.HTTP_200_OK,
+                )
+            except ledger.InsufficientFunds:
+                return Response(
+                    {"error": "Insufficient balance to purchase this product."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            except (
+                Product.DoesNotExist
+            ): 
+                return Response(
+                    {"error": "Product not found."}, status=status.HTTP_404_NOT_FOUND
+                )
+            except ConsumerBalance.DoesNotExist:
+                return Response(
+                    {"error": "Consumer balance not found for this user."},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+            except (
+                MerchantBalance.DoesNotExist
+            ): 
+                return Response(
+                    {"error": "Merchant account for product owner not found."},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+            except Exception as e:
+                
+                return Response(
+                    {"error": f"An error occurred: {str(e)}"},
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                )
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class CheckoutView(APIView):
+    """
+    Buy a cart of products, ``{"items": [{"product_id": 1, "quantity": 2}]}``,
+    in one ledger posting: the products are read in one query, the
+    consumer is debited once and each merchant credited once with the
+    total of its items.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = "money"
+    throttle_classes = [UserRateThrottle]
+
+    @idempotent
+    def post(self, request, *args, **kwargs):
+        serializer = CheckoutSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        items = serializer.validated_data["items"]
+
+        consumer_user = request.user
+        consumer_balance = get_object_or_404(ConsumerBalance, user=consumer_user)
+
+        lines = []
+        merchants = {}
+        for item in items:
+            product, quantity, subtotal = item["product"], item["quantity"], item["subtotal"]
+            lines.append(
+                {
+                    "product_id": product.pk,
+                    "name": product.name,
+                    "quantity": quantity,
+                    "price": product.price,
+                    "subtotal": subtotal,
+                }
+            )
+            merchant = merchants.setdefault(
+                product.owner_id, {"account": product.owner, "total": 0, "names": []}
+            )
+            merchant["total"] += subtotal
+            merchant["names"].append(f"{quantity} x {product.name}")
+        total = sum(line["subtotal"] for line in lines)
+
+        # Descriptions are stored whole, however many items the cart has.
+        summary = ", ".join(f"{line['quantity']} x {line['name']}" for line in lines)
+        entries = [ledger.debit(consumer_balance, total, f"Purchase: {summary}")]
+        for merchant in merchants.values():
+            entries.append(
+                ledger.credit(
+                    merchant["account"],
+                    merchant["total"],
+                    f"Purchase: {', '.join(merchant['names'])} from {consumer_user.username}",
+                )
+            )
+
+        try:
+            ledger.post(entries)
+        except ledger.InsufficientFunds:
+            return Response(
+                {"error": "Insufficient balance to complete this checkout."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response(
+            {
+                "message": f"Successfully purchased {len(lines)} product(s).",
+                "items": lines,
+                "total": total,
+                "consumer_new_balance": consumer_balance.balance,
+            },
+            status=status.HTTP_200_OK,
+        )
@@ -1,6 +1,6 @@
-from django.apps import AppConfig
-
-
-class CustomAdminConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
-    name = 'custom_admin'
+from django.apps import AppConfig
+
+
+class CustomAdminConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'custom_admin'
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+
+# auth_user belongs to django.contrib.auth, so its extra indexes are
+# created here. The directory searches LOWER(username) / LOWER(email) by
+# prefix; on PostgreSQL a LIKE 'abc%' can only use an index built with
+# the pattern operator class. Other backends are left without them.
+INDEXES = {
+    "auth_user_username_lower_prefix": "LOWER(username)",
+    "auth_user_email_lower_prefix": "LOWER(email)",
+}
+
+
+def create_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor not in ("postgresql", "sqlite"):
+        return
+    opclass = " varchar_pattern_ops" if vendor == "postgresql" else ""
+    for name, expression in INDEXES.items():
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON auth_user (({expression}){opclass})"
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor not in ("postgresql", "sqlite"):
+        return
+    for name in INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from rest_framework import serializers
+
+
+User = get_user_model()
+
+
+class DirectoryUserSerializer(serializers.ModelSerializer):
+    """
+    Reads roles and balances from the prefetches done by
+    UserDirectoryView, so a page costs the same number of queries
+    whatever its size.
+    """
+
+    roles = serializers.SerializerMethodField()
+    role = serializers.SerializerMethodField()
+    balance = serializers.SerializerMethodField()
+
+    def get_roles(self, obj):
+        return [role.type for role in obj.roles.all()]
+
+    def get_role(self, obj):
+        roles = self.get_roles(obj)
+        return roles[0] if roles else None
+
+    def get_balance(self, obj):
+        for accounts in (
+            obj.consumerbalance_set.all(),
+            obj.agentbalance_set.all(),
+            obj.merchantbalance_set.all(),
+        ):
+            for account in accounts:
+                return getattr(account, "total", account.balance)
+        return None
+
+    class Meta:
+        model = User
+        fields = [
+            "id",
+            "username",
+            "email",
+            "first_name",
+            "last_name",
+            "is_active",
+            "date_joined",
+            "role",
+            "roles",
+            "balance",
+        ]
@@ -1,3 +1,197 @@
-from django.test import TestCase
-
-# Create your tests here.
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from agent.models import AgentBalance
+from consumer.models import ConsumerBalance
+from custom_auth.authentication import principal_cache, token_for_user
+from custom_auth.models import Role
+from custom_auth.provisioning import provision_users
+from merchant.models import MerchantBalance, MerchantBalanceShard
+
+from .views import USER_IMPORT_MAX_ROWS, UserDirectoryView
+
+
+@override_settings(JWT_PRINCIPAL_CACHE_TIMEOUT=60)
+class UserDirectoryTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user("admin", "admin@example.com", "x")
+        Role.objects.create(user=cls.admin, type="admin")
+
+    def setUp(self):
+        cache.clear()
+        principal_cache().clear()
+        access = token_for_user(self.admin).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.url = reverse("kft_admin_api:admin_user_directory")
+
+    def add_users(self, start, count):
+        for n in range(start, start + count):
+            kind = ("consumer", "agent", "merchant")[n % 3]
+            user = User.objects.create_user(f"{kind}{n}", f"{kind}{n}@example.com", "x")
+            Role.objects.create(user=user, type=kind)
+            if kind == "consumer":
+                ConsumerBalance.objects.create(user=user, balance=n)
+            elif kind == "agent":
+                AgentBalance.objects.create(user=user, balance=n)
+            else:
+                balance = MerchantBalance.objects.create(user=user, balance=n)
+                MerchantBalanceShard.objects.create(merchant=balance, shard=0, balance=1)
+
+    def test_query_budget(self):
+        self.client.get(self.url)  # caches the authenticated principal
+        added = 0
+        for count in (3, 30, 90):
+            with self.subTest(users=count):
+                self.add_users(added, count - added)
+                added = count
+                # page, roles, consumer, agent and merchant balances
+                with self.assertNumQueries(5):
+                    response = self.client.get(self.url, {"page_size": 500})
+                self.assertEqual(len(response.data), count + 1)
+
+    def test_role_filter_and_search(self):
+        self.add_users(0, 6)
+        response = self.client.get(self.url, {"role": "merchant"})
+        self.assertEqual([user["username"] for user in response.data], ["merchant2", "merchant5"])
+        self.assertEqual(response.data[0]["roles"], ["merchant"])
+        self.assertEqual(Decimal(response.data[0]["balance"]), 3)
+
+        response = self.client.get(self.url, {"search": "AGENT"})
+        self.assertEqual([user["username"] for user in response.data], ["agent1", "agent4"])
+
+        response = self.client.get(self.url, {"search": "merchant5@"})
+        self.assertEqual([user["username"] for user in response.data], ["merchant5"])
+
+    @skipUnless(connection.vendor == "sqlite", "reads SQLite's query plan")
+    def test_search_uses_lower_indexes(self):
+        self.add_users(0, 30)
+        view = UserDirectoryView(request=Request(APIRequestFactory().get("/", {"search": "ag"})))
+        plan = view.get_queryset().explain()
+        self.assertNotIn("SCAN auth_user", plan)
+        self.assertIn("auth_user_username_lower_prefix", plan)
+        self.assertIn("auth_user_email_lower_prefix", plan)
+
+    def test_keyset_pages(self):
+        self.add_users(0, 5)
+        response = self.client.get(self.url, {"page_size": 4})
+        self.assertEqual(len(response.data), 4)
+        next_url = response["Link"].split(">")[0].lstrip("<")
+        response = self.client.get(next_url)
+        self.assertEqual([user["username"] for user in response.data], ["consumer3", "agent4"])
+        self.assertNotIn("Link", response)
+
+    def test_requires_admin(self):
+        self.add_users(0, 1)
+        user = User.objects.get(username="consumer0")
+        access = token_for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+@override_settings(
+    PROVISION_HASH_WORKERS=0,
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+)
+class UserImportTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user("admin", "admin@example.com", "x")
+        Role.objects.create(user=cls.admin, type="admin")
+
+    def setUp(self):
+        cache.clear()
+        access = token_for_user(self.admin).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.url = reverse("kft_admin_api:admin_user_import")
+
+    def row(self, username, role_type="agent", **extra):
+        return {
+            "username": username,
+            "password": "secret-pass",
+            "email": f"{username}@example.com",
+            "role_type": role_type,
+            **extra,
+        }
+
+    def test_json_import_reports_bad_rows(self):
+        rows = [
+            self.row("agent1"),
+            self.row("shop1", "merchant"),
+            self.row("agent1", email="other@example.com"),
+            self.row("admin"),
+            self.row("bad", "owner"),
+            self.row("admin2", "admin"),
+        ]
+        response = self.client.post(self.url, rows, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["created"], 3)
+        self.assertEqual([error["row"] for error in response.data["errors"]], [3, 4, 5])
+        self.assertIn("username", response.data["errors"][0]["errors"])
+        self.assertIn("role_type", response.data["errors"][2]["errors"])
+
+        agent = User.objects.get(username="agent1")
+        self.assertTrue(agent.check_password("secret-pass"))
+        self.assertEqual(AgentBalance.objects.get(user=agent).balance, 0)
+        self.assertTrue(MerchantBalance.objects.filter(user__username="shop1").exists())
+        self.assertTrue(User.objects.get(username="admin2").is_staff)
+        self.assertEqual(
+            list(Role.objects.filter(user__username="shop1").values_list("type", flat=True)),
+            ["merchant"],
+        )
+
+    def test_queries_per_chunk(self):
+        rows = [self.row(f"agent{n}") for n in range(50)]
+        # two uniqueness checks; users, roles and balances in a transaction
+        with self.assertNumQueries(7):
+            provision_users(rows, workers=0)
+        self.assertEqual(AgentBalance.objects.count(), 50)
+
+    @override_settings(PROVISION_HASH_WORKERS=2)
+    def test_api_hashes_on_threads(self):
+        with mock.patch("custom_auth.provisioning.ProcessPoolExecutor") as pool:
+            response = self.client.post(
+                self.url, [self.row("agent1"), self.row("agent2")], format="json"
+            )
+        self.assertEqual(response.data["created"], 2)
+        pool.assert_not_called()
+        self.assertTrue(User.objects.get(username="agent2").check_password("secret-pass"))
+
+    def test_row_cap(self):
+        rows = [self.row(f"agent{n}") for n in range(USER_IMPORT_MAX_ROWS + 1)]
+        response = self.client.post(self.url, rows, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(User.objects.filter(username="agent0").exists())
+
+    def test_csv_upload(self):
+        upload = StringIO(
+            "username,password,email,role_type\n"
+            "c1,secret-pass,c1@example.com,consumer\n"
+            "c2,secret-pass,not-an-email,consumer\n"
+        )
+        upload.name = "users.csv"
+        response = self.client.post(self.url, {"file": upload}, format="multipart")
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual(response.data["errors"][0]["row"], 2)
+        self.assertTrue(ConsumerBalance.objects.filter(user__username="c1").exists())
+
+    def test_command_with_process_pool(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as source:
+            source.write('[{"username": "m1", "password": "secret-pass", '
+                         '"email": "m1@example.com", "role_type": "merchant"}]')
+            source.flush()
+            out = StringIO()
+            call_command("provision_users", source.name, workers=2, stdout=out)
+        self.assertIn("Created 1 user(s), 0 row(s) failed.", out.getvalue())
+        self.assertTrue(User.objects.get(username="m1").check_password("secret-pass"))
@@ -1,8 +1,10 @@
-from django.urls import path
-from .views import UserDeleteView
-
-app_name = "kft_admin_api"
-
-urlpatterns = [
-    path("users/<int:pk>/delete/", UserDeleteView.as_view(), name="admin_user_delete"),
-]
+from django.urls import path
+from .views import UserDeleteView, UserDirectoryView, UserImportView
+
+app_name = "kft_admin_api"
+
+urlpatterns = [
+    path("users/", UserDirectoryView.as_view(), name="admin_user_directory"),
+    path("users/import/", UserImportView.as_view(), name="admin_user_import"),
+    path("users/<int:pk>/delete/", UserDeleteView.as_view(), name="admin_user_delete"),
+]
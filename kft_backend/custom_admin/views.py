@@ -1,19 +1,125 @@
-from django.shortcuts import render
-
-from rest_framework import generics, permissions
-from django.contrib.auth import get_user_model
-
-# Create your views here.
-
-User = get_user_model()
-
-
-class UserDeleteView(generics.DestroyAPIView):
-    """
-    Allows admin users to delete any user account.
-    Accessible via DELETE request to /api/admin/users/<user_id>/delete/
-    """
-
-    queryset = User.objects.all()
-    permission_classes = [permissions.IsAdminUser]
-    lookup_field = "pk" 
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.shortcuts import render
+
+from rest_framework import generics, permissions, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import F, Prefetch, Q, Sum, Value
+from django.db.models.functions import Coalesce, Lower
+
+from custom_auth.models import ROLE_TYPES
+from custom_auth.permissions import IsAdminUser
+from custom_auth.provisioning import hash_workers, provision_users
+from kft_backend.pagination import KeysetPagination
+from kft_backend.uploads import rows_from_request
+from merchant.models import MerchantBalance
+
+from .serializers import DirectoryUserSerializer
+
+# Create your views here.
+
+User = get_user_model()
+
+# Sorts after every string that starts with a given prefix.
+PREFIX_END = chr(0x10FFFF)
+
+# Every row costs a password hash inside the request; larger imports go
+# through the provision_users command.
+USER_IMPORT_MAX_ROWS = 200
+
+
+def prefix_match(field, prefix):
+    """
+    ``field`` starts with ``prefix``, written so the LOWER(...) indexes on
+    auth_user are used: PostgreSQL's pattern_ops indexes serve LIKE 'abc%',
+    but SQLite only seeks an expression index for a range, not for LIKE.
+    """
+    if connection.vendor == "postgresql":
+        return Q(**{f"{field}__startswith": prefix})
+    return Q(**{f"{field}__gte": prefix, f"{field}__lt": prefix + PREFIX_END})
+
+
+class UserDeleteView(generics.DestroyAPIView):
+    """
+    Allows admin users to delete any user account.
+    Accessible via DELETE request to /api/admin/users/<user_id>/delete/
+    """
+
+    queryset = User.objects.all()
+    permission_classes = [permissions.IsAdminUser]
+    lookup_field = "pk" 
+
+
+class UserDirectoryView(generics.ListAPIView):
+    """
+    Admin user directory, keyset-paginated by id.
+
+    ``?role=agent`` keeps users holding that role and ``?search=abc``
+    matches a case-insensitive prefix of the username or email. Roles
+    and balances are prefetched, one query each.
+    """
+
+    serializer_class = DirectoryUserSerializer
+    permission_classes = [IsAdminUser]
+    pagination_class = KeysetPagination
+    keyset_ordering = ("id",)
+
+    def get_queryset(self):
+        merchant_balances = MerchantBalance.objects.annotate(
+            total=F("balance")
+            + Coalesce(Sum("shards__balance"), Value(Decimal("0.00")))
+        )
+        users = User.objects.prefetch_related(
+            "roles",
+            "consumerbalance_set",
+            "agentbalance_set",
+            Prefetch("merchantbalance_set", queryset=merchant_balances),
+        )
+
+        role = self.request.query_params.get("role")
+        if role in dict(ROLE_TYPES):
+            users = users.filter(roles__type=role)
+
+        search = self.request.query_params.get("search", "").strip().lower()
+        if search:
+            users = users.annotate(
+                username_lower=Lower("username"), email_lower=Lower("email")
+            ).filter(
+                prefix_match("username_lower", search) | prefix_match("email_lower", search)
+            )
+        return users
+
+
+class UserImportView(APIView):
+    """
+    Bulk-create users from a JSON list body or an uploaded CSV/JSON
+    ``file``. Responds with the number created and the rows that failed.
+    Passwords are hashed on PROVISION_HASH_WORKERS threads.
+    Accessible via POST request to /api/admin/users/import/
+    """
+
+    permission_classes = [IsAdminUser]
+    parser_classes = [JSONParser, MultiPartParser]
+
+    def post(self, request):
+        rows = rows_from_request(request)
+        if len(rows) > USER_IMPORT_MAX_ROWS:
+            raise ValidationError(
+                {
+                    "detail": f"Import at most {USER_IMPORT_MAX_ROWS} users at a time; "
+                    "use the provision_users command for more."
+                }
+            )
+        created, errors = provision_users(
+            rows, workers=hash_workers(), executor=ThreadPoolExecutor
+        )
+        return Response(
+            {"created": created, "errors": errors},
+            status=status.HTTP_201_CREATED if created or not errors else status.HTTP_400_BAD_REQUEST,
+        )
@@ -1,6 +1,8 @@
-from django.contrib import admin
-from .models import *
-
-# Register your models here.
-
-admin.site.register(Role)
+from django.contrib import admin
+from .models import *
+
+# Register your models here.
+
+admin.site.register(Role)
+admin.site.register(EmailOutbox)
+admin.site.register(RateLimitBucket)
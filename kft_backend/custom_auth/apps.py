@@ -1,6 +1,9 @@
-from django.apps import AppConfig
-
-
-class CustomAuthConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
-    name = 'custom_auth'
+from django.apps import AppConfig
+
+
+class CustomAuthConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'custom_auth'
+
+    def ready(self):
+        from . import signals  # noqa: F401
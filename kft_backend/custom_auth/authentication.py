@@ -0,0 +1,113 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .revocation import is_revoked
+
+
+ROLES_CLAIM = "roles"
+PRINCIPAL_FIELDS = ("id", "username", "email", "is_active", "is_staff", "is_superuser")
+PRINCIPAL_CACHE_ALIAS = "principal"
+
+
+def principal_cache():
+    return caches[PRINCIPAL_CACHE_ALIAS]
+
+
+def principal_cache_key(username):
+    return f"auth_principal_{username}"
+
+
+def token_for_user(user):
+    """
+    Refresh token for ``user`` carrying its role types in the ``roles``
+    claim; access tokens minted from it inherit the claim. The claim is a
+    hint for clients only: tokens outlive role changes, so requests are
+    authorized from the user's current roles.
+    """
+    refresh = RefreshToken.for_user(user)
+    refresh[ROLES_CLAIM] = sorted(set(user.roles.values_list("type", flat=True)))
+    return refresh
+
+
+def get_roles(request):
+    """
+    Role types of the requesting user. Taken from the cached principal
+    when RoleJWTAuthentication built one, otherwise looked up once and
+    kept on the request.
+    """
+    roles = getattr(request, "roles", None)
+    if roles is None:
+        user = request.user
+        if user and user.is_authenticated:
+            roles = frozenset(user.roles.values_list("type", flat=True))
+        else:
+            roles = frozenset()
+        request.roles = roles
+    return roles
+
+
+class RoleJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that also exposes the cached principal's roles as
+    ``request.roles`` so permission checks need no query. The token's
+    ``roles`` claim is never trusted for authorization.
+
+    With JWT_PRINCIPAL_CACHE_TIMEOUT set, the user is rebuilt from a small
+    record in the "principal" cache instead of being loaded from
+    ``auth_user`` each time.
+    That principal only carries PRINCIPAL_FIELDS: never save it, fetch
+    the user first. custom_auth.signals drops the record when the user or
+    its roles change.
+
+    Tokens revoked through custom_auth.revocation are refused; the check
+    is against an in-memory set, not the database.
+    """
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if is_revoked(token):
+            raise InvalidToken(
+                {"detail": "Token has been revoked.", "code": "token_revoked"}
+            )
+        return token
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            user, token = result
+            roles = getattr(user, "cached_roles", None)
+            if roles is not None:
+                request.roles = frozenset(roles)
+        return result
+
+    def get_user(self, validated_token):
+        timeout = getattr(settings, "JWT_PRINCIPAL_CACHE_TIMEOUT", 0)
+        if not timeout:
+            return super().get_user(validated_token)
+
+        try:
+            username = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        cache = principal_cache()
+        key = principal_cache_key(username)
+        record = cache.get(key)
+        if record is None:
+            user = super().get_user(validated_token)
+            record = {field: getattr(user, field) for field in PRINCIPAL_FIELDS}
+            record["roles"] = sorted(set(user.roles.values_list("type", flat=True)))
+            cache.set(key, record, timeout)
+
+        if not record["is_active"]:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+
+        user = User(**{field: record[field] for field in PRINCIPAL_FIELDS})
+        user._state.adding = False
+        user.cached_roles = record["roles"]
+        return user
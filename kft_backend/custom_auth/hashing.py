@@ -0,0 +1,102 @@
+"""
+Password checks for the async login path.
+
+PBKDF2 takes tens of milliseconds of CPU per call; run on the event loop
+it stalls every other request on the worker. Checks here run on a small
+per-process thread pool (hashlib releases the GIL while hashing) with a
+cap on queued work, so a login burst is shed with a 503 instead of
+piling up behind the pool.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.models import User
+
+
+class PasswordPoolSaturated(Exception):
+    pass
+
+
+class BoundedExecutor:
+    """Thread pool that refuses work once ``workers + queue_depth`` calls are pending."""
+
+    def __init__(self, workers, queue_depth):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password-hash"
+        )
+        self.slots = threading.BoundedSemaphore(workers + queue_depth)
+
+    def submit(self, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            raise PasswordPoolSaturated
+        try:
+            future = self.executor.submit(fn, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def password_pool():
+    """The process's BoundedExecutor, or None when LOGIN_HASH_WORKERS is 0."""
+    global _pool
+    workers = getattr(settings, "LOGIN_HASH_WORKERS", 2)
+    queue_depth = getattr(settings, "LOGIN_HASH_QUEUE_DEPTH", 16)
+    if not workers:
+        return None
+    with _pool_lock:
+        if _pool is None or (_pool.workers, _pool.queue_depth) != (workers, queue_depth):
+            _pool = BoundedExecutor(workers, queue_depth)
+    return _pool
+
+
+def _check(user, password):
+    if user is None:
+        # Hash anyway so unknown usernames take as long as wrong passwords.
+        make_password(password)
+        return False
+    # Like User.check_password, but a hash upgrade is only applied in
+    # memory; the caller saves it.
+    return check_password(password, user.password, setter=user.set_password)
+
+
+def _get_user(username):
+    return User.objects.filter(username=username).first()
+
+
+def _save_upgraded_password(user):
+    user.save(update_fields=["password"])
+
+
+async def check_credentials(username, password):
+    """
+    Return the active user matching ``username``/``password`` or None, as
+    ModelBackend does, with the hash computed on the password pool.
+    Raises PasswordPoolSaturated when the pool is full.
+    """
+    user = await sync_to_async(_get_user)(username)
+    encoded = user.password if user else None
+
+    pool = password_pool()
+    if pool is None:
+        valid = _check(user, password)
+    else:
+        valid = await asyncio.wrap_future(pool.submit(_check, user, password))
+
+    if not valid or not user.is_active:
+        return None
+    if user.password != encoded:
+        await sync_to_async(_save_upgraded_password)(user)
+    return user
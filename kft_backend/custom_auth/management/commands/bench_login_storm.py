@@ -0,0 +1,95 @@
+import asyncio
+import statistics
+import time
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, override_settings
+from django.urls import reverse
+
+from custom_auth.authentication import token_for_user
+from custom_auth.models import Role
+
+
+BENCH_PASSWORD = "bench-password"
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure latency of an unrelated endpoint (the product catalog) on "
+        "its own and during a burst of logins, for each LOGIN_HASH_WORKERS "
+        "value. 0 workers hashes on the event loop, as the old login did."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--logins", type=int, default=100)
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=10)
+        parser.add_argument("--workers", type=int, nargs="+", default=[0, 2])
+        parser.add_argument("--queue-depth", type=int, default=16)
+
+    def handle(self, *args, **options):
+        user = User.objects.create_user("bench_login", password=BENCH_PASSWORD)
+        try:
+            Role.objects.create(user=user, type="consumer")
+            access = str(token_for_user(user).access_token)
+            for workers in options["workers"]:
+                with override_settings(
+                    ALLOWED_HOSTS=["testserver"],
+                    LOGIN_HASH_WORKERS=workers,
+                    LOGIN_HASH_QUEUE_DEPTH=options["queue_depth"],
+                ):
+                    baseline, _ = asyncio.run(self.run(access, 0, options))
+                    storm, logins = asyncio.run(self.run(access, options["logins"], options))
+                self.report(workers, baseline, storm, logins)
+        finally:
+            user.delete()
+
+    async def run(self, access, logins, options):
+        client = AsyncClient(headers={"Authorization": f"Bearer {access}"})
+        catalog_url = reverse("merchant:product_list_all_and_create")
+        login_url = reverse("custom_auth:token_obtain_pair")
+        semaphore = asyncio.Semaphore(options["concurrency"])
+
+        async def request(method, url, **kwargs):
+            # One thread-sensitive context per request, as ASGIHandler does.
+            async with semaphore, ThreadSensitiveContext():
+                started = time.perf_counter()
+                response = await getattr(client, method)(url, **kwargs)
+                return time.perf_counter() - started, response.status_code
+
+        reads = [request("get", catalog_url) for _ in range(options["requests"])]
+        login_body = {"username": "bench_login", "password": BENCH_PASSWORD}
+        posts = [
+            # Logins are not limited by --concurrency.
+            self.login(client, login_url, login_body) for _ in range(logins)
+        ]
+        results = await asyncio.gather(*posts, *reads)
+        return [latency for latency, _ in results[logins:]], [
+            status for _, status in results[:logins]
+        ]
+
+    async def login(self, client, url, body):
+        async with ThreadSensitiveContext():
+            started = time.perf_counter()
+            response = await client.post(url, body, content_type="application/json")
+            return time.perf_counter() - started, response.status_code
+
+    def report(self, workers, baseline, storm, logins):
+        def summary(latencies):
+            return (
+                f"p50 {statistics.median(latencies) * 1000:.1f}ms "
+                f"p99 {percentile(latencies, 0.99) * 1000:.1f}ms"
+            )
+
+        self.stdout.write(
+            f"workers={workers}: catalog alone {summary(baseline)}; "
+            f"during logins {summary(storm)}; "
+            f"logins {logins.count(200)} ok, {logins.count(503)} shed"
+        )
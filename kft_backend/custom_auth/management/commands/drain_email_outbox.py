@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from custom_auth.outbox import drain_outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Send queued emails in batches over a single SMTP connection. "
+        "With --loop, keep polling the outbox."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--loop", action="store_true")
+        parser.add_argument(
+            "--interval", type=float, default=2.0, help="Seconds to sleep when idle."
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = drain_outbox(options["batch_size"])
+            if sent or failed:
+                self.stdout.write(f"Sent {sent} email(s), {failed} failed.")
+            if not options["loop"]:
+                break
+            if sent + failed < options["batch_size"]:
+                time.sleep(options["interval"])
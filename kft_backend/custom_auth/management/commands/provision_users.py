@@ -0,0 +1,43 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from custom_auth.provisioning import PROVISION_CHUNK_SIZE, hash_workers, provision_users
+from kft_backend.uploads import UPLOAD_FORMATS, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Create users with their role and balance from a CSV (header row "
+        "username,password,email,first_name,last_name,role_type) or a JSON "
+        "list. Bad rows are reported and skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--format", choices=UPLOAD_FORMATS, help="Defaults to the file extension."
+        )
+        parser.add_argument("--chunk-size", type=int, default=PROVISION_CHUNK_SIZE)
+        parser.add_argument(
+            "--workers", type=int, help="Password hashing processes (PROVISION_HASH_WORKERS)."
+        )
+
+    def handle(self, *args, **options):
+        format = options["format"] or os.path.splitext(options["path"])[1].lstrip(".").lower()
+        if format not in UPLOAD_FORMATS:
+            raise CommandError("Pass --format csv or --format json.")
+        try:
+            with open(options["path"], encoding="utf-8-sig", newline="") as stream:
+                rows = read_rows(stream, format)
+        except (OSError, ValueError) as exc:
+            raise CommandError(exc)
+
+        workers = options["workers"]
+        if workers is None:
+            workers = hash_workers()
+        created, errors = provision_users(rows, workers, options["chunk_size"])
+        for error in errors:
+            self.stderr.write(f"Row {error['row']}: {json.dumps(error['errors'])}")
+        self.stdout.write(f"Created {created} user(s), {len(errors)} row(s) failed.")
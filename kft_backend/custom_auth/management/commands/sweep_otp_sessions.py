@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from custom_auth.otp_store import get_otp_store
+
+
+class Command(BaseCommand):
+    help = "Delete expired OTP and password-reset sessions from the OTP store."
+
+    def handle(self, *args, **options):
+        deleted = get_otp_store().sweep()
+        self.stdout.write(f"Deleted {deleted} expired OTP session(s).")
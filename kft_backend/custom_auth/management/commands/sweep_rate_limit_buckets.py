@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from custom_auth.throttling import get_bucket_store
+
+
+class Command(BaseCommand):
+    help = "Delete rate-limit buckets that have refilled completely."
+
+    def handle(self, *args, **options):
+        deleted = get_bucket_store().sweep()
+        self.stdout.write(f"Deleted {deleted} idle rate-limit bucket(s).")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from custom_auth.revocation import sweep
+
+
+class Command(BaseCommand):
+    help = "Delete revocations of tokens that have expired anyway."
+
+    def handle(self, *args, **options):
+        deleted = sweep()
+        self.stdout.write(f"Deleted {deleted} expired token revocation(s).")
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custom_auth', '0002_emailoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OTPSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('data', models.JSONField()),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'OTP Session',
+                'verbose_name_plural': 'OTP Sessions',
+                'db_table': 'otp_session',
+            },
+        ),
+    ]
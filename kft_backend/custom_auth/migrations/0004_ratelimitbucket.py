@@ -0,0 +1,26 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custom_auth', '0003_otpsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('full_at', models.FloatField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Rate Limit Bucket',
+                'verbose_name_plural': 'Rate Limit Buckets',
+                'db_table': 'rate_limit_bucket',
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custom_auth', '0004_ratelimitbucket'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='role',
+            index=models.Index(fields=['type', 'user'], name='role_type_user'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:38
+
+from django.db import migrations, models
+
+
+def clear_delivered_bodies(apps, schema_editor):
+    # Rows queued so far are OTP emails; none is needed once delivered.
+    EmailOutbox = apps.get_model("custom_auth", "EmailOutbox")
+    EmailOutbox.objects.exclude(status="pending").update(body="")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custom_auth', '0006_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(clear_delivered_bodies, migrations.RunPython.noop),
+    ]
@@ -1,20 +1,121 @@
-from django.db import models
-from django.utils import timezone
-from django.contrib.auth.models import User
-
-
-ROLE_TYPES = (
-    ("admin", "Admin"),
-    ("merchant", "Merchant"),
-    ("consumer", "Consumer"),
-    ("agent", "Agent"),
-)
-
-
-class Role(models.Model):
-    type = models.CharField(max_length=20, choices=ROLE_TYPES)
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="roles")
-
-    class Meta:
-        verbose_name = "Role"
-        verbose_name_plural = "Roles"
+from django.db import models
+from django.utils import timezone
+from django.contrib.auth.models import User
+
+
+ROLE_TYPES = (
+    ("admin", "Admin"),
+    ("merchant", "Merchant"),
+    ("consumer", "Consumer"),
+    ("agent", "Agent"),
+)
+
+
+class Role(models.Model):
+    type = models.CharField(max_length=20, choices=ROLE_TYPES)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="roles")
+
+    class Meta:
+        verbose_name = "Role"
+        verbose_name_plural = "Roles"
+        # Role filter in the admin user directory.
+        indexes = [models.Index(fields=["type", "user"], name="role_type_user")]
+
+
+class EmailOutbox(models.Model):
+    """
+    Email waiting to be sent by the drain_email_outbox worker, so request
+    handlers never wait on the mail server.
+    """
+
+    STATUS_CHOICES = (
+        ("pending", "Pending"),
+        ("sent", "Sent"),
+        ("failed", "Failed"),
+    )
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True)
+    to_email = models.EmailField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.to_email}: {self.subject}"
+
+    class Meta:
+        db_table = "email_outbox"
+        verbose_name = "Outgoing Email"
+        verbose_name_plural = "Outgoing Emails"
+        indexes = [
+            models.Index(
+                fields=["status", "next_attempt_at"], name="email_outbox_due"
+            )
+        ]
+
+
+class OTPSession(models.Model):
+    """
+    Short-lived OTP or password-reset state, shared by every worker.
+    Used through custom_auth.otp_store.DatabaseOTPStore.
+    """
+
+    key = models.CharField(max_length=255, unique=True)
+    data = models.JSONField()
+    attempts = models.PositiveSmallIntegerField(default=0)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.key
+
+    class Meta:
+        db_table = "otp_session"
+        verbose_name = "OTP Session"
+        verbose_name_plural = "OTP Sessions"
+
+
+class RateLimitBucket(models.Model):
+    """
+    Token bucket for custom_auth.throttling, stored as the time at which
+    the bucket will be full again (GCRA); rows past that time are idle.
+    """
+
+    key = models.CharField(max_length=255, unique=True)
+    full_at = models.FloatField(db_index=True)
+
+    def __str__(self):
+        return self.key
+
+    class Meta:
+        db_table = "rate_limit_bucket"
+        verbose_name = "Rate Limit Bucket"
+        verbose_name_plural = "Rate Limit Buckets"
+
+
+class RevokedToken(models.Model):
+    """
+    A JWT that must no longer be accepted, by ``jti``. Each worker keeps
+    an in-memory copy through custom_auth.revocation.
+    """
+
+    jti = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, null=True, blank=True, related_name="+"
+    )
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return self.jti
+
+    class Meta:
+        db_table = "revoked_token"
+        verbose_name = "Revoked Token"
+        verbose_name_plural = "Revoked Tokens"
@@ -0,0 +1,127 @@
+"""
+Shared store for registration OTPs, password-reset OTPs and reset
+sessions. The default cache is per process, so this state has to live
+somewhere every worker can see; OTP_STORE picks the backend.
+
+Every backend keeps JSON-serialisable ``data`` under a key with a TTL
+and offers an atomic ``take`` (get and delete, so only one request can
+consume a code) and an attempt counter for wrong guesses.
+"""
+
+import datetime
+import json
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OTPSession
+
+
+class DatabaseOTPStore:
+    """Rows in otp_session; expired rows are ignored and removed by sweep()."""
+
+    def put(self, key, data, ttl):
+        OTPSession.objects.update_or_create(
+            key=key,
+            defaults={
+                "data": data,
+                "attempts": 0,
+                "expires_at": timezone.now() + datetime.timedelta(seconds=ttl),
+            },
+        )
+
+    def _live(self, key):
+        return OTPSession.objects.filter(key=key, expires_at__gt=timezone.now())
+
+    def get(self, key):
+        return self._live(key).values_list("data", flat=True).first()
+
+    def take(self, key):
+        row = self._live(key).values_list("pk", "data").first()
+        if row is None:
+            return None
+        # The DELETE decides between concurrent takers: only one removes the row.
+        if not OTPSession.objects.filter(pk=row[0]).delete()[0]:
+            return None
+        return row[1]
+
+    def record_failure(self, key):
+        sessions = self._live(key)
+        sessions.update(attempts=F("attempts") + 1)
+        return sessions.values_list("attempts", flat=True).first()
+
+    def delete(self, key):
+        OTPSession.objects.filter(key=key).delete()
+
+    def sweep(self):
+        return OTPSession.objects.filter(expires_at__lte=timezone.now()).delete()[0]
+
+
+class RedisOTPStore:
+    """
+    Hash per key in any Redis-protocol server at OTP_STORE_URL; the
+    server expires keys itself. Needs the ``redis`` package.
+    """
+
+    def __init__(self, client=None):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(settings.OTP_STORE_URL)
+        self.client = client
+
+    def put(self, key, data, ttl):
+        pipe = self.client.pipeline()
+        pipe.delete(key)
+        pipe.hset(key, mapping={"data": json.dumps(data), "attempts": 0})
+        pipe.expire(key, ttl)
+        pipe.execute()
+
+    def get(self, key):
+        raw = self.client.hget(key, "data")
+        return json.loads(raw) if raw else None
+
+    def take(self, key):
+        pipe = self.client.pipeline()
+        pipe.hget(key, "data")
+        pipe.delete(key)
+        raw, deleted = pipe.execute()
+        return json.loads(raw) if raw and deleted else None
+
+    def record_failure(self, key):
+        # WATCH/MULTI rather than a script so plain stand-ins work too. The
+        # key is only incremented if it still exists, so a late guess
+        # cannot resurrect an expired or consumed session.
+        from redis.exceptions import WatchError
+
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    if not pipe.exists(key):
+                        return None
+                    pipe.multi()
+                    pipe.hincrby(key, "attempts", 1)
+                    return pipe.execute()[0]
+                except WatchError:
+                    continue
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def sweep(self):
+        return 0
+
+
+_store = None
+
+
+def get_otp_store():
+    global _store
+    if _store is None:
+        _store = import_string(
+            getattr(settings, "OTP_STORE", "custom_auth.otp_store.DatabaseOTPStore")
+        )()
+    return _store
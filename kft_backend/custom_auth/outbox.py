@@ -0,0 +1,115 @@
+import datetime
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import EmailOutbox
+
+
+# A drained row is leased for this long so concurrent workers skip it; a
+# worker that dies mid-batch leaves it to be retried after the lease.
+OUTBOX_LEASE_SECONDS = 300
+OUTBOX_RETRY_BASE_SECONDS = 30
+OUTBOX_RETRY_MAX_SECONDS = 3600
+OUTBOX_MAX_ATTEMPTS = 6
+OUTBOX_EXPIRED_ERROR = "Expired before it could be sent."
+
+
+def enqueue_email(subject, body, to_email, from_email=None, expires_at=None):
+    """
+    Queue an email. One that is useless after ``expires_at`` (an OTP) is
+    marked failed instead of being sent late.
+    """
+    if from_email is None:
+        from_email = getattr(settings, "EMAIL_HOST_USER", None) or "noreply@example.com"
+    return EmailOutbox.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email,
+        to_email=to_email,
+        expires_at=expires_at,
+    )
+
+
+def retry_delay(attempts):
+    return min(
+        OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1), OUTBOX_RETRY_MAX_SECONDS
+    )
+
+
+def _expire():
+    # Bodies hold OTP codes, so none is kept once a row stops being pending.
+    expired = EmailOutbox.objects.filter(status="pending", expires_at__lte=timezone.now())
+    return expired.update(status="failed", body="", last_error=OUTBOX_EXPIRED_ERROR)
+
+
+def _claim(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        due = EmailOutbox.objects.filter(status="pending", next_attempt_at__lte=now)
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        rows = list(due.order_by("next_attempt_at", "id")[:batch_size])
+        EmailOutbox.objects.filter(pk__in=[row.pk for row in rows]).update(
+            next_attempt_at=now + datetime.timedelta(seconds=OUTBOX_LEASE_SECONDS)
+        )
+    return rows
+
+
+def drain_outbox(batch_size=100):
+    """
+    Send up to ``batch_size`` due emails over one SMTP connection.
+    Failures are retried with exponential backoff and marked failed after
+    OUTBOX_MAX_ATTEMPTS or once they expire; the body is cleared when a
+    row is sent or fails. Returns (sent, failed).
+    """
+    failed = _expire()
+    rows = _claim(batch_size)
+    if not rows:
+        return 0, failed
+
+    sent = 0
+    mail_connection = get_connection()
+    try:
+        for row in rows:
+            message = EmailMessage(
+                row.subject,
+                row.body,
+                row.from_email,
+                [row.to_email],
+                connection=mail_connection,
+            )
+            try:
+                message.send()
+            except Exception as e:
+                # Drop a possibly broken connection; the next send reopens it.
+                mail_connection.close()
+                row.attempts += 1
+                row.last_error = str(e)
+                if row.attempts >= OUTBOX_MAX_ATTEMPTS:
+                    row.status = "failed"
+                    row.body = ""
+                row.next_attempt_at = timezone.now() + datetime.timedelta(
+                    seconds=retry_delay(row.attempts)
+                )
+                row.save(
+                    update_fields=[
+                        "attempts",
+                        "last_error",
+                        "status",
+                        "body",
+                        "next_attempt_at",
+                    ]
+                )
+                failed += 1
+            else:
+                row.status = "sent"
+                row.body = ""
+                row.sent_at = timezone.now()
+                row.save(update_fields=["status", "body", "sent_at"])
+                sent += 1
+    finally:
+        mail_connection.close()
+    return sent, failed
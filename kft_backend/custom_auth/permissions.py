@@ -1,34 +1,52 @@
-from rest_framework import permissions
-
-
-class IsAdminOrOwner(permissions.BasePermission):
-    """
-    Custom permission to only allow admins or owners of an object to access/edit/delete it.
-    Assumes the view has a `self.get_object()` method.
-    """
-
-    def has_object_permission(self, request, view, obj):
-        if request.method in permissions.SAFE_METHODS:
-            is_admin = (
-                request.user.is_staff
-                or request.user.roles.filter(type="admin").exists()
-            )
-            return is_admin or obj == request.user
-
-        
-        is_admin = (
-            request.user.is_staff or request.user.roles.filter(type="admin").exists()
-        )
-        return is_admin or obj == request.user
-
-
-class IsAdminUser(permissions.BasePermission):
-    def has_permission(self, request, view):
-        return (
-            request.user
-            and request.user.is_authenticated
-            and (
-                request.user.is_staff
-                or request.user.roles.filter(type="admin").exists()
-            )
-        )
+from rest_framework import permissions
+
+from .authentication import get_roles
+
+
+def is_admin(request):
+    return request.user.is_staff or "admin" in get_roles(request)
+
+
+class IsAdminOrOwner(permissions.BasePermission):
+    """
+    Custom permission to only allow admins or owners of an object to access/edit/delete it.
+    Assumes the view has a `self.get_object()` method.
+    """
+
+    def has_object_permission(self, request, view, obj):
+        return is_admin(request) or obj == request.user
+
+
+class IsAdminUser(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return bool(
+            request.user and request.user.is_authenticated and is_admin(request)
+        )
+
+
+class HasRole(permissions.BasePermission):
+    """
+    Allow authenticated users holding ``role``. Subclasses set ``role``.
+    """
+
+    role = None
+    message = "You are not authorized to perform this action."
+
+    def has_permission(self, request, view):
+        return bool(
+            request.user
+            and request.user.is_authenticated
+            and self.role in get_roles(request)
+        )
+
+
+class IsAgent(HasRole):
+    role = "agent"
+
+
+class IsMerchant(HasRole):
+    role = "merchant"
+
+
+class IsConsumer(HasRole):
+    role = "consumer"
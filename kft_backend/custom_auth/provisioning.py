@@ -0,0 +1,165 @@
+"""
+Bulk user provisioning for migrating agent and merchant networks.
+
+UserCreateSerializer.create costs two existence checks, a password hash
+and three inserts per user. Here rows are validated in memory, checked
+for duplicates with one query per chunk, hashed and written with one
+bulk_create per table per chunk. The provision_users command hashes on a
+process pool (PBKDF2 is CPU bound); the admin import hashes on a thread
+pool, since forking a threaded server worker is unsafe and hashlib's
+PBKDF2 releases the GIL.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+
+from agent.models import AgentBalance
+from consumer.models import ConsumerBalance
+from merchant.models import MerchantBalance
+
+from .models import Role
+from .serializers import ProvisionUserSerializer
+
+
+PROVISION_CHUNK_SIZE = 500
+CONFLICT_MESSAGE = "Conflicts with a user created during the import; retry this row."
+
+BALANCE_MODELS = {
+    "consumer": ConsumerBalance,
+    "agent": AgentBalance,
+    "merchant": MerchantBalance,
+}
+
+
+def hash_workers():
+    return getattr(settings, "PROVISION_HASH_WORKERS", os.cpu_count() or 1)
+
+
+def provision_users(
+    rows, workers=0, chunk_size=PROVISION_CHUNK_SIZE, executor=ProcessPoolExecutor
+):
+    """
+    Create users, roles and balances for ``rows`` (dicts shaped like
+    UserCreateSerializer's input). Returns ``(created, errors)`` where
+    ``errors`` is a list of ``{"row": n, "errors": {...}}`` with 1-based
+    row numbers; a bad row never stops the rest of the import. Passwords
+    are hashed on an ``executor`` of ``workers`` processes (or threads,
+    with a ThreadPoolExecutor) when it is above 1, otherwise in the
+    calling thread.
+    """
+    created = 0
+    errors = []
+    pool = executor(workers) if workers > 1 else None
+    try:
+        for start in range(0, len(rows), chunk_size):
+            chunk = list(enumerate(rows[start : start + chunk_size], start + 1))
+            valid = _validate(chunk, errors)
+            created += _create(valid, pool, errors)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    errors.sort(key=lambda error: error["row"])
+    return created, errors
+
+
+def _validate(chunk, errors):
+    valid = []
+    for number, row in chunk:
+        if not isinstance(row, dict):
+            errors.append({"row": number, "errors": {"non_field_errors": ["Expected an object."]}})
+            continue
+        serializer = ProvisionUserSerializer(data=row)
+        if serializer.is_valid():
+            valid.append((number, serializer.validated_data))
+        else:
+            errors.append({"row": number, "errors": serializer.errors})
+
+    # Earlier chunks are already committed, so one query per field covers
+    # them; duplicates inside the chunk are caught as it is walked.
+    taken = {
+        "username": set(
+            User.objects.filter(
+                username__in=[data["username"] for _, data in valid]
+            ).values_list("username", flat=True)
+        ),
+        "email": set(
+            User.objects.filter(
+                email__in=[data["email"] for _, data in valid]
+            ).values_list("email", flat=True)
+        ),
+    }
+    unique = []
+    for number, data in valid:
+        row_errors = {}
+        if data["username"] in taken["username"]:
+            row_errors["username"] = ["A user with that username already exists."]
+        if data["email"] in taken["email"]:
+            row_errors["email"] = ["A user with that email already exists."]
+        if row_errors:
+            errors.append({"row": number, "errors": row_errors})
+            continue
+        taken["username"].add(data["username"])
+        taken["email"].add(data["email"])
+        unique.append((number, data))
+    return unique
+
+
+def _create(valid, pool, errors):
+    if not valid:
+        return 0
+    passwords = [data["password"] for _, data in valid]
+    if pool is None:
+        hashes = [make_password(password) for password in passwords]
+    else:
+        hashes = list(pool.map(make_password, passwords))
+
+    users = []
+    for (_, data), encoded in zip(valid, hashes):
+        admin = data["role_type"] == "admin"
+        users.append(
+            User(
+                username=data["username"],
+                password=encoded,
+                email=data["email"],
+                first_name=data.get("first_name", ""),
+                last_name=data.get("last_name", ""),
+                is_active=True,
+                is_staff=admin,
+                is_superuser=admin,
+            )
+        )
+
+    try:
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+            if any(user.pk is None for user in users):
+                # Backends that cannot return ids from a bulk insert.
+                ids = dict(
+                    User.objects.filter(
+                        username__in=[user.username for user in users]
+                    ).values_list("username", "pk")
+                )
+                for user in users:
+                    user.pk = ids[user.username]
+
+            Role.objects.bulk_create(
+                Role(user=user, type=data["role_type"])
+                for user, (_, data) in zip(users, valid)
+            )
+            for role_type, model in BALANCE_MODELS.items():
+                model.objects.bulk_create(
+                    model(user=user, balance=0)
+                    for user, (_, data) in zip(users, valid)
+                    if data["role_type"] == role_type
+                )
+    except IntegrityError:
+        # A user with one of these usernames was created concurrently.
+        for number, _ in valid:
+            errors.append({"row": number, "errors": {"non_field_errors": [CONFLICT_MESSAGE]}})
+        return 0
+    return len(users)
@@ -0,0 +1,111 @@
+"""
+Revoked-token denylist.
+
+Revocations are stored in the revoked_token table and mirrored into a
+per-process set of ``jti``s, so checking a token during authentication
+is a set lookup. In serving processes (started through wsgi.py or
+asgi.py) a daemon thread pulls new revocations every
+REVOCATION_REFRESH_SECONDS; a revocation made in this process is visible
+here at once and in other workers after their next refresh. Only the
+first check in a process waits on the initial load. Tests, migrations
+and other management commands load the set once and never poll.
+"""
+
+import datetime
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+from .models import RevokedToken
+
+
+logger = logging.getLogger(__name__)
+
+# Refreshes re-read this far behind the newest revocation seen, so a row
+# committed late with an earlier revoked_at is not missed.
+REVOCATION_OVERLAP_SECONDS = 60
+
+
+class Denylist:
+    def __init__(self):
+        self.jtis = set()
+        self.watermark = None
+        self.pid = None
+        self.interval = 0
+        self.lock = threading.Lock()
+
+    def __contains__(self, jti):
+        if self.pid != os.getpid():
+            self.start()
+        return jti in self.jtis
+
+    def add(self, jti):
+        self.jtis.add(jti)
+
+    def start(self):
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            # Also reached in a forked worker, whose parent's thread is gone.
+            self.jtis = set()
+            self.watermark = None
+            self.refresh()
+            self.pid = os.getpid()
+            if self.interval:
+                threading.Thread(
+                    target=self.run, args=(self.interval,), name="token-denylist", daemon=True
+                ).start()
+
+    def refresh(self):
+        rows = RevokedToken.objects.all()
+        if self.watermark is not None:
+            overlap = datetime.timedelta(seconds=REVOCATION_OVERLAP_SECONDS)
+            rows = rows.filter(revoked_at__gte=self.watermark - overlap)
+        for jti, revoked_at in rows.values_list("jti", "revoked_at"):
+            self.jtis.add(jti)
+            if self.watermark is None or revoked_at > self.watermark:
+                self.watermark = revoked_at
+
+    def run(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.refresh()
+            except DatabaseError:
+                logger.exception("Could not refresh the token denylist.")
+            finally:
+                # The thread has its own connection; don't hold it while sleeping.
+                connection.close()
+
+
+denylist = Denylist()
+
+
+def refresh_in_background():
+    """Poll for revocations in this process; called by wsgi.py and asgi.py."""
+    denylist.interval = getattr(settings, "REVOCATION_REFRESH_SECONDS", 0)
+
+
+def is_revoked(token):
+    return token.get("jti") in denylist
+
+
+def revoke(token, user=None):
+    """Record ``token`` (a validated simplejwt token) as revoked."""
+    jti = token["jti"]
+    expires_at = datetime.datetime.fromtimestamp(token["exp"], tz=datetime.timezone.utc)
+    RevokedToken.objects.get_or_create(
+        jti=jti, defaults={"user": user, "expires_at": expires_at}
+    )
+    denylist.add(jti)
+
+
+def sweep():
+    """Delete revocations of tokens that have expired anyway."""
+    deleted, _ = RevokedToken.objects.filter(expires_at__lt=timezone.now()).delete()
+    return deleted
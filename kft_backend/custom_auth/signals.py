@@ -0,0 +1,34 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .authentication import principal_cache, principal_cache_key
+from .models import Role
+
+
+@receiver(pre_save, sender=User)
+def forget_renamed_principal(sender, instance, **kwargs):
+    # Tokens name the user by username, so a rename must drop the old key.
+    if instance._state.adding:
+        return
+    old_username = (
+        User.objects.filter(pk=instance.pk).values_list("username", flat=True).first()
+    )
+    if old_username and old_username != instance.username:
+        principal_cache().delete(principal_cache_key(old_username))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_principal(sender, instance, **kwargs):
+    principal_cache().delete(principal_cache_key(instance.username))
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+def forget_role_principal(sender, instance, **kwargs):
+    username = (
+        User.objects.filter(pk=instance.user_id).values_list("username", flat=True).first()
+    )
+    if username:
+        principal_cache().delete(principal_cache_key(username))
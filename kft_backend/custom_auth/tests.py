@@ -1,3 +1,471 @@
-from django.test import TestCase
-
-# Create your tests here.
+import json
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import EmailMessage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from consumer.models import ConsumerBalance
+from ledger.services import credit, post
+from merchant.models import MerchantBalance, MerchantBalanceShard
+
+from . import outbox
+from .authentication import principal_cache, token_for_user
+from .hashing import BoundedExecutor
+from .models import EmailOutbox, OTPSession, RevokedToken, Role
+from .otp_store import DatabaseOTPStore, RedisOTPStore, get_otp_store
+from .revocation import Denylist, denylist, refresh_in_background
+from .serializers import OTP_MAX_ATTEMPTS
+from .throttling import DatabaseBucketStore
+
+
+@override_settings(JWT_PRINCIPAL_CACHE_TIMEOUT=60)
+class RoleClaimTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("consumer", "consumer@example.com", "secret")
+        Role.objects.create(user=cls.user, type="consumer")
+
+    def setUp(self):
+        cache.clear()
+        principal_cache().clear()
+
+    def login(self):
+        response = self.client.post(
+            reverse("custom_auth:token_obtain_pair"),
+            {"username": "consumer", "password": "secret"},
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.json()['access']}")
+        return response
+
+    def test_login_embeds_roles(self):
+        response = self.login()
+        self.assertEqual(AccessToken(response.json()["access"])["roles"], ["consumer"])
+
+    def test_role_check_skips_database(self):
+        self.login()
+        self.client.get(reverse("agent:agent_profile"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("agent:agent_profile"))
+        self.assertEqual(response.status_code, 403)
+
+    def test_revoked_role_is_refused_despite_claim(self):
+        Role.objects.create(user=self.user, type="agent")
+        self.login()
+        self.assertEqual(self.client.get(reverse("agent:agent_profile")).status_code, 200)
+        Role.objects.filter(user=self.user, type="agent").delete()
+        self.assertEqual(self.client.get(reverse("agent:agent_profile")).status_code, 403)
+
+    def test_token_without_claim_uses_cached_roles(self):
+        access = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        with self.assertNumQueries(2):
+            self.client.get(reverse("agent:agent_profile"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("agent:agent_profile"))
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(JWT_PRINCIPAL_CACHE_TIMEOUT=60)
+class CachedPrincipalTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("agent", "agent@example.com", "secret")
+        Role.objects.create(user=cls.user, type="agent")
+
+    def setUp(self):
+        cache.clear()
+        principal_cache().clear()
+        access = token_for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def test_deactivation_is_seen_immediately(self):
+        self.client.get(reverse("agent:agent_profile"))
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse("agent:agent_profile")).status_code, 401)
+
+    def test_role_change_is_seen_immediately(self):
+        self.assertEqual(self.client.get(reverse("agent:agent_profile")).status_code, 200)
+        Role.objects.filter(user=self.user).update(type="consumer")
+        Role.objects.get(user=self.user).save()
+        self.assertEqual(self.client.get(reverse("agent:agent_profile")).status_code, 403)
+
+    def test_change_password_uses_stored_user(self):
+        response = self.client.post(
+            reverse("custom_auth:change_password"),
+            {
+                "old_password": "secret",
+                "new_password": "changed",
+                "confirm_new_password": "changed",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password("changed"))
+        self.assertEqual(self.user.email, "agent@example.com")
+
+
+@override_settings(JWT_PRINCIPAL_CACHE_TIMEOUT=60)
+class RevocationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("merchant", "merchant@example.com", "secret")
+        Role.objects.create(user=cls.user, type="merchant")
+
+    def setUp(self):
+        cache.clear()
+        principal_cache().clear()
+        self.refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.refresh.access_token}")
+        self.profile_url = reverse("merchant:merchant_profile")
+
+    def test_logout_revokes_access_and_refresh(self):
+        self.client.get(self.profile_url)
+        response = self.client.post(
+            reverse("custom_auth:token_logout"), {"refresh": str(self.refresh)}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(RevokedToken.objects.filter(user=self.user).count(), 2)
+        self.assertIn(self.refresh["jti"], denylist)
+        response = self.client.get(self.profile_url)
+        self.assertEqual(response.status_code, 401)
+
+    def test_check_adds_no_query(self):
+        self.client.get(self.profile_url)  # loads the denylist and the principal
+        with self.assertNumQueries(1):
+            self.client.get(self.profile_url)
+
+    def test_users_revoke_only_their_own_tokens(self):
+        other = User.objects.create_user("other", "other@example.com", "secret")
+        other_access = RefreshToken.for_user(other).access_token
+        url = reverse("custom_auth:token_revoke")
+        self.assertEqual(self.client.post(url, {"token": str(other_access)}).status_code, 403)
+        self.assertEqual(self.client.post(url, {"token": "garbage"}).status_code, 400)
+
+        Role.objects.create(user=self.user, type="admin")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.refresh.access_token}")
+        self.assertEqual(self.client.post(url, {"token": str(other_access)}).status_code, 200)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {other_access}")
+        self.assertEqual(self.client.get(self.profile_url).status_code, 401)
+
+    def test_refresh_picks_up_other_workers_revocations(self):
+        worker = Denylist()
+        with mock.patch("custom_auth.revocation.threading.Thread") as thread:
+            worker.start()
+        thread.assert_not_called()
+        RevokedToken.objects.create(jti="elsewhere", expires_at=timezone.now())
+        self.assertNotIn("elsewhere", worker.jtis)
+        worker.refresh()
+        self.assertIn("elsewhere", worker.jtis)
+
+    @override_settings(REVOCATION_REFRESH_SECONDS=5)
+    def test_server_processes_poll(self):
+        worker = Denylist()
+        with mock.patch("custom_auth.revocation.denylist", worker):
+            refresh_in_background()
+        with mock.patch("custom_auth.revocation.threading.Thread") as thread:
+            worker.start()
+        thread.assert_called_once()
+        self.assertEqual(thread.call_args.kwargs["args"], (5,))
+
+
+class UserListTests(APITestCase):
+    def test_lists_every_user_unpaginated(self):
+        admin = User.objects.create_user("admin", "admin@example.com", "secret")
+        Role.objects.create(user=admin, type="admin")
+        User.objects.bulk_create(
+            User(username=f"user{n}", email=f"user{n}@example.com") for n in range(60)
+        )
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {token_for_user(admin).access_token}"
+        )
+        response = self.client.get(reverse("custom_auth:user_list_or_initiate_registration"))
+        self.assertEqual(len(response.data), 61)
+        self.assertNotIn("Link", response)
+
+
+@override_settings(JWT_PRINCIPAL_CACHE_TIMEOUT=60)
+class MeTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("shop", "shop@example.com", "secret")
+        Role.objects.create(user=cls.user, type="merchant")
+        Role.objects.create(user=cls.user, type="consumer")
+        cls.merchant = MerchantBalance.objects.create(user=cls.user, balance=10)
+        MerchantBalanceShard.objects.create(merchant=cls.merchant, shard=0, balance=5)
+        ConsumerBalance.objects.create(user=cls.user, balance=3)
+
+    def setUp(self):
+        cache.clear()
+        principal_cache().clear()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {token_for_user(self.user).access_token}"
+        )
+        self.url = reverse("custom_auth:me")
+
+    def test_one_query_and_conditional_get(self):
+        self.client.get(self.url)  # caches the authenticated principal
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data["roles"], ["consumer", "merchant"])
+        self.assertEqual(response.data["balances"], {"consumer": 3, "merchant": 15})
+
+        etag = response["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_credit_changes_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        post([credit(self.merchant, Decimal("1.00"), "Sale")])
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["balances"]["merchant"], 16)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class LoginTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("merchant", "merchant@example.com", "secret")
+        Role.objects.create(user=cls.user, type="merchant")
+
+    def login(self, password="secret"):
+        return self.client.post(
+            reverse("custom_auth:token_obtain_pair"),
+            {"username": "merchant", "password": password},
+            format="json",
+        )
+
+    def test_wrong_password(self):
+        response = self.login("wrong")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("non_field_errors", response.json())
+
+    def test_unknown_user(self):
+        response = self.client.post(
+            reverse("custom_auth:token_obtain_pair"),
+            {"username": "nobody", "password": "secret"},
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_missing_fields(self):
+        response = self.client.post(reverse("custom_auth:token_obtain_pair"), {})
+        self.assertEqual(set(response.json()), {"username", "password"})
+
+    def test_saturated_pool_sheds_load(self):
+        pool = BoundedExecutor(workers=1, queue_depth=0)
+        pool.slots.acquire()
+        with mock.patch("custom_auth.hashing.password_pool", return_value=pool):
+            response = self.login()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+        pool.slots.release()
+        with mock.patch("custom_auth.hashing.password_pool", return_value=pool):
+            self.assertEqual(self.login().status_code, 200)
+
+
+class EmailOutboxTests(APITestCase):
+    def register(self, username):
+        return self.client.post(
+            reverse("custom_auth:user_list_or_initiate_registration"),
+            {
+                "username": username,
+                "password": "secret",
+                "email": f"{username}@example.com",
+                "role_type": "consumer",
+            },
+        )
+
+    def test_registration_queues_otp_without_sending(self):
+        self.assertEqual(self.register("queued").status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+        row = EmailOutbox.objects.get()
+        self.assertEqual(row.to_email, "queued@example.com")
+        self.assertGreater(row.expires_at, timezone.now())
+
+    def test_drain_sends_batch_over_one_connection(self):
+        for username in ("first", "second", "third"):
+            self.register(username)
+        with mock.patch(
+            "custom_auth.outbox.get_connection", wraps=outbox.get_connection
+        ) as get_connection:
+            self.assertEqual(outbox.drain_outbox(), (3, 0))
+        get_connection.assert_called_once()
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(EmailOutbox.objects.exclude(status="sent").exists())
+        self.assertFalse(EmailOutbox.objects.exclude(body="").exists())
+
+    def test_failed_send_backs_off(self):
+        self.register("retry")
+        with mock.patch.object(EmailMessage, "send", side_effect=OSError("down")):
+            self.assertEqual(outbox.drain_outbox(), (0, 1))
+        row = EmailOutbox.objects.get()
+        self.assertEqual((row.status, row.attempts, row.last_error), ("pending", 1, "down"))
+        self.assertGreater(row.next_attempt_at, timezone.now())
+        # Not due yet.
+        self.assertEqual(outbox.drain_outbox(), (0, 0))
+
+    def test_expired_otp_is_never_sent(self):
+        self.register("late")
+        EmailOutbox.objects.update(expires_at=timezone.now())
+        self.assertEqual(outbox.drain_outbox(), (0, 1))
+        self.assertEqual(len(mail.outbox), 0)
+        row = EmailOutbox.objects.get()
+        self.assertEqual((row.status, row.body), ("failed", ""))
+
+
+class OTPFlowTests(APITestCase):
+    def register(self):
+        self.client.post(
+            reverse("custom_auth:user_list_or_initiate_registration"),
+            {
+                "username": "newcomer",
+                "password": "secret",
+                "email": "newcomer@example.com",
+                "role_type": "consumer",
+            },
+        )
+        return get_otp_store().get("reg_otp_newcomer@example.com")["otp_code"]
+
+    def verify(self, otp_code):
+        return self.client.post(
+            reverse("custom_auth:verify_otp"),
+            {"email": "newcomer@example.com", "otp_code": otp_code},
+        )
+
+    def test_code_is_single_use(self):
+        otp_code = self.register()
+        self.assertEqual(self.verify(otp_code).status_code, 201)
+        self.assertEqual(self.verify(otp_code).status_code, 400)
+        self.assertEqual(User.objects.filter(username="newcomer").count(), 1)
+
+    def test_session_never_holds_the_password(self):
+        self.register()
+        session = OTPSession.objects.get(key="reg_otp_newcomer@example.com")
+        self.assertNotIn("secret", json.dumps(session.data))
+        self.assertEqual(self.verify(session.data["otp_code"]).status_code, 201)
+        self.assertTrue(User.objects.get(username="newcomer").check_password("secret"))
+
+    def test_wrong_codes_exhaust_session(self):
+        otp_code = self.register()
+        wrong = "000000" if otp_code != "000000" else "111111"
+        for _ in range(OTP_MAX_ATTEMPTS):
+            self.assertEqual(self.verify(wrong).status_code, 400)
+        self.assertEqual(self.verify(otp_code).status_code, 400)
+
+    def test_password_reset_session_is_single_use(self):
+        User.objects.create_user("forgetful", "forgetful@example.com", "old")
+        self.client.post(
+            reverse("custom_auth:forgot_password"), {"email": "forgetful@example.com"}
+        )
+        otp_code = get_otp_store().get("pwd_reset_otp_forgetful@example.com")["otp_code"]
+        response = self.client.post(
+            reverse("custom_auth:verify_password_reset_otp"),
+            {"email": "forgetful@example.com", "otp_code": otp_code},
+        )
+        body = {
+            "reset_session_token": response.data["reset_session_token"],
+            "new_password": "A-much-better-one-42",
+            "confirm_new_password": "A-much-better-one-42",
+        }
+        url = reverse("custom_auth:set_new_password_after_otp")
+        self.assertEqual(self.client.post(url, body).status_code, 200)
+        self.assertEqual(self.client.post(url, body).status_code, 400)
+
+
+class DatabaseOTPStoreTests(TestCase):
+    def make_store(self):
+        return DatabaseOTPStore()
+
+    def test_take_is_get_and_delete(self):
+        store = self.make_store()
+        store.put("otp", {"otp_code": "123456"}, 60)
+        self.assertEqual(store.take("otp"), {"otp_code": "123456"})
+        self.assertIsNone(store.take("otp"))
+        self.assertIsNone(store.get("otp"))
+
+    def test_attempts_count_only_live_sessions(self):
+        store = self.make_store()
+        store.put("otp", {}, 60)
+        self.assertEqual(store.record_failure("otp"), 1)
+        self.assertEqual(store.record_failure("otp"), 2)
+        store.put("otp", {}, 60)
+        self.assertEqual(store.record_failure("otp"), 1)
+        store.delete("otp")
+        self.assertIsNone(store.record_failure("otp"))
+
+    def test_expired_sessions_are_invisible_and_swept(self):
+        store = self.make_store()
+        store.put("otp", {}, 60)
+        OTPSession.objects.update(expires_at=timezone.now())
+        self.assertIsNone(store.get("otp"))
+        self.assertEqual(store.sweep(), 1)
+
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+@skipUnless(fakeredis, "fakeredis is not installed")
+class RedisOTPStoreTests(DatabaseOTPStoreTests):
+    def make_store(self):
+        return RedisOTPStore(client=fakeredis.FakeRedis())
+
+    def test_expired_sessions_are_invisible_and_swept(self):
+        store = self.make_store()
+        store.put("otp", {}, 60)
+        store.client.expire("otp", 0)
+        self.assertIsNone(store.get("otp"))
+
+
+class ThrottleTests(APITestCase):
+    def forgot(self, email):
+        return self.client.post(reverse("custom_auth:forgot_password"), {"email": email})
+
+    @mock.patch.dict(
+        "rest_framework.settings.api_settings.DEFAULT_THROTTLE_RATES",
+        {"password_reset.email": "2/hour"},
+    )
+    def test_email_bucket_rejects_before_validation(self):
+        # Unknown addresses fail validation with 400 until the bucket is empty.
+        self.assertEqual(self.forgot("someone@example.com").status_code, 400)
+        self.assertEqual(self.forgot("SOMEONE@example.com").status_code, 400)
+        response = self.forgot("someone@example.com")
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+        # Other addresses have their own bucket.
+        self.assertEqual(self.forgot("other@example.com").status_code, 400)
+
+    @mock.patch.dict(
+        "rest_framework.settings.api_settings.DEFAULT_THROTTLE_RATES",
+        {"login.ip": "1/min"},
+    )
+    def test_login_is_throttled_per_ip(self):
+        url = reverse("custom_auth:token_obtain_pair")
+        body = {"username": "nobody", "password": "x"}
+        self.assertEqual(self.client.post(url, body).status_code, 400)
+        response = self.client.post(url, body)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "60")
+
+    def test_bucket_refills(self):
+        store = DatabaseBucketStore()
+        with mock.patch("custom_auth.throttling.time.time", return_value=1000.0):
+            self.assertIsNone(store.take("key", 2, 60))
+            self.assertIsNone(store.take("key", 2, 60))
+            self.assertAlmostEqual(store.take("key", 2, 60), 30.0)
+        with mock.patch("custom_auth.throttling.time.time", return_value=1030.0):
+            self.assertIsNone(store.take("key", 2, 60))
+            self.assertIsNotNone(store.take("key", 2, 60))
@@ -0,0 +1,171 @@
+"""
+Token-bucket throttling on a store shared by all workers.
+
+A rate such as ``"5/min"`` is a bucket holding 5 tokens that refills at
+5 per minute. Each bucket is kept as a single number, the time at which
+it will be full again (the GCRA form of a token bucket), so taking a
+token is one conditional UPDATE in the database store or one WATCHed
+SET in the Redis store.
+
+Rates live in REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"] under
+``"<view throttle_scope>.<ip|email|user>"``; a view only gets the
+buckets that have a rate configured.
+"""
+
+import math
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils.module_loading import import_string
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .models import RateLimitBucket
+
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """``"10/hour"`` -> (10, 3600)."""
+    tokens, period = rate.split("/")
+    return int(tokens), PERIODS[period[0]]
+
+
+class DatabaseBucketStore:
+    def take(self, key, capacity, period):
+        """Take a token; return None if allowed, else seconds until one is free."""
+        now = time.time()
+        interval = period / capacity
+        latest = now + period - interval
+        for _ in range(2):
+            taken = RateLimitBucket.objects.filter(key=key, full_at__lte=latest).update(
+                full_at=Greatest(F("full_at"), Value(now)) + interval
+            )
+            if taken:
+                return None
+            try:
+                with transaction.atomic():
+                    RateLimitBucket.objects.create(key=key, full_at=now + interval)
+                return None
+            except IntegrityError:
+                full_at = (
+                    RateLimitBucket.objects.filter(key=key)
+                    .values_list("full_at", flat=True)
+                    .first()
+                )
+                if full_at is not None and full_at > latest:
+                    return full_at - latest
+        return interval
+
+    def sweep(self):
+        return RateLimitBucket.objects.filter(full_at__lt=time.time()).delete()[0]
+
+
+class RedisBucketStore:
+    """Needs the ``redis`` package; keys expire once their bucket is full."""
+
+    def __init__(self, client=None):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(settings.THROTTLE_STORE_URL)
+        self.client = client
+
+    def take(self, key, capacity, period):
+        from redis.exceptions import WatchError
+
+        interval = period / capacity
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    now = time.time()
+                    latest = now + period - interval
+                    full_at = float(pipe.get(key) or now)
+                    if full_at > latest:
+                        return full_at - latest
+                    full_at = max(full_at, now) + interval
+                    pipe.multi()
+                    pipe.set(key, full_at, px=math.ceil((full_at - now) * 1000))
+                    pipe.execute()
+                    return None
+                except WatchError:
+                    continue
+
+    def sweep(self):
+        return 0
+
+
+_store = None
+
+
+def get_bucket_store():
+    global _store
+    if _store is None:
+        _store = import_string(
+            getattr(
+                settings, "THROTTLE_STORE", "custom_auth.throttling.DatabaseBucketStore"
+            )
+        )()
+    return _store
+
+
+def throttle_wait(scope, kind, ident):
+    """
+    Take a token from the ``scope.kind`` bucket for ``ident``. Returns None
+    when the request may proceed, else the seconds to wait.
+    """
+    rate = api_settings.DEFAULT_THROTTLE_RATES.get(f"{scope}.{kind}")
+    if not rate or ident is None:
+        return None
+    capacity, period = parse_rate(rate)
+    return get_bucket_store().take(f"throttle:{scope}:{kind}:{ident}", capacity, period)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Base for the per-IP, per-email and per-user throttles below."""
+
+    kind = None
+
+    def get_ident_value(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        scope = getattr(view, "throttle_scope", None)
+        if scope is None:
+            return True
+        self.wait_seconds = throttle_wait(scope, self.kind, self.get_ident_value(request))
+        return self.wait_seconds is None
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class IPRateThrottle(TokenBucketThrottle):
+    kind = "ip"
+
+    def get_ident_value(self, request):
+        return self.get_ident(request)
+
+
+class EmailRateThrottle(TokenBucketThrottle):
+    """Keyed on the ``email`` in the request body."""
+
+    kind = "email"
+
+    def get_ident_value(self, request):
+        email = request.data.get("email") if hasattr(request.data, "get") else None
+        return email.strip().lower() if isinstance(email, str) and email else None
+
+
+class UserRateThrottle(TokenBucketThrottle):
+    kind = "user"
+
+    def get_ident_value(self, request):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return None
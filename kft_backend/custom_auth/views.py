@@ -1,263 +1,478 @@
-from django.contrib.auth.models import User
-from django.contrib.auth.tokens import PasswordResetTokenGenerator
-from django.core.mail import send_mail
-from django.utils.http import urlsafe_base64_decode
-from django.utils.encoding import force_str
-from django.shortcuts import get_object_or_404
-from django.conf import settings
-from django.core.cache import cache
-from django.utils import timezone
-import random
-import datetime
-from consumer.models import ConsumerBalance
-
-
-from rest_framework.views import APIView
-from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
-
-from rest_framework import status, permissions, generics
-from .serializers import (
-    UserSerializer,
-    UserCreateSerializer,
-    UserUpdateSerializer,
-    LoginSerializer,
-    PasswordChangeSerializer,
-    ForgotPasswordSerializer,
-    OTPVerificationSerializer,
-    VerifyPasswordResetOTPSerializer,
-    SetNewPasswordSerializer,
-)
-from .permissions import IsAdminOrOwner, IsAdminUser
-
-from rest_framework.authtoken.models import Token
-
-
-def send_otp_email(email, otp_code):
-    subject = "Your One-Time Password (OTP)"
-    message = f"Your One-Time Password (OTP) is: {otp_code}\nThis OTP is valid for 10 minutes."
-    email_from = getattr(settings, "EMAIL_HOST_USER", "noreply@example.com")
-    recipient_list = [email]
-    try:
-        send_mail(subject, message, email_from, recipient_list, fail_silently=False)
-    except Exception as e:
-        print(f"ERROR: Could not send OTP email to {email}. Reason: {e}")
-
-
-OTP_EXPIRY_MINUTES = 10
-PWD_RESET_OTP_EXPIRY_MINUTES = 10
-PWD_RESET_SESSION_TOKEN_EXPIRY_MINUTES = 10
-
-
-class AuthView(APIView):
-    def get_permissions(self):
-        if self.request.method == "GET":
-            return [permissions.IsAuthenticated(), IsAdminUser()]
-        elif self.request.method == "POST":
-            return [permissions.AllowAny()]
-        return super().get_permissions()
-
-    def get(self, request):
-        users = User.objects.all()
-        serializer = UserSerializer(users, many=True)
-        return Response(serializer.data)
-
-    def post(self, request):
-        serializer = UserCreateSerializer(data=request.data)
-        if serializer.is_valid():
-            pending_user_data = serializer.validated_data
-            email = pending_user_data["email"]
-
-            if (
-                User.objects.filter(email=email).exists()
-                or User.objects.filter(username=pending_user_data["username"]).exists()
-            ):
-                return Response(
-                    {"error": "A user with this email or username already exists."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            otp_code = str(random.randint(100000, 999999))
-            expires_at = timezone.now() + datetime.timedelta(minutes=OTP_EXPIRY_MINUTES)
-
-            cache_key = f"reg_otp_{email}"
-            cache_data = {
-                "otp_code": otp_code,
-                "expires_at_timestamp": expires_at.timestamp(),
-                "pending_user_data": pending_user_data,
-            }
-            cache.set(cache_key, cache_data, timeout=(OTP_EXPIRY_MINUTES * 60) + 60)
-
-            send_otp_email(email, otp_code)
-
-            return Response(
-                {
-                    "message": f"OTP sent to {email}. Please verify to complete registration."
-                },
-                status=status.HTTP_200_OK,
-            )
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-
-class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = User.objects.all()
-    permission_classes = [permissions.IsAuthenticated, IsAdminOrOwner]
-
-    def get_serializer_class(self):
-        if self.request.method in ["PUT", "PATCH"]:
-            return UserUpdateSerializer
-        return UserSerializer
-
-
-class ChangePasswordView(APIView):
-    permission_classes = [permissions.IsAuthenticated]
-
-    def post(self, request, *args, **kwargs):
-        serializer = PasswordChangeSerializer(
-            data=request.data, context={"request": request}
-        )
-        if serializer.is_valid():
-            serializer.save()
-            return Response(
-                {"message": "Password changed successfully."}, status=status.HTTP_200_OK
-            )
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-
-class ForgotPasswordView(APIView):
-    permission_classes = [permissions.AllowAny]
-
-    def post(self, request, *args, **kwargs):
-        serializer = ForgotPasswordSerializer(data=request.data)
-        if serializer.is_valid():
-            email = serializer.validated_data["email"]
-            user = User.objects.get(email=email)
-
-            otp_code = str(random.randint(100000, 999999))
-            expires_at = timezone.now() + datetime.timedelta(
-                minutes=PWD_RESET_OTP_EXPIRY_MINUTES
-            )
-
-            cache_key = f"pwd_reset_otp_{email}"
-            cache_data = {
-                "otp_code": otp_code,
-                "user_id": user.id,
-                "expires_at_timestamp": expires_at.timestamp(),
-            }
-            cache.set(
-                cache_key, cache_data, timeout=(PWD_RESET_OTP_EXPIRY_MINUTES * 60) + 60
-            )
-
-            send_otp_email(email, otp_code)
-
-            return Response(
-                {"message": f"An OTP has been sent to {email} for password reset."},
-                status=status.HTTP_200_OK,
-            )
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-
-class OTPVerificationView(APIView):
-    permission_classes = [permissions.AllowAny]
-
-    def post(self, request, *args, **kwargs):
-        serializer = OTPVerificationSerializer(data=request.data)
-        if serializer.is_valid():
-            user = serializer.save()
-
-            return_serializer = UserSerializer(user)
-            refresh = RefreshToken.for_user(user)
-
-            return Response(
-                {
-                    "message": "Account verified and created successfully. You can now log in.",
-                    "user": return_serializer.data,
-                    "refresh": str(refresh),
-                    "access": str(refresh.access_token),
-                },
-                status=status.HTTP_201_CREATED,
-            )
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-
-class LoginView(APIView):
-    permission_classes = [permissions.AllowAny]
-    serializer_class = LoginSerializer
-
-    def post(self, request, *args, **kwargs):
-        serializer = self.serializer_class(
-            data=request.data, context={"request": request}
-        )
-        serializer.is_valid(raise_exception=True)
-
-        user = serializer.validated_data["user"]
-
-        refresh = RefreshToken.for_user(user)
-
-        return Response(
-            {
-                "user": UserSerializer(user).data,
-                "refresh": str(refresh),
-                "access": str(refresh.access_token),
-            },
-            status=status.HTTP_200_OK,
-        )
-
-
-class VerifyPasswordResetOTPView(APIView):
-    permission_classes = [permissions.AllowAny]
-
-    def post(self, request, *args, **kwargs):
-        serializer = VerifyPasswordResetOTPSerializer(data=request.data)
-        if serializer.is_valid():
-            email = serializer.validated_data["email"]
-            user_id = serializer._user_id
-            session_token = str(random.randint(10000000, 99999999))
-            expires_at = timezone.now() + datetime.timedelta(
-                minutes=PWD_RESET_SESSION_TOKEN_EXPIRY_MINUTES
-            )
-
-            session_cache_key = f"pwd_reset_session_{session_token}"
-            session_cache_data = {
-                "user_id": user_id,
-                "expires_at_timestamp": expires_at.timestamp(),
-            }
-            cache.set(
-                session_cache_key,
-                session_cache_data,
-                timeout=(PWD_RESET_SESSION_TOKEN_EXPIRY_MINUTES * 60) + 60,
-            )
-
-            otp_cache_key = f"pwd_reset_otp_{email}"
-            cache.delete(otp_cache_key)
-
-            return Response(
-                {
-                    "message": "OTP verified. Use the provided token to set a new password.",
-                    "reset_session_token": session_token,
-                },
-                status=status.HTTP_200_OK,
-            )
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-
-class SetNewPasswordView(APIView):
-    permission_classes = [permissions.AllowAny]
-
-    def post(self, request, *args, **kwargs):
-        serializer = SetNewPasswordSerializer(data=request.data)
-        if serializer.is_valid():
-            user_id = serializer._user_id
-            new_password = serializer.validated_data["new_password"]
-            session_token = serializer.validated_data["reset_session_token"]
-
-            user = get_object_or_404(User, pk=user_id)
-            user.set_password(new_password)
-            user.save()
-
-            cache.delete(f"pwd_reset_session_{session_token}")
-            return Response(
-                {"message": "Password has been reset successfully."},
-                status=status.HTTP_200_OK,
-            )
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.utils.http import urlsafe_base64_decode
+from django.utils.encoding import force_str
+from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.utils import timezone
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django.db.models import F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from asgiref.sync import sync_to_async
+import json
+import math
+import random
+import datetime
+import hashlib
+from decimal import Decimal
+from consumer.models import ConsumerBalance
+from agent.models import AgentBalance
+from merchant.models import MerchantBalance, MerchantBalanceShard
+
+
+from rest_framework.views import APIView
+from rest_framework.response import Response
+
+from rest_framework import status, permissions, generics
+from .serializers import (
+    UserSerializer,
+    UserCreateSerializer,
+    UserUpdateSerializer,
+    LoginSerializer,
+    PasswordChangeSerializer,
+    ForgotPasswordSerializer,
+    OTPVerificationSerializer,
+    VerifyPasswordResetOTPSerializer,
+    SetNewPasswordSerializer,
+    LogoutSerializer,
+    TokenRevokeSerializer,
+)
+from .authentication import get_roles, token_for_user
+from .hashing import PasswordPoolSaturated, check_credentials
+from .otp_store import get_otp_store
+from .outbox import enqueue_email
+from .throttling import EmailRateThrottle, IPRateThrottle, throttle_wait
+from .permissions import IsAdminOrOwner, IsAdminUser, is_admin
+from .revocation import revoke
+
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.settings import api_settings
+
+
+def send_otp_email(email, otp_code, expires_at):
+    # Queued; the drain_email_outbox worker does the SMTP round trip.
+    subject = "Your One-Time Password (OTP)"
+    message = f"Your One-Time Password (OTP) is: {otp_code}\nThis OTP is valid for 10 minutes."
+    enqueue_email(subject, message, email, expires_at=expires_at)
+
+
+OTP_EXPIRY_MINUTES = 10
+PWD_RESET_OTP_EXPIRY_MINUTES = 10
+PWD_RESET_SESSION_TOKEN_EXPIRY_MINUTES = 10
+
+
+class AuthView(APIView):
+    throttle_scope = "register"
+    throttle_classes = [IPRateThrottle, EmailRateThrottle]
+
+    def get_throttles(self):
+        if self.request.method == "POST":
+            return super().get_throttles()
+        return []
+
+    def get_permissions(self):
+        if self.request.method == "GET":
+            return [permissions.IsAuthenticated(), IsAdminUser()]
+        elif self.request.method == "POST":
+            return [permissions.AllowAny()]
+        return super().get_permissions()
+
+    def get(self, request):
+        # Unpaginated for the admin web client; the paginated directory is
+        # custom_admin's UserDirectoryView.
+        users = User.objects.all()
+        serializer = UserSerializer(users, many=True)
+        return Response(serializer.data)
+
+    def post(self, request):
+        serializer = UserCreateSerializer(data=request.data)
+        if serializer.is_valid():
+            pending_user_data = serializer.validated_data
+            email = pending_user_data["email"]
+
+            if (
+                User.objects.filter(email=email).exists()
+                or User.objects.filter(username=pending_user_data["username"]).exists()
+            ):
+                return Response(
+                    {"error": "A user with this email or username already exists."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            otp_code = str(random.randint(100000, 999999))
+            expires_at = timezone.now() + datetime.timedelta(minutes=OTP_EXPIRY_MINUTES)
+
+            otp_key = f"reg_otp_{email}"
+            otp_data = {
+                "otp_code": otp_code,
+                "expires_at_timestamp": expires_at.timestamp(),
+                # The session sits in the database or Redis until it is
+                # verified; it only ever holds the password hash.
+                "pending_user_data": {
+                    **pending_user_data,
+                    "password": make_password(pending_user_data["password"]),
+                },
+            }
+            get_otp_store().put(otp_key, otp_data, (OTP_EXPIRY_MINUTES * 60) + 60)
+
+            send_otp_email(email, otp_code, expires_at)
+
+            return Response(
+                {
+                    "message": f"OTP sent to {email}. Please verify to complete registration."
+                },
+                status=status.HTTP_200_OK,
+            )
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
+    queryset = User.objects.all()
+    permission_classes = [permissions.IsAuthenticated, IsAdminOrOwner]
+
+    def get_serializer_class(self):
+        if self.request.method in ["PUT", "PATCH"]:
+            return UserUpdateSerializer
+        return UserSerializer
+
+
+ME_FIELDS = ("id", "username", "email", "first_name", "last_name")
+
+
+class MeView(APIView):
+    """
+    The authenticated user with all of its roles and balances, read in one
+    query. The ETag covers the user fields and each balance's updated_at,
+    so a client polling with If-None-Match gets a 304 without the body
+    being built.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_row(self):
+        shards = MerchantBalanceShard.objects.filter(merchant=OuterRef("pk")).values(
+            "merchant"
+        )
+        merchants = MerchantBalance.objects.filter(user=OuterRef("pk")).annotate(
+            total=F("balance")
+            + Coalesce(
+                Subquery(shards.annotate(total=Sum("balance")).values("total")),
+                Value(Decimal("0.00")),
+            ),
+            changed_at=Coalesce(
+                Subquery(shards.annotate(latest=Max("updated_at")).values("latest")),
+                F("updated_at"),
+            ),
+        )
+        consumers = ConsumerBalance.objects.filter(user=OuterRef("pk"))
+        agents = AgentBalance.objects.filter(user=OuterRef("pk"))
+        return (
+            User.objects.filter(pk=self.request.user.pk)
+            .annotate(
+                consumer_balance=Subquery(consumers.values("balance")[:1]),
+                consumer_updated_at=Subquery(consumers.values("updated_at")[:1]),
+                agent_balance=Subquery(agents.values("balance")[:1]),
+                agent_updated_at=Subquery(agents.values("updated_at")[:1]),
+                merchant_balance=Subquery(merchants.values("total")[:1]),
+                merchant_updated_at=Subquery(merchants.values("updated_at")[:1]),
+                merchant_shards_updated_at=Subquery(merchants.values("changed_at")[:1]),
+            )
+            .values(
+                *ME_FIELDS,
+                "consumer_balance",
+                "consumer_updated_at",
+                "agent_balance",
+                "agent_updated_at",
+                "merchant_balance",
+                "merchant_updated_at",
+                "merchant_shards_updated_at",
+            )
+            .first()
+        )
+
+    def get(self, request, *args, **kwargs):
+        row = self.get_row()
+        if row is None:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        roles = sorted(get_roles(request))
+        etag = quote_etag(
+            hashlib.md5(repr((row, roles)).encode(), usedforsecurity=False).hexdigest()
+        )
+
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(
+                {
+                    **{field: row[field] for field in ME_FIELDS},
+                    "roles": roles,
+                    "balances": {
+                        kind: row[f"{kind}_balance"]
+                        for kind in ("consumer", "agent", "merchant")
+                        if row[f"{kind}_balance"] is not None
+                    },
+                }
+            )
+        response["ETag"] = etag
+        patch_vary_headers(response, ["Authorization"])
+        return response
+
+
+class ChangePasswordView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        # The authenticated principal may be a cached stub without a password.
+        request.user = get_object_or_404(User, pk=request.user.pk)
+        serializer = PasswordChangeSerializer(
+            data=request.data, context={"request": request}
+        )
+        if serializer.is_valid():
+            serializer.save()
+            return Response(
+                {"message": "Password changed successfully."}, status=status.HTTP_200_OK
+            )
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class LogoutView(APIView):
+    """
+    Revoke the access token used for this request and, when given, the
+    refresh token it was issued with.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = LogoutSerializer(data=request.data, context={"request": request})
+        serializer.is_valid(raise_exception=True)
+        revoke(request.auth, request.user)
+        if "refresh" in serializer.validated_data:
+            revoke(serializer.validated_data["refresh"], request.user)
+        return Response({"message": "Logged out."}, status=status.HTTP_200_OK)
+
+
+class TokenRevokeView(APIView):
+    """
+    Revoke any access or refresh token. Users may revoke their own
+    tokens, admins anyone's.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = TokenRevokeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        token = serializer.validated_data["token"]
+        owner = User.objects.filter(
+            username=token.get(api_settings.USER_ID_CLAIM)
+        ).first()
+        if not is_admin(request) and (owner is None or owner.pk != request.user.pk):
+            return Response(
+                {"detail": "You are not authorized to perform this action."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        revoke(token, owner)
+        return Response({"message": "Token revoked."}, status=status.HTTP_200_OK)
+
+
+class ForgotPasswordView(APIView):
+    permission_classes = [permissions.AllowAny]
+    throttle_scope = "password_reset"
+    throttle_classes = [IPRateThrottle, EmailRateThrottle]
+
+    def post(self, request, *args, **kwargs):
+        serializer = ForgotPasswordSerializer(data=request.data)
+        if serializer.is_valid():
+            email = serializer.validated_data["email"]
+            user = User.objects.get(email=email)
+
+            otp_code = str(random.randint(100000, 999999))
+            expires_at = timezone.now() + datetime.timedelta(
+                minutes=PWD_RESET_OTP_EXPIRY_MINUTES
+            )
+
+            otp_key = f"pwd_reset_otp_{email}"
+            otp_data = {
+                "otp_code": otp_code,
+                "user_id": user.id,
+                "expires_at_timestamp": expires_at.timestamp(),
+            }
+            get_otp_store().put(
+                otp_key, otp_data, (PWD_RESET_OTP_EXPIRY_MINUTES * 60) + 60
+            )
+
+            send_otp_email(email, otp_code, expires_at)
+
+            return Response(
+                {"message": f"An OTP has been sent to {email} for password reset."},
+                status=status.HTTP_200_OK,
+            )
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class OTPVerificationView(APIView):
+    permission_classes = [permissions.AllowAny]
+    throttle_scope = "otp_verify"
+    throttle_classes = [IPRateThrottle, EmailRateThrottle]
+
+    def post(self, request, *args, **kwargs):
+        serializer = OTPVerificationSerializer(data=request.data)
+        if serializer.is_valid():
+            user = serializer.save()
+
+            return_serializer = UserSerializer(user)
+            refresh = token_for_user(user)
+
+            return Response(
+                {
+                    "message": "Account verified and created successfully. You can now log in.",
+                    "user": return_serializer.data,
+                    "refresh": str(refresh),
+                    "access": str(refresh.access_token),
+                },
+                status=status.HTTP_201_CREATED,
+            )
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class LoginView(View):
+    """
+    Async token login. Requests are throttled per IP and per username
+    ("login" scope) before anything else; the password check then runs on
+    the bounded pool in custom_auth.hashing, and when that pool is full
+    the login is shed with 503 and Retry-After instead of queueing.
+    """
+
+    throttle_scope = "login"
+
+    async def post(self, request, *args, **kwargs):
+        wait = await sync_to_async(throttle_wait)(
+            self.throttle_scope, "ip", IPRateThrottle().get_ident(request)
+        )
+        if wait is not None:
+            return self.throttled(wait)
+
+        if request.content_type == "application/json":
+            try:
+                data = json.loads(request.body or b"{}")
+            except ValueError:
+                return JsonResponse({"detail": "JSON parse error."}, status=400)
+        else:
+            data = request.POST
+
+        username = data.get("username") if hasattr(data, "get") else None
+        if isinstance(username, str) and username:
+            wait = await sync_to_async(throttle_wait)(self.throttle_scope, "user", username)
+            if wait is not None:
+                return self.throttled(wait)
+
+        serializer = LoginSerializer(data=data)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            user = await check_credentials(**serializer.validated_data)
+        except PasswordPoolSaturated:
+            response = JsonResponse(
+                {"detail": "Too many logins in progress. Try again shortly."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+            response["Retry-After"] = str(getattr(settings, "LOGIN_RETRY_AFTER", 1))
+            return response
+
+        if user is None:
+            return JsonResponse(
+                {"non_field_errors": ["Unable to log in with provided credentials."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        refresh = await sync_to_async(token_for_user)(user)
+        return JsonResponse(
+            {
+                "user": UserSerializer(user).data,
+                "refresh": str(refresh),
+                "access": str(refresh.access_token),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    def throttled(self, wait):
+        response = JsonResponse(
+            {"detail": f"Request was throttled. Expected available in {math.ceil(wait)} seconds."},
+            status=status.HTTP_429_TOO_MANY_REQUESTS,
+        )
+        response["Retry-After"] = str(math.ceil(wait))
+        return response
+
+
+class VerifyPasswordResetOTPView(APIView):
+    permission_classes = [permissions.AllowAny]
+    throttle_scope = "otp_verify"
+    throttle_classes = [IPRateThrottle, EmailRateThrottle]
+
+    def post(self, request, *args, **kwargs):
+        serializer = VerifyPasswordResetOTPSerializer(data=request.data)
+        if serializer.is_valid():
+            user_id = serializer._user_id
+            session_token = str(random.randint(10000000, 99999999))
+            expires_at = timezone.now() + datetime.timedelta(
+                minutes=PWD_RESET_SESSION_TOKEN_EXPIRY_MINUTES
+            )
+
+            session_key = f"pwd_reset_session_{session_token}"
+            session_data = {
+                "user_id": user_id,
+                "expires_at_timestamp": expires_at.timestamp(),
+            }
+            get_otp_store().put(
+                session_key,
+                session_data,
+                (PWD_RESET_SESSION_TOKEN_EXPIRY_MINUTES * 60) + 60,
+            )
+
+            return Response(
+                {
+                    "message": "OTP verified. Use the provided token to set a new password.",
+                    "reset_session_token": session_token,
+                },
+                status=status.HTTP_200_OK,
+            )
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class SetNewPasswordView(APIView):
+    permission_classes = [permissions.AllowAny]
+    throttle_scope = "otp_verify"
+    throttle_classes = [IPRateThrottle]
+
+    def post(self, request, *args, **kwargs):
+        serializer = SetNewPasswordSerializer(data=request.data)
+        if serializer.is_valid():
+            user_id = serializer._user_id
+            new_password = serializer.validated_data["new_password"]
+            session_token = serializer.validated_data["reset_session_token"]
+
+            # Consume the session first so it cannot be used twice.
+            if not get_otp_store().take(f"pwd_reset_session_{session_token}"):
+                return Response(
+                    {"reset_session_token": ["Invalid or expired password reset session."]},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            user = get_object_or_404(User, pk=user_id)
+            user.set_password(new_password)
+            user.save()
+
+            return Response(
+                {"message": "Password has been reset successfully."},
+                status=status.HTTP_200_OK,
+            )
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -1,16 +1,20 @@
-"""
-ASGI config for kft_backend project.
-
-It exposes the ASGI callable as a module-level variable named ``application``.
-
-For more information on this file, see
-https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
-"""
-
-import os
-
-from django.core.asgi import get_asgi_application
-
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kft_backend.settings')
-
-application = get_asgi_application()
+"""
+ASGI config for kft_backend project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kft_backend.settings')
+
+application = get_asgi_application()
+
+from custom_auth.revocation import refresh_in_background  # noqa: E402
+
+refresh_in_background()
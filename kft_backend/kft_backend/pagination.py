@@ -0,0 +1,105 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination over ``ordering``, which must end in a unique
+    field. Each page is fetched with a ``WHERE (ordering) < (cursor)`` bound
+    instead of an OFFSET, so deep pages cost the same as the first one.
+
+    The body stays a plain list so existing clients keep working; the next
+    page is advertised in a ``Link: <...>; rel="next"`` header.
+    """
+
+    ordering = ("-created_at", "-id")
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor."
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, "keyset_ordering", self.ordering)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(request, queryset, view)
+        page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self.after(self.decode_cursor(cursor, queryset)))
+
+        page = list(queryset[: page_size + 1])
+        self.next_cursor = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_cursor = self.encode_cursor(page[-1])
+        return page
+
+    def after(self, values):
+        """
+        Rows strictly after ``values`` in ``ordering``. The leading bound is
+        repeated as a plain range so the database can seek on the index.
+        """
+        fields = [(name.lstrip("-"), name.startswith("-")) for name in self.ordering]
+        condition = Q()
+        for position, (name, descending) in enumerate(fields):
+            clause = Q(**{f"{name}__{'lt' if descending else 'gt'}": values[position]})
+            for (previous, _), value in zip(fields[:position], values):
+                clause &= Q(**{previous: value})
+            condition |= clause
+        first, descending = fields[0]
+        return Q(**{f"{first}__{'lte' if descending else 'gte'}": values[0]}) & condition
+
+    def encode_cursor(self, instance):
+        values = [getattr(instance, name.lstrip("-")) for name in self.ordering]
+        payload = json.dumps(
+            [value.isoformat() if hasattr(value, "isoformat") else str(value) for value in values]
+        )
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, cursor, queryset):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                queryset.model._meta.get_field(name.lstrip("-")).to_python(value)
+                for name, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        headers = {}
+        next_link = self.get_next_link()
+        if next_link:
+            headers["Link"] = f'<{next_link}>; rel="next"'
+        return Response(data, headers=headers)
+
+    def get_paginated_response_schema(self, schema):
+        return schema
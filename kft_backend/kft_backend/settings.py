@@ -1,212 +1,317 @@
-"""
-Django settings for kft_backend project.
-
-Generated by 'django-admin startproject' using Django 5.0.2.
-
-For more information on this file, see
-https://docs.djangoproject.com/en/5.0/topics/settings/
-
-For the full list of settings and their values, see
-https://docs.djangoproject.com/en/5.0/ref/settings/
-"""
-
-from pathlib import Path
-import os
-from dotenv import load_dotenv
-from datetime import timedelta
-
-# Build paths inside the project like this: BASE_DIR / 'subdir'.
-BASE_DIR = Path(__file__).resolve().parent.parent
-
-load_dotenv(BASE_DIR / ".env")
-
-
-# Quick-start development settings - unsuitable for production
-# See https://docs.djangoproject.com/en/5.0/howto/deployment/checklist/
-
-# SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = os.environ.get("SECRET_KEY")
-
-
-# SECURITY WARNING: don't run with debug turned on in production!
-# Convert DEBUG to boolean
-DEBUG_STR = os.environ.get("DEBUG", "False")
-if DEBUG_STR.lower() in ("true", "1", "t"):
-    DEBUG = True
-else:
-    DEBUG = False
-
-ALLOWED_HOSTS = []
-
-
-SIMPLE_JWT = {
-    "ACCESS_TOKEN_LIFETIME": timedelta(days=10000),
-    "REFRESH_TOKEN_LIFETIME": timedelta(days=10000),
-    "ROTATE_REFRESH_TOKENS": False,
-    "BLACKLIST_AFTER_ROTATION": False,
-    "UPDATE_LAST_LOGIN": False,
-    "ALGORITHM": "HS256",
-    "SIGNING_KEY": SECRET_KEY,
-    "VERIFYING_KEY": "",
-    "AUDIENCE": None,
-    "ISSUER": None,
-    "JSON_ENCODER": None,
-    "JWK_URL": None,
-    "LEEWAY": 0,
-    "AUTH_HEADER_TYPES": ("Bearer",),
-    "AUTH_HEADER_NAME": "HTTP_AUTHORIZATION",
-    "USER_ID_FIELD": "username",
-    "USER_ID_CLAIM": "username",
-    "USER_AUTHENTICATION_RULE": "rest_framework_simplejwt.authentication.default_user_authentication_rule",
-    "AUTH_TOKEN_CLASSES": ("rest_framework_simplejwt.tokens.AccessToken",),
-    "TOKEN_TYPE_CLAIM": "token_type",
-    "TOKEN_USER_CLASS": "rest_framework_simplejwt.models.TokenUser",
-    "JTI_CLAIM": "jti",
-    "SLIDING_TOKEN_REFRESH_EXP_CLAIM": "refresh_exp",
-    "SLIDING_TOKEN_LIFETIME": timedelta(minutes=5),
-    "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
-    "TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainPairSerializer",
-    "TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSerializer",
-    "TOKEN_VERIFY_SERIALIZER": "rest_framework_simplejwt.serializers.TokenVerifySerializer",
-    "TOKEN_BLACKLIST_SERIALIZER": "rest_framework_simplejwt.serializers.TokenBlacklistSerializer",
-    "SLIDING_TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainSlidingSerializer",
-    "SLIDING_TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSlidingSerializer",
-}
-
-# Application definition
-
-INSTALLED_APPS = [
-    "django.contrib.admin",
-    "django.contrib.auth",
-    "django.contrib.contenttypes",
-    "django.contrib.sessions",
-    "django.contrib.messages",
-    "django.contrib.staticfiles",
-    "rest_framework",
-    "rest_framework_simplejwt",
-    "corsheaders",
-    "custom_auth.apps.CustomAuthConfig",
-    "consumer.apps.ConsumerConfig",
-    "merchant.apps.MerchantConfig",
-    "agent.apps.AgentConfig",
-    "custom_admin.apps.CustomAdminConfig",
-]
-
-CORS_ORIGIN_ALLOW_ALL = True
-
-MIDDLEWARE = [
-    "corsheaders.middleware.CorsMiddleware",
-    "django.middleware.security.SecurityMiddleware",
-    "django.contrib.sessions.middleware.SessionMiddleware",
-    "django.middleware.common.CommonMiddleware",
-    "django.middleware.csrf.CsrfViewMiddleware",
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
-    "django.contrib.messages.middleware.MessageMiddleware",
-    "django.middleware.clickjacking.XFrameOptionsMiddleware",
-]
-
-ROOT_URLCONF = "kft_backend.urls"
-
-TEMPLATES = [
-    {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
-        "DIRS": [],
-        "APP_DIRS": True,
-        "OPTIONS": {
-            "context_processors": [
-                "django.template.context_processors.debug",
-                "django.template.context_processors.request",
-                "django.contrib.auth.context_processors.auth",
-                "django.contrib.messages.context_processors.messages",
-            ],
-        },
-    },
-]
-
-WSGI_APPLICATION = "kft_backend.wsgi.application"
-
-
-# Database
-# https://docs.djangoproject.com/en/5.0/ref/settings/#databases
-
-DB_ENGINE = os.environ.get("DB_ENGINE")
-
-if DB_ENGINE:
-    DATABASES = {
-        "default": {
-            "ENGINE": DB_ENGINE,
-            "NAME": os.environ.get("DB_NAME"),
-            "USER": os.environ.get("DB_USER"),
-            "PASSWORD": os.environ.get("DB_PASSWORD"),
-            "HOST": os.environ.get("DB_HOST"),
-            "PORT": os.environ.get("DB_PORT"),
-        }
-    }
-
-
-else:
-    DATABASES = {
-        "default": {
-            "ENGINE": "django.db.backends.sqlite3",
-            "NAME": BASE_DIR / "db.sqlite3",
-        }
-    }
-
-
-# Password validation
-# https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
-
-AUTH_PASSWORD_VALIDATORS = [
-    {
-        "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
-    },
-    {
-        "NAME": "django.contrib.auth.password_validation.MinimumLengthValidator",
-    },
-    {
-        "NAME": "django.contrib.auth.password_validation.CommonPasswordValidator",
-    },
-    {
-        "NAME": "django.contrib.auth.password_validation.NumericPasswordValidator",
-    },
-]
-
-
-# Internationalization
-# https://docs.djangoproject.com/en/5.0/topics/i18n/
-
-LANGUAGE_CODE = "en-us"
-
-TIME_ZONE = "UTC"
-
-USE_I18N = True
-
-USE_TZ = True
-
-
-# Static files (CSS, JavaScript, Images)
-# https://docs.djangoproject.com/en/5.0/howto/static-files/
-
-STATIC_URL = "static/"
-
-# Default primary key field type
-# https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
-
-DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
-
-
-EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
-EMAIL_HOST = "smtp.gmail.com"
-EMAIL_PORT = 587
-EMAIL_HOST_USER = os.environ.get("EMAIL_HOST_USER")
-EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD")
-EMAIL_USE_TLS = True
-DEFAULT_FROM_EMAIL = os.environ.get("DEFAULT_FROM_EMAIL", EMAIL_HOST_USER)
-
-
-# Django REST Framework Settings
-REST_FRAMEWORK = {
-    "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
-    ),
-}
+"""
+Django settings for kft_backend project.
+
+Generated by 'django-admin startproject' using Django 5.0.2.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.0/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/5.0/ref/settings/
+"""
+
+from pathlib import Path
+import os
+from dotenv import load_dotenv
+from datetime import timedelta
+
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+load_dotenv(BASE_DIR / ".env")
+
+
+# Quick-start development settings - unsuitable for production
+# See https://docs.djangoproject.com/en/5.0/howto/deployment/checklist/
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = os.environ.get("SECRET_KEY")
+
+
+# SECURITY WARNING: don't run with debug turned on in production!
+# Convert DEBUG to boolean
+DEBUG_STR = os.environ.get("DEBUG", "False")
+if DEBUG_STR.lower() in ("true", "1", "t"):
+    DEBUG = True
+else:
+    DEBUG = False
+
+ALLOWED_HOSTS = []
+
+
+SIMPLE_JWT = {
+    "ACCESS_TOKEN_LIFETIME": timedelta(days=10000),
+    "REFRESH_TOKEN_LIFETIME": timedelta(days=10000),
+    "ROTATE_REFRESH_TOKENS": False,
+    "BLACKLIST_AFTER_ROTATION": False,
+    "UPDATE_LAST_LOGIN": False,
+    "ALGORITHM": "HS256",
+    "SIGNING_KEY": SECRET_KEY,
+    "VERIFYING_KEY": "",
+    "AUDIENCE": None,
+    "ISSUER": None,
+    "JSON_ENCODER": None,
+    "JWK_URL": None,
+    "LEEWAY": 0,
+    "AUTH_HEADER_TYPES": ("Bearer",),
+    "AUTH_HEADER_NAME": "HTTP_AUTHORIZATION",
+    "USER_ID_FIELD": "username",
+    "USER_ID_CLAIM": "username",
+    "USER_AUTHENTICATION_RULE": "rest_framework_simplejwt.authentication.default_user_authentication_rule",
+    "AUTH_TOKEN_CLASSES": ("rest_framework_simplejwt.tokens.AccessToken",),
+    "TOKEN_TYPE_CLAIM": "token_type",
+    "TOKEN_USER_CLASS": "rest_framework_simplejwt.models.TokenUser",
+    "JTI_CLAIM": "jti",
+    "SLIDING_TOKEN_REFRESH_EXP_CLAIM": "refresh_exp",
+    "SLIDING_TOKEN_LIFETIME": timedelta(minutes=5),
+    "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
+    "TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSerializer",
+    "TOKEN_VERIFY_SERIALIZER": "rest_framework_simplejwt.serializers.TokenVerifySerializer",
+    "TOKEN_BLACKLIST_SERIALIZER": "rest_framework_simplejwt.serializers.TokenBlacklistSerializer",
+    "SLIDING_TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainSlidingSerializer",
+    "SLIDING_TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSlidingSerializer",
+}
+
+# Application definition
+
+INSTALLED_APPS = [
+    "django.contrib.admin",
+    "django.contrib.auth",
+    "django.contrib.contenttypes",
+    "django.contrib.sessions",
+    "django.contrib.messages",
+    "django.contrib.staticfiles",
+    "rest_framework",
+    "rest_framework_simplejwt",
+    "corsheaders",
+    "custom_auth.apps.CustomAuthConfig",
+    "consumer.apps.ConsumerConfig",
+    "merchant.apps.MerchantConfig",
+    "agent.apps.AgentConfig",
+    "custom_admin.apps.CustomAdminConfig",
+    "ledger.apps.LedgerConfig",
+]
+
+CORS_ORIGIN_ALLOW_ALL = True
+CORS_EXPOSE_HEADERS = ["Link"]
+
+MIDDLEWARE = [
+    "corsheaders.middleware.CorsMiddleware",
+    "django.middleware.security.SecurityMiddleware",
+    "django.contrib.sessions.middleware.SessionMiddleware",
+    "django.middleware.common.CommonMiddleware",
+    "django.middleware.csrf.CsrfViewMiddleware",
+    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "django.contrib.messages.middleware.MessageMiddleware",
+    "django.middleware.clickjacking.XFrameOptionsMiddleware",
+]
+
+ROOT_URLCONF = "kft_backend.urls"
+
+TEMPLATES = [
+    {
+        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "DIRS": [],
+        "APP_DIRS": True,
+        "OPTIONS": {
+            "context_processors": [
+                "django.template.context_processors.debug",
+                "django.template.context_processors.request",
+                "django.contrib.auth.context_processors.auth",
+                "django.contrib.messages.context_processors.messages",
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = "kft_backend.wsgi.application"
+
+
+# Database
+# https://docs.djangoproject.com/en/5.0/ref/settings/#databases
+
+DB_ENGINE = os.environ.get("DB_ENGINE")
+
+if DB_ENGINE:
+    DATABASES = {
+        "default": {
+            "ENGINE": DB_ENGINE,
+            "NAME": os.environ.get("DB_NAME"),
+            "USER": os.environ.get("DB_USER"),
+            "PASSWORD": os.environ.get("DB_PASSWORD"),
+            "HOST": os.environ.get("DB_HOST"),
+            "PORT": os.environ.get("DB_PORT"),
+        }
+    }
+
+
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db.sqlite3",
+        }
+    }
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# "catalog" holds the rendered product catalog pages (merchant.catalog).
+# Set CATALOG_CACHE_BACKEND/CATALOG_CACHE_LOCATION to a shared cache, e.g.
+# django.core.cache.backends.redis.RedisCache, so that every worker sees
+# catalog invalidations at once.
+# "principal" holds authenticated users' principals (custom_auth.authentication)
+# and is only used once JWT_PRINCIPAL_CACHE_TIMEOUT is set; point
+# PRINCIPAL_CACHE_BACKEND/PRINCIPAL_CACHE_LOCATION at the same kind of
+# shared cache.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "catalog": {
+        "BACKEND": os.environ.get(
+            "CATALOG_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("CATALOG_CACHE_LOCATION", "catalog"),
+    },
+    "principal": {
+        "BACKEND": os.environ.get(
+            "PRINCIPAL_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("PRINCIPAL_CACHE_LOCATION", "principal"),
+    },
+}
+
+
+# Password validation
+# https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
+    },
+    {
+        "NAME": "django.contrib.auth.password_validation.MinimumLengthValidator",
+    },
+    {
+        "NAME": "django.contrib.auth.password_validation.CommonPasswordValidator",
+    },
+    {
+        "NAME": "django.contrib.auth.password_validation.NumericPasswordValidator",
+    },
+]
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/5.0/topics/i18n/
+
+LANGUAGE_CODE = "en-us"
+
+TIME_ZONE = "UTC"
+
+USE_I18N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/5.0/howto/static-files/
+
+STATIC_URL = "static/"
+
+# Default primary key field type
+# https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
+
+DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# Mail is queued in the email_outbox table and sent by the
+# drain_email_outbox command; point EMAIL_BACKEND at the console or file
+# backend (with EMAIL_FILE_PATH) to run it without an SMTP server.
+EMAIL_BACKEND = os.environ.get(
+    "EMAIL_BACKEND", "django.core.mail.backends.smtp.EmailBackend"
+)
+EMAIL_FILE_PATH = os.environ.get("EMAIL_FILE_PATH", BASE_DIR / "sent_emails")
+EMAIL_HOST = "smtp.gmail.com"
+EMAIL_PORT = 587
+EMAIL_HOST_USER = os.environ.get("EMAIL_HOST_USER")
+EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD")
+EMAIL_USE_TLS = True
+DEFAULT_FROM_EMAIL = os.environ.get("DEFAULT_FROM_EMAIL", EMAIL_HOST_USER)
+
+
+# Django REST Framework Settings
+REST_FRAMEWORK = {
+    "DEFAULT_AUTHENTICATION_CLASSES": (
+        "custom_auth.authentication.RoleJWTAuthentication",
+    ),
+    # Token buckets for custom_auth.throttling, "<view scope>.<ip|email|user>".
+    "DEFAULT_THROTTLE_RATES": {
+        "register.ip": "20/hour",
+        "register.email": "5/hour",
+        "password_reset.ip": "20/hour",
+        "password_reset.email": "5/hour",
+        "otp_verify.ip": "60/hour",
+        "otp_verify.email": "10/hour",
+        "login.ip": "30/min",
+        "login.user": "10/min",
+        "money.user": "60/min",
+    },
+}
+
+
+# Seconds an authenticated user's principal (id, username, email, flags,
+# roles) stays in the "principal" cache so JWT requests skip the auth_user
+# lookup; 0 loads the user on every request. Changes are invalidated by
+# signal, but only in the cache of the worker that made them: with a
+# per-process cache, other workers keep a deactivated user, a removed role
+# or a deleted user for up to this long. Hence the default is 0 unless
+# PRINCIPAL_CACHE_BACKEND names a shared cache.
+JWT_PRINCIPAL_CACHE_TIMEOUT = int(
+    os.environ.get(
+        "JWT_PRINCIPAL_CACHE_TIMEOUT",
+        "60" if os.environ.get("PRINCIPAL_CACHE_BACKEND") else "0",
+    )
+)
+
+# Each server worker re-reads revoked token ids this often (seconds) from
+# the revoked_token table; 0 only loads them once per process. Management
+# commands and tests always load them once.
+REVOCATION_REFRESH_SECONDS = float(os.environ.get("REVOCATION_REFRESH_SECONDS", "5"))
+
+# Where registration/password-reset OTPs and reset sessions live. The
+# database store works out of the box (run sweep_otp_sessions
+# periodically); custom_auth.otp_store.RedisOTPStore uses OTP_STORE_URL
+# and needs the redis package.
+OTP_STORE = os.environ.get("OTP_STORE", "custom_auth.otp_store.DatabaseOTPStore")
+OTP_STORE_URL = os.environ.get("OTP_STORE_URL", "redis://localhost:6379/0")
+
+# Shared store for the DEFAULT_THROTTLE_RATES buckets; RedisBucketStore
+# uses THROTTLE_STORE_URL and needs the redis package.
+THROTTLE_STORE = os.environ.get(
+    "THROTTLE_STORE", "custom_auth.throttling.DatabaseBucketStore"
+)
+THROTTLE_STORE_URL = os.environ.get("THROTTLE_STORE_URL", OTP_STORE_URL)
+
+# Password checks for login run on a per-process pool of this many
+# threads; at most LOGIN_HASH_QUEUE_DEPTH more may wait before logins are
+# refused with 503 and Retry-After (seconds). 0 workers hashes inline.
+LOGIN_HASH_WORKERS = int(os.environ.get("LOGIN_HASH_WORKERS", "2"))
+LOGIN_HASH_QUEUE_DEPTH = int(os.environ.get("LOGIN_HASH_QUEUE_DEPTH", "16"))
+LOGIN_RETRY_AFTER = 1
+
+# Processes hashing passwords for the provision_users command, and
+# threads for the admin import; 0 or 1 hashes in the calling thread.
+PROVISION_HASH_WORKERS = int(
+    os.environ.get("PROVISION_HASH_WORKERS", str(os.cpu_count() or 1))
+)
+
+# "atomic" debits/credits with conditional UPDATEs; "row" is the legacy
+# read-modify-write path, kept for benchmarking.
+LEDGER_TRANSFER_MODE = os.environ.get("LEDGER_TRANSFER_MODE", "atomic")
+
+# Number of shard rows a merchant's incoming credits are spread over to
+# avoid a single hot row; 0 or 1 disables sharding.
+MERCHANT_BALANCE_SHARDS = int(os.environ.get("MERCHANT_BALANCE_SHARDS", "0"))
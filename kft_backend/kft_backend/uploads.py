@@ -0,0 +1,44 @@
+import csv
+import io
+import json
+
+from rest_framework.exceptions import ValidationError
+
+
+# Formats accepted by the bulk import endpoints and commands.
+UPLOAD_FORMATS = ("csv", "json")
+
+
+def read_rows(stream, format):
+    """Parse a CSV (with a header row) or a JSON list of objects into dicts."""
+    if format not in UPLOAD_FORMATS:
+        raise ValueError(f"Choose one of {', '.join(UPLOAD_FORMATS)}.")
+    text = stream.read()
+    if isinstance(text, bytes):
+        text = text.decode("utf-8-sig")
+    if format == "csv":
+        return list(csv.DictReader(io.StringIO(text)))
+    rows = json.loads(text)
+    if not isinstance(rows, list):
+        raise ValueError("Expected a JSON list of objects.")
+    return rows
+
+
+def rows_from_request(request):
+    """
+    Rows sent as a JSON list body, or as a CSV/JSON multipart ``file``
+    whose format comes from the ``format`` field or the file extension.
+    """
+    upload = request.FILES.get("file")
+    if upload is None:
+        if not isinstance(request.data, list):
+            raise ValidationError({"detail": "Send a JSON list or a file."})
+        return request.data
+
+    format = request.data.get("format") or upload.name.rsplit(".", 1)[-1].lower()
+    if format not in UPLOAD_FORMATS:
+        raise ValidationError({"format": f"Choose one of {', '.join(UPLOAD_FORMATS)}."})
+    try:
+        return read_rows(upload, format)
+    except (UnicodeDecodeError, ValueError) as exc:
+        raise ValidationError({"file": str(exc)})
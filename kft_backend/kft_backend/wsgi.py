@@ -1,16 +1,20 @@
-"""
-WSGI config for kft_backend project.
-
-It exposes the WSGI callable as a module-level variable named ``application``.
-
-For more information on this file, see
-https://docs.djangoproject.com/en/5.0/howto/deployment/wsgi/
-"""
-
-import os
-
-from django.core.wsgi import get_wsgi_application
-
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kft_backend.settings')
-
-application = get_wsgi_application()
+"""
+WSGI config for kft_backend project.
+
+It exposes the WSGI callable as a module-level variable named ``application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.0/howto/deployment/wsgi/
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kft_backend.settings')
+
+application = get_wsgi_application()
+
+from custom_auth.revocation import refresh_in_background  # noqa: E402
+
+refresh_in_background()
@@ -0,0 +1,90 @@
+"""
+Helpers shared by the ledger benchmark management commands.
+
+Workers run in separate processes so they contend on the database the
+way separate gunicorn workers do. Models are imported inside the worker
+functions because child processes may have to set Django up first.
+"""
+
+import time
+
+import django
+from django.db import connections
+
+
+def init_worker():
+    django.setup()
+    connections.close_all()
+
+
+def cash_in_worker(args):
+    """
+    Repeatedly cash-in ``amount`` from one agent to a set of consumers,
+    reloading the accounts before every transfer like the view does.
+    Returns (succeeded, rejected, errors).
+    """
+    from django.test import override_settings
+
+    from agent.models import AgentBalance
+    from consumer.models import ConsumerBalance
+    from ledger import services as ledger
+
+    mode, agent_id, consumer_ids, iterations, amount = args
+    succeeded = rejected = errors = 0
+    with override_settings(LEDGER_TRANSFER_MODE=mode):
+        for i in range(iterations):
+            try:
+                agent = AgentBalance.objects.get(pk=agent_id)
+                consumer = ConsumerBalance.objects.get(
+                    pk=consumer_ids[i % len(consumer_ids)]
+                )
+                ledger.transfer(amount, agent, consumer, "Benchmark cash-in", "Benchmark cash-in")
+                succeeded += 1
+            except ledger.InsufficientFunds:
+                rejected += 1
+            except Exception:
+                errors += 1
+    connections.close_all()
+    return succeeded, rejected, errors
+
+
+def purchase_worker(args):
+    """
+    Repeatedly credit one merchant from a set of consumers, as
+    ProductPurchaseView does. Returns (succeeded, rejected, errors).
+    """
+    from django.test import override_settings
+
+    from consumer.models import ConsumerBalance
+    from ledger import services as ledger
+    from merchant.models import MerchantBalance
+
+    shards, merchant_id, consumer_ids, iterations, price = args
+    succeeded = rejected = errors = 0
+    with override_settings(LEDGER_TRANSFER_MODE="atomic", MERCHANT_BALANCE_SHARDS=shards):
+        for i in range(iterations):
+            try:
+                consumer = ConsumerBalance.objects.get(
+                    pk=consumer_ids[i % len(consumer_ids)]
+                )
+                merchant = MerchantBalance.objects.get(pk=merchant_id)
+                ledger.transfer(price, consumer, merchant, "Benchmark purchase", "Benchmark purchase")
+                succeeded += 1
+            except ledger.InsufficientFunds:
+                rejected += 1
+            except Exception:
+                errors += 1
+    connections.close_all()
+    return succeeded, rejected, errors
+
+
+def run_workers(worker, jobs):
+    """Run ``worker`` over ``jobs`` in one process each; return (results, seconds)."""
+    import multiprocessing
+
+    connections.close_all()
+    with multiprocessing.Pool(len(jobs), initializer=init_worker) as pool:
+        started = time.perf_counter()
+        results = pool.map(worker, jobs)
+        elapsed = time.perf_counter() - started
+    return results, elapsed
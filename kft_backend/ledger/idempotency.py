@@ -0,0 +1,94 @@
+import datetime
+import functools
+import hashlib
+import json
+
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+
+IDEMPOTENCY_KEY_HEADER = "HTTP_IDEMPOTENCY_KEY"
+IDEMPOTENCY_KEY_TTL_HOURS = 24
+
+
+def _request_hash(request):
+    payload = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.path}\n{payload}".encode()).hexdigest()
+
+
+def _replay(record, request_hash):
+    if record.request_hash != request_hash:
+        return Response(
+            {"error": "Idempotency-Key was already used for a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    response = HttpResponse(
+        bytes(record.response_body),
+        status=record.status_code,
+        content_type="application/json",
+    )
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def idempotent(handler):
+    """
+    Make a view's ``post`` safe to retry with an ``Idempotency-Key`` header.
+
+    The key is claimed and the handler runs in one transaction, so a
+    concurrent retry blocks on the key's unique index until the first
+    request commits and then gets its stored response. Nothing is stored
+    when the handler fails with a 5xx, so the client may retry.
+    Requests without the header are processed as before.
+    """
+
+    @functools.wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.META.get(IDEMPOTENCY_KEY_HEADER)
+        if not key:
+            return handler(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response(
+                {"error": "Idempotency-Key must be at most 255 characters."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        request_hash = _request_hash(request)
+        now = timezone.now()
+        with transaction.atomic():
+            record = IdempotencyKey(
+                user=request.user,
+                key=key,
+                path=request.path,
+                request_hash=request_hash,
+                status_code=0,
+                response_body=b"",
+                expires_at=now + datetime.timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS),
+            )
+            try:
+                with transaction.atomic():
+                    IdempotencyKey.objects.filter(
+                        user=request.user, key=key, expires_at__lte=now
+                    ).delete()
+                    record.save()
+            except IntegrityError:
+                existing = IdempotencyKey.objects.get(user=request.user, key=key)
+                return _replay(existing, request_hash)
+
+            response = handler(self, request, *args, **kwargs)
+            if response.status_code >= 500:
+                transaction.set_rollback(True)
+                return response
+
+            record.status_code = response.status_code
+            record.response_body = JSONRenderer().render(response.data)
+            record.save(update_fields=["status_code", "response_body"])
+        return response
+
+    return wrapper
@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from agent.models import AgentTransactionHistory
+from consumer.models import TransactionHistory
+from ledger.services import POSTING_MODELS
+from merchant.models import MerchantBalance, MerchantTransactionHistory
+
+
+# Rows written before signed amounts existed only say what happened in
+# transaction_type; these prefixes mark the ones that credited the account.
+CREDIT_PREFIXES = {
+    TransactionHistory: ("Cash-in from Agent",),
+    AgentTransactionHistory: ("Payment for Cash-out to Agent",),
+    MerchantTransactionHistory: ("Purchase",),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill signed_amount and balance_after on history rows written before "
+        "those columns existed, walking back from each account's current balance."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for account_model, (history_model, account_field) in POSTING_MODELS.items():
+            account_ids = (
+                history_model.objects.filter(balance_after__isnull=True)
+                .values_list(f"{account_field}_id", flat=True)
+                .distinct()
+            )
+            updated = 0
+            for account_id in list(account_ids):
+                updated += self.backfill_account(
+                    account_model, history_model, account_field, account_id, options["batch_size"]
+                )
+            self.stdout.write(f"{history_model._meta.verbose_name_plural}: {updated} row(s) updated.")
+
+    def backfill_account(self, account_model, history_model, account_field, account_id, batch_size):
+        with transaction.atomic():
+            account = account_model.objects.select_for_update().get(pk=account_id)
+            balance = account.balance
+            if account_model is MerchantBalance:
+                balance += account.shards.aggregate(total=Sum("balance"))["total"] or 0
+
+            rows = history_model.objects.filter(**{account_field: account}).order_by(
+                "-created_at", "-id"
+            )
+            pending = []
+            updated = 0
+            for row in rows.iterator(chunk_size=batch_size):
+                if row.signed_amount is None:
+                    credited = row.transaction_type.startswith(CREDIT_PREFIXES[history_model])
+                    row.signed_amount = row.amount if credited else -row.amount
+                if row.balance_after is None:
+                    row.balance_after = balance
+                    pending.append(row)
+                else:
+                    # Trust rows the ledger already wrote and continue from there.
+                    balance = row.balance_after
+                balance -= row.signed_amount
+
+                if len(pending) >= batch_size:
+                    updated += history_model.objects.bulk_update(
+                        pending, ["signed_amount", "balance_after"]
+                    )
+                    pending = []
+            if pending:
+                updated += history_model.objects.bulk_update(
+                    pending, ["signed_amount", "balance_after"]
+                )
+        return updated
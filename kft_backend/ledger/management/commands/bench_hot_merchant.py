@@ -0,0 +1,71 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+
+from consumer.models import ConsumerBalance
+from ledger.benchmarks import purchase_worker, run_workers
+from merchant.models import MerchantBalance, MerchantTransactionHistory
+
+
+class Command(BaseCommand):
+    help = (
+        "Run concurrent purchases against a single merchant and compare "
+        "throughput with merchant balance sharding off and on. SQLite locks "
+        "the whole database on write, so run this against Postgres."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument("--consumers", type=int, default=64)
+        parser.add_argument("--shards", type=int, default=16)
+
+    def handle(self, *args, **options):
+        for shards in (0, options["shards"]):
+            self.run_shards(shards, options)
+
+    def run_shards(self, shards, options):
+        workers = options["workers"]
+        iterations = options["iterations"]
+        price = Decimal("1.00")
+
+        merchant_user = User.objects.create_user(username=f"bench_merchant_{shards}")
+        consumer_users = User.objects.bulk_create(
+            User(username=f"bench_buyer_{shards}_{i}")
+            for i in range(options["consumers"])
+        )
+        try:
+            merchant = MerchantBalance.objects.create(user=merchant_user, balance=0)
+            consumer_ids = [
+                account.pk
+                for account in ConsumerBalance.objects.bulk_create(
+                    ConsumerBalance(user=user, balance=price * workers * iterations)
+                    for user in consumer_users
+                )
+            ]
+
+            jobs = [
+                (shards, merchant.pk, consumer_ids, iterations, price)
+                for _ in range(workers)
+            ]
+            results, elapsed = run_workers(purchase_worker, jobs)
+
+            succeeded = sum(result[0] for result in results)
+            errors = sum(result[2] for result in results)
+            merchant.refresh_from_db()
+            total = merchant.balance + (
+                merchant.shards.aggregate(total=Sum("balance"))["total"] or 0
+            )
+            postings = MerchantTransactionHistory.objects.filter(merchant=merchant).count()
+
+            self.stdout.write(
+                f"shards={shards:>3}: {succeeded} purchases in {elapsed:.2f}s "
+                f"({succeeded / elapsed:.1f}/s), {errors} errors, "
+                f"balance {total} for {postings} postings"
+            )
+        finally:
+            User.objects.filter(
+                pk__in=[merchant_user.pk] + [u.pk for u in consumer_users]
+            ).delete()
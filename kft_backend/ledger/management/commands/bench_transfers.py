@@ -0,0 +1,68 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from agent.models import AgentBalance, AgentTransactionHistory
+from consumer.models import ConsumerBalance
+from ledger.benchmarks import cash_in_worker, run_workers
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer a single AgentBalance with concurrent cash-ins from many "
+        "processes and report throughput and lost updates per transfer mode."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument("--consumers", type=int, default=16)
+        parser.add_argument(
+            "--modes", nargs="+", default=["row", "atomic"], choices=["row", "atomic"]
+        )
+
+    def handle(self, *args, **options):
+        for mode in options["modes"]:
+            self.run_mode(mode, options)
+
+    def run_mode(self, mode, options):
+        workers = options["workers"]
+        iterations = options["iterations"]
+        amount = Decimal("1.00")
+        opening = amount * workers * iterations
+
+        agent_user = User.objects.create_user(username=f"bench_agent_{mode}")
+        consumer_users = User.objects.bulk_create(
+            User(username=f"bench_consumer_{mode}_{i}")
+            for i in range(options["consumers"])
+        )
+        try:
+            agent = AgentBalance.objects.create(user=agent_user, balance=opening)
+            consumer_ids = [
+                account.pk
+                for account in ConsumerBalance.objects.bulk_create(
+                    ConsumerBalance(user=user, balance=0) for user in consumer_users
+                )
+            ]
+
+            jobs = [
+                (mode, agent.pk, consumer_ids, iterations, amount)
+                for _ in range(workers)
+            ]
+            results, elapsed = run_workers(cash_in_worker, jobs)
+
+            succeeded = sum(result[0] for result in results)
+            rejected = sum(result[1] for result in results)
+            errors = sum(result[2] for result in results)
+            agent.refresh_from_db()
+            postings = AgentTransactionHistory.objects.filter(agent=agent).count()
+            lost_updates = int((agent.balance - (opening - amount * postings)) / amount)
+
+            self.stdout.write(
+                f"{mode:>6}: {succeeded} transfers in {elapsed:.2f}s "
+                f"({succeeded / elapsed:.1f}/s), {rejected} rejected, "
+                f"{errors} errors, {lost_updates} lost updates"
+            )
+        finally:
+            User.objects.filter(pk__in=[agent_user.pk] + [u.pk for u in consumer_users]).delete()
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from ledger.services import fold_shards
+
+
+class Command(BaseCommand):
+    help = "Fold sharded merchant credits back into their MerchantBalance rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "merchant_ids", nargs="*", type=int, help="Defaults to every merchant."
+        )
+
+    def handle(self, *args, **options):
+        totals = fold_shards(options["merchant_ids"] or None)
+        self.stdout.write(
+            f"Folded {sum(totals.values(), 0)} across {len(totals)} merchant(s)."
+        )
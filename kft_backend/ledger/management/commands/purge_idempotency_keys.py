@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ledger.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete expired idempotency keys."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        deleted = 0
+        while True:
+            batch = list(
+                IdempotencyKey.objects.filter(expires_at__lte=now).values_list(
+                    "pk", flat=True
+                )[: options["batch_size"]]
+            )
+            if not batch:
+                break
+            deleted += IdempotencyKey.objects.filter(pk__in=batch).delete()[0]
+        self.stdout.write(f"Deleted {deleted} expired idempotency key(s).")
@@ -0,0 +1,33 @@
+from django.db import models
+from django.contrib.auth.models import User
+
+# Create your models here.
+
+
+class IdempotencyKey(models.Model):
+    """
+    First response to a money-moving POST sent with an Idempotency-Key
+    header, replayed verbatim when the client retries with the same key.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    path = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField()
+    response_body = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.user_id}:{self.key}"
+
+    class Meta:
+        db_table = "idempotency_key"
+        verbose_name = "Idempotency Key"
+        verbose_name_plural = "Idempotency Keys"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "key"], name="unique_idempotency_key"
+            )
+        ]
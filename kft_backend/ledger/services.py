@@ -0,0 +1,295 @@
+import random
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Q, Sum, Value, When
+from django.utils import timezone
+
+from agent.models import AgentBalance, AgentTransactionHistory
+from consumer.models import ConsumerBalance, TransactionHistory
+from merchant.models import (
+    MerchantBalance,
+    MerchantBalanceShard,
+    MerchantTransactionHistory,
+)
+
+
+# Every balance model is a ledger account; its history table holds the postings.
+POSTING_MODELS = {
+    ConsumerBalance: (TransactionHistory, "consumer"),
+    AgentBalance: (AgentTransactionHistory, "agent"),
+    MerchantBalance: (MerchantTransactionHistory, "merchant"),
+}
+
+# Upper bound on accounts credited by a single UPDATE statement.
+CREDIT_BATCH_SIZE = 500
+
+
+class InsufficientFunds(Exception):
+    def __init__(self, account):
+        self.account = account
+        super().__init__(f"Insufficient balance on account {account}.")
+
+
+def debit(account, amount, description):
+    return (account, -amount, description)
+
+
+def credit(account, amount, description):
+    return (account, amount, description)
+
+
+def post(entries):
+    """
+    Apply a list of ``(account, amount, description)`` entries atomically.
+
+    A negative amount is a debit. Entries whose account is ``None`` stand
+    for the outside world (utility providers) and are not recorded.
+    Each account is updated once no matter how many entries touch it and
+    the postings are written with one multi-row insert per history table.
+    """
+    entries = [entry for entry in entries if entry[0] is not None]
+
+    accounts = {}
+    net = {}
+    for account, amount, _ in entries:
+        key = (type(account), account.pk)
+        accounts.setdefault(key, account)
+        net[key] = net.get(key, 0) + amount
+
+    with transaction.atomic():
+        if getattr(settings, "LEDGER_TRANSFER_MODE", "atomic") == "row":
+            unknown = _apply_row(accounts, net)
+        else:
+            unknown = _apply_atomic(accounts, net)
+
+        # Walk the entries backwards from each account's new balance to get
+        # the running balance after every posting.
+        running = {key: account.balance for key, account in accounts.items()}
+        balances_after = []
+        for account, amount, _ in reversed(entries):
+            key = (type(account), account.pk)
+            balances_after.append(None if key in unknown else running[key])
+            running[key] -= amount
+        balances_after.reverse()
+
+        postings = {}
+        for (account, amount, description), balance_after in zip(entries, balances_after):
+            history_model, account_field = POSTING_MODELS[type(account)]
+            postings.setdefault(history_model, []).append(
+                history_model(
+                    **{account_field: accounts[(type(account), account.pk)]},
+                    amount=abs(amount),
+                    signed_amount=amount,
+                    balance_after=balance_after,
+                    transaction_type=description,
+                )
+            )
+        for history_model, rows in postings.items():
+            history_model.objects.bulk_create(rows)
+
+    for account, _, _ in entries:
+        account.balance = accounts[(type(account), account.pk)].balance
+
+
+def _apply_row(accounts, net):
+    """
+    Legacy read-modify-write: check the balance loaded by the caller and
+    save it back. Concurrent transfers on the same account lose updates.
+    """
+    for key, amount in net.items():
+        if amount < 0 and accounts[key].balance + amount < 0:
+            raise InsufficientFunds(accounts[key])
+
+    for key, amount in net.items():
+        if not amount:
+            continue
+        account = accounts[key]
+        account.balance += amount
+        account.save(update_fields=["balance", "updated_at"])
+    return set()
+
+
+def _apply_atomic(accounts, net):
+    """
+    Debit with a conditional UPDATE (``balance >= amount``) and credit with
+    an F() expression, so the database does the arithmetic under the row
+    lock. Rows are locked in (table, pk) order to avoid deadlocks between
+    opposite transfers, then the new balances are read back in one query
+    per table. Consecutive credits to the same table share one UPDATE.
+
+    With MERCHANT_BALANCE_SHARDS set, merchant credits go to a random shard
+    row instead, and a merchant debit folds the shards in first; both
+    happen at the merchant's place in the ordered pass. Sharded credits
+    are not read back; their keys are returned so callers know the
+    balance is unknown until fold_shards fills it in.
+    """
+    now = timezone.now()
+    shards = getattr(settings, "MERCHANT_BALANCE_SHARDS", 0)
+    touched = {}
+    credits = {}
+    sharded = set()
+    for key in sorted(net, key=lambda key: (key[0]._meta.db_table, key[1])):
+        model, pk = key
+        amount = net[key]
+        if not amount:
+            touched.setdefault(model, []).append(pk)
+            continue
+        is_sharded = model is MerchantBalance and shards > 1
+        if amount > 0 and not is_sharded and (not credits or model in credits):
+            touched.setdefault(model, []).append(pk)
+            credits.setdefault(model, {})[pk] = amount
+            continue
+        for credit_model, amounts in credits.items():
+            _credit(credit_model, amounts, now)
+        credits = {}
+        if is_sharded:
+            if amount > 0:
+                _credit_shard(pk, amount, random.randrange(shards), now)
+                sharded.add(key)
+                continue
+            fold_shards([pk])
+        touched.setdefault(model, []).append(pk)
+        if amount > 0:
+            credits[model] = {pk: amount}
+            continue
+
+        rows = model.objects.filter(pk=pk, balance__gte=-amount)
+        if not rows.update(balance=F("balance") + amount, updated_at=now):
+            raise InsufficientFunds(accounts[key])
+
+    for credit_model, amounts in credits.items():
+        _credit(credit_model, amounts, now)
+
+    for model, pks in touched.items():
+        for pk, balance in model.objects.filter(pk__in=pks).values_list("pk", "balance"):
+            accounts[(model, pk)].balance = balance
+    return sharded
+
+
+def _credit(model, amounts, now):
+    """Credit ``{pk: amount}`` on one table with a single UPDATE per chunk."""
+    items = list(amounts.items())
+    for start in range(0, len(items), CREDIT_BATCH_SIZE):
+        chunk = items[start : start + CREDIT_BATCH_SIZE]
+        if len(chunk) == 1:
+            increment = Value(chunk[0][1])
+        else:
+            increment = Case(
+                *[When(pk=pk, then=Value(amount)) for pk, amount in chunk],
+                output_field=model._meta.get_field("balance"),
+            )
+        model.objects.filter(pk__in=[pk for pk, _ in chunk]).update(
+            balance=F("balance") + increment, updated_at=now
+        )
+
+
+def _credit_shard(merchant_id, amount, shard, now):
+    rows = MerchantBalanceShard.objects.filter(merchant_id=merchant_id, shard=shard)
+    if rows.update(balance=F("balance") + amount, updated_at=now):
+        return
+    try:
+        with transaction.atomic():
+            MerchantBalanceShard.objects.create(
+                merchant_id=merchant_id, shard=shard, balance=amount
+            )
+    except IntegrityError:
+        # Another transfer created the shard first.
+        rows.update(balance=F("balance") + amount, updated_at=now)
+
+
+def fold_shards(merchant_ids=None):
+    """
+    Move shard balances back into their MerchantBalance rows and give the
+    sharded credits their balance_after.
+    Folds every merchant when ``merchant_ids`` is None.
+    """
+    with transaction.atomic():
+        shards = MerchantBalanceShard.objects.select_for_update().filter(
+            balance__gt=0
+        )
+        if merchant_ids is not None:
+            shards = shards.filter(merchant_id__in=merchant_ids)
+
+        totals = {}
+        shard_ids = []
+        for shard in shards.order_by("merchant_id", "shard"):
+            totals[shard.merchant_id] = totals.get(shard.merchant_id, 0) + shard.balance
+            shard_ids.append(shard.pk)
+
+        MerchantBalanceShard.objects.filter(pk__in=shard_ids).update(balance=0)
+        now = timezone.now()
+        for merchant_id in sorted(totals):
+            MerchantBalance.objects.filter(pk=merchant_id).update(
+                balance=F("balance") + totals[merchant_id], updated_at=now
+            )
+        for merchant_id in sorted(set(totals).union(merchant_ids or ())):
+            _fill_balance_after(merchant_id)
+    return totals
+
+
+def _fill_balance_after(merchant_id):
+    """
+    Walk back from the merchant's balance over the postings written since
+    its last known balance_after, filling theirs in. Nothing is written
+    unless the walk lands exactly on that last known balance; a credit
+    still in flight is left for the next fold.
+    """
+    history = MerchantTransactionHistory.objects.filter(merchant_id=merchant_id)
+    latest = (
+        history.filter(balance_after__isnull=False)
+        .order_by("-created_at", "-id")
+        .values("created_at", "id", "balance_after")
+        .first()
+    )
+    pending = history.filter(balance_after__isnull=True)
+    if latest is not None:
+        pending = pending.filter(
+            Q(created_at__gt=latest["created_at"])
+            | Q(created_at=latest["created_at"], id__gt=latest["id"])
+        )
+    pending = list(pending.order_by("-created_at", "-id"))
+    if not pending or any(row.signed_amount is None for row in pending):
+        return
+
+    balance = MerchantBalance.objects.get(pk=merchant_id).balance
+    balance += (
+        MerchantBalanceShard.objects.filter(merchant_id=merchant_id).aggregate(
+            total=Sum("balance")
+        )["total"]
+        or 0
+    )
+    for row in pending:
+        row.balance_after = balance
+        balance -= row.signed_amount
+    if balance != (0 if latest is None else latest["balance_after"]):
+        return
+    MerchantTransactionHistory.objects.bulk_update(pending, ["balance_after"])
+
+
+def balance_at(account, moment):
+    """
+    Balance of ``account`` just before ``moment``, read from the latest
+    posting's balance_after through the (account, -created_at, -id) index.
+    Returns None when no posting predates ``moment``.
+    """
+    history_model, account_field = POSTING_MODELS[type(account)]
+    return (
+        history_model.objects.filter(**{account_field: account}, created_at__lt=moment)
+        .order_by("-created_at", "-id")
+        .values_list("balance_after", flat=True)
+        .first()
+    )
+
+
+def transfer(amount, debit_account, credit_account, debit_description, credit_description=""):
+    """
+    Move ``amount`` from ``debit_account`` to ``credit_account``.
+    Either side may be ``None`` for money leaving or entering the system.
+    """
+    post(
+        [
+            debit(debit_account, amount, debit_description),
+            credit(credit_account, amount, credit_description),
+        ]
+    )
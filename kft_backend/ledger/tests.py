@@ -0,0 +1,358 @@
+import io
+import threading
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient, APITestCase
+
+from agent.models import AgentBalance, AgentTransactionHistory
+from consumer.models import ConsumerBalance, TransactionHistory
+from custom_auth.authentication import token_for_user
+from custom_auth.models import Role
+from merchant.models import (
+    MerchantBalance,
+    MerchantBalanceShard,
+    MerchantTransactionHistory,
+)
+
+from . import services as ledger
+from .models import IdempotencyKey
+
+
+class PostTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.agent = AgentBalance.objects.create(
+            user=User.objects.create_user("agent"), balance=100
+        )
+        cls.consumer = ConsumerBalance.objects.create(
+            user=User.objects.create_user("consumer"), balance=10
+        )
+        cls.merchant = MerchantBalance.objects.create(
+            user=User.objects.create_user("merchant"), balance=0
+        )
+
+    def balances(self):
+        return [
+            model.objects.get().balance
+            for model in (AgentBalance, ConsumerBalance, MerchantBalance)
+        ]
+
+    def test_posting_moves_money_and_records_running_balances(self):
+        ledger.post(
+            [
+                ledger.debit(self.agent, Decimal("30"), "Cash-in to Consumer"),
+                ledger.credit(self.consumer, Decimal("30"), "Cash-in from Agent"),
+                ledger.debit(self.consumer, Decimal("25"), "Purchase: A"),
+                ledger.credit(self.merchant, Decimal("25"), "Purchase: A"),
+                ledger.debit(self.consumer, Decimal("5"), "Purchase: B"),
+                ledger.credit(self.merchant, Decimal("5"), "Purchase: B"),
+            ]
+        )
+        self.assertEqual(self.balances(), [70, 10, 30])
+        self.assertEqual((self.agent.balance, self.consumer.balance), (70, 10))
+        self.assertEqual(
+            list(
+                TransactionHistory.objects.order_by("id").values_list(
+                    "signed_amount", "balance_after"
+                )
+            ),
+            [(30, 40), (-25, 15), (-5, 10)],
+        )
+        self.assertEqual(
+            list(
+                MerchantTransactionHistory.objects.order_by("id").values_list(
+                    "balance_after", flat=True
+                )
+            ),
+            [25, 30],
+        )
+        self.assertEqual(AgentTransactionHistory.objects.get().signed_amount, -30)
+
+    def test_refused_posting_changes_nothing(self):
+        with self.assertRaises(ledger.InsufficientFunds) as caught:
+            ledger.post(
+                [
+                    ledger.credit(self.merchant, Decimal("11"), "Purchase"),
+                    ledger.debit(self.consumer, Decimal("11"), "Purchase"),
+                ]
+            )
+        self.assertEqual(caught.exception.account, self.consumer)
+        self.assertEqual(self.balances(), [100, 10, 0])
+        self.assertFalse(TransactionHistory.objects.exists())
+        self.assertFalse(MerchantTransactionHistory.objects.exists())
+
+    def test_descriptions_are_stored_whole(self):
+        description = "Purchase: " + ", ".join(f"1 x Item {n}" for n in range(50))
+        ledger.transfer(Decimal("1"), self.consumer, self.merchant, description, description)
+        self.assertEqual(TransactionHistory.objects.get().transaction_type, description)
+        self.assertEqual(
+            MerchantTransactionHistory.objects.get().transaction_type, description
+        )
+
+
+@override_settings(LEDGER_TRANSFER_MODE="atomic")
+class BackfillBalanceAfterTests(TestCase):
+    def history(self, model):
+        return list(
+            model.objects.order_by("id").values_list("signed_amount", "balance_after")
+        )
+
+    def test_running_balances_walk_back_from_current_balance(self):
+        consumer = ConsumerBalance.objects.create(
+            user=User.objects.create_user("consumer"), balance=0
+        )
+        merchant = MerchantBalance.objects.create(
+            user=User.objects.create_user("merchant"), balance=0
+        )
+        # Rows written before signed_amount and balance_after existed.
+        for amount, description in (
+            (50, "Cash-in from Agent: agent@example.com"),
+            (20, "Purchase: Lamp from shop"),
+            (5, "Payment: Water for 123"),
+        ):
+            TransactionHistory.objects.create(
+                consumer=consumer, amount=amount, transaction_type=description
+            )
+        MerchantTransactionHistory.objects.create(
+            merchant=merchant, amount=20, transaction_type="Purchase: Lamp from consumer"
+        )
+        ConsumerBalance.objects.update(balance=25)
+        MerchantBalance.objects.update(balance=20)
+        consumer.refresh_from_db()
+        merchant.refresh_from_db()
+        # Rows the ledger wrote since are trusted as they are.
+        ledger.transfer(Decimal("5"), consumer, merchant, "Purchase: Cup", "Purchase: Cup")
+
+        call_command("backfill_balance_after", batch_size=2, stdout=io.StringIO())
+
+        self.assertEqual(
+            self.history(TransactionHistory),
+            [(50, 50), (-20, 30), (-5, 25), (-5, 20)],
+        )
+        self.assertEqual(self.history(MerchantTransactionHistory), [(20, 20), (5, 25)])
+
+
+@override_settings(LEDGER_TRANSFER_MODE="atomic")
+class AtomicDebitTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.consumer = ConsumerBalance.objects.create(
+            user=User.objects.create_user("consumer"), balance=10
+        )
+        cls.merchant = MerchantBalance.objects.create(
+            user=User.objects.create_user("merchant"), balance=0
+        )
+
+    def stale_copy(self):
+        return ConsumerBalance.objects.get(pk=self.consumer.pk)
+
+    def test_debit_checks_the_stored_balance(self):
+        # Two requests that both read a balance of 10 before either debits.
+        first, second = self.stale_copy(), self.stale_copy()
+        ledger.transfer(Decimal("8"), first, self.merchant, "Purchase")
+        self.assertEqual(first.balance, 2)
+        with self.assertRaises(ledger.InsufficientFunds):
+            ledger.transfer(Decimal("8"), second, self.merchant, "Purchase")
+
+        self.consumer.refresh_from_db()
+        self.merchant.refresh_from_db()
+        self.assertEqual((self.consumer.balance, self.merchant.balance), (2, 8))
+        self.assertEqual(
+            list(TransactionHistory.objects.values_list("signed_amount", "balance_after")),
+            [(-8, 2)],
+        )
+        self.assertEqual(MerchantTransactionHistory.objects.get().balance_after, 8)
+
+    def test_debit_may_empty_the_account(self):
+        ledger.transfer(Decimal("10"), self.stale_copy(), self.merchant, "Purchase")
+        self.consumer.refresh_from_db()
+        self.assertEqual(self.consumer.balance, 0)
+
+
+@skipUnless(connection.vendor == "postgresql", "needs concurrent writers")
+@override_settings(LEDGER_TRANSFER_MODE="atomic")
+class ConcurrentDebitTests(TransactionTestCase):
+    def test_concurrent_debits_never_overdraw(self):
+        consumer = ConsumerBalance.objects.create(
+            user=User.objects.create_user("consumer"), balance=10
+        )
+        merchant = MerchantBalance.objects.create(
+            user=User.objects.create_user("merchant"), balance=0
+        )
+        start = threading.Barrier(8)
+        refused = []
+
+        def buy():
+            try:
+                account = ConsumerBalance.objects.get(pk=consumer.pk)
+                start.wait()
+                try:
+                    ledger.transfer(Decimal("3"), account, merchant, "Purchase")
+                except ledger.InsufficientFunds:
+                    refused.append(account)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        consumer.refresh_from_db()
+        merchant.refresh_from_db()
+        self.assertEqual(len(refused), 5)
+        self.assertEqual((consumer.balance, merchant.balance), (1, 9))
+        self.assertEqual(TransactionHistory.objects.count(), 3)
+
+
+@override_settings(LEDGER_TRANSFER_MODE="atomic", MERCHANT_BALANCE_SHARDS=4)
+class ShardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.consumer = ConsumerBalance.objects.create(
+            user=User.objects.create_user("consumer"), balance=100
+        )
+        cls.agent = AgentBalance.objects.create(
+            user=User.objects.create_user("agent"), balance=0
+        )
+        cls.merchant = MerchantBalance.objects.create(
+            user=User.objects.create_user("merchant"), balance=0
+        )
+
+    def buy(self, amount):
+        ledger.transfer(Decimal(amount), self.consumer, self.merchant, "Purchase")
+
+    def merchant_history(self):
+        return list(
+            MerchantTransactionHistory.objects.order_by("id").values_list(
+                "signed_amount", "balance_after"
+            )
+        )
+
+    def test_credits_land_on_shards(self):
+        for amount in (5, 7, 9):
+            self.buy(amount)
+        self.merchant.refresh_from_db()
+        self.assertEqual(self.merchant.balance, 0)
+        self.assertEqual(
+            sum(MerchantBalanceShard.objects.values_list("balance", flat=True)), 21
+        )
+        self.assertEqual(self.merchant_history(), [(5, None), (7, None), (9, None)])
+
+    def test_fold_moves_shards_and_fills_balance_after(self):
+        for amount in (5, 7, 9):
+            self.buy(amount)
+        self.assertEqual(ledger.fold_shards(), {self.merchant.pk: 21})
+        self.merchant.refresh_from_db()
+        self.assertEqual(self.merchant.balance, 21)
+        self.assertFalse(MerchantBalanceShard.objects.filter(balance__gt=0).exists())
+        self.assertEqual(self.merchant_history(), [(5, 5), (7, 12), (9, 21)])
+
+        self.buy(4)
+        ledger.fold_shards([self.merchant.pk])
+        self.assertEqual(self.merchant_history()[-1], (4, 25))
+
+    def test_debit_folds_in_lock_order(self):
+        self.buy(10)
+        with CaptureQueriesContext(connection) as queries:
+            ledger.transfer(Decimal("6"), self.merchant, self.agent, "Payout")
+        statements = [query["sql"] for query in queries]
+        agent_update = next(
+            i for i, sql in enumerate(statements) if sql.startswith('UPDATE "agent"')
+        )
+        shard_lock = next(
+            i for i, sql in enumerate(statements) if '"merchant_balance_shard"' in sql
+        )
+        self.assertLess(agent_update, shard_lock)
+        self.assertEqual(self.merchant_history(), [(10, 10), (-6, 4)])
+        self.agent.refresh_from_db()
+        self.assertEqual(self.agent.balance, 6)
+
+
+def agent_client(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {token_for_user(user).access_token}")
+    return client
+
+
+class IdempotencyTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("agent", "agent@example.com")
+        Role.objects.create(user=cls.user, type="agent")
+        cls.agent = AgentBalance.objects.create(user=cls.user, balance=100)
+        ConsumerBalance.objects.create(
+            user=User.objects.create_user("consumer", "consumer@example.com"), balance=0
+        )
+
+    def setUp(self):
+        self.client = agent_client(self.user)
+
+    def cash_in(self, amount, key="retry-1"):
+        return self.client.post(
+            reverse("agent:agent_cash_in"),
+            {"consumer_email": "consumer@example.com", "amount": amount},
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retry_replays_first_response(self):
+        first = self.cash_in(10)
+        second = self.cash_in(10)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(ConsumerBalance.objects.get().balance, 10)
+        self.assertEqual(TransactionHistory.objects.count(), 1)
+
+    def test_key_reused_for_another_request_is_refused(self):
+        self.cash_in(10)
+        response = self.cash_in(20)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(ConsumerBalance.objects.get().balance, 10)
+
+
+@skipUnless(connection.vendor == "postgresql", "needs concurrent writers")
+class ConcurrentIdempotencyTests(TransactionTestCase):
+    def test_concurrent_retries_post_once(self):
+        user = User.objects.create_user("agent", "agent@example.com")
+        Role.objects.create(user=user, type="agent")
+        AgentBalance.objects.create(user=user, balance=100)
+        ConsumerBalance.objects.create(
+            user=User.objects.create_user("consumer", "consumer@example.com"), balance=0
+        )
+        start = threading.Barrier(4)
+        responses = []
+
+        def cash_in():
+            client = agent_client(user)
+            try:
+                start.wait()
+                responses.append(
+                    client.post(
+                        reverse("agent:agent_cash_in"),
+                        {"consumer_email": "consumer@example.com", "amount": 10},
+                        HTTP_IDEMPOTENCY_KEY="retry-1",
+                    )
+                )
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=cash_in) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([response.status_code for response in responses], [200] * 4)
+        self.assertEqual(len({response.content for response in responses}), 1)
+        self.assertEqual(ConsumerBalance.objects.get().balance, 10)
+        self.assertEqual(TransactionHistory.objects.count(), 1)
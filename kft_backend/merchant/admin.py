@@ -1,8 +1,9 @@
-from django.contrib import admin
-from .models import *
-
-# Register your models here.
-
-admin.site.register(MerchantBalance)
-admin.site.register(Product)
-admin.site.register(MerchantTransactionHistory)
+from django.contrib import admin
+from .models import *
+
+# Register your models here.
+
+admin.site.register(MerchantBalance)
+admin.site.register(MerchantBalanceShard)
+admin.site.register(Product)
+admin.site.register(MerchantTransactionHistory)
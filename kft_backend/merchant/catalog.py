@@ -0,0 +1,154 @@
+"""
+Pre-rendered product catalog pages.
+
+Each page of the catalog (one per cursor, page size and filter) is stored
+as rendered JSON under a key that includes the catalog version. Saving or
+deleting a product bumps the version (merchant.signals), which orphans
+every cached page at once; bulk writes that skip signals call
+bump_catalog_version() themselves. After a bump only the request holding
+the rebuild lock for a page renders it; the others wait briefly for its
+result. Each page keeps a hash of its content as its ETag and the
+Last-Modified its builder set (for the catalog, the newest updated_at on
+the page), so a revalidation is answered with a 304 without reading the
+database while the page is cached.
+
+Pages live in the "catalog" cache. With the default per-process LocMem
+cache a bump is only seen by the worker that made it and other workers
+serve their copy for up to CATALOG_CACHE_TIMEOUT; point the alias at a
+shared cache (Redis, database) to make invalidation immediate everywhere.
+Because validators come from the page content rather than the version,
+workers never hand out the same ETag for different catalog states.
+"""
+
+import hashlib
+import time
+
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework.renderers import JSONRenderer
+
+
+CATALOG_CACHE_ALIAS = "catalog"
+CATALOG_CACHE_TIMEOUT = 60
+CATALOG_VERSION_KEY = "catalog_version"
+CATALOG_LOCK_TIMEOUT = 10
+CATALOG_LOCK_WAIT = 2.0
+CATALOG_LOCK_POLL = 0.05
+
+
+def catalog_cache():
+    return caches[CATALOG_CACHE_ALIAS]
+
+
+def catalog_version():
+    # Versions start from the clock so that pages cached before a cache
+    # restart can never be read back under a version issued after it.
+    cache = catalog_cache()
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, int(time.time()), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    cache = catalog_cache()
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        # Never read yet, or evicted: any new value orphans the old pages.
+        cache.add(CATALOG_VERSION_KEY, int(time.time()), timeout=None)
+
+
+def page_key(prefix, request):
+    # The host is part of the key because pages carry absolute Link URLs.
+    query_params = request.query_params
+    query = request.get_host() + "?" + "&".join(
+        f"{name}={value}"
+        for name in sorted(query_params)
+        for value in query_params.getlist(name)
+    )
+    digest = hashlib.md5(query.encode(), usedforsecurity=False).hexdigest()
+    return f"{prefix}:v{catalog_version()}:{digest}"
+
+
+def conditional_response(request, etag, last_modified, build):
+    """
+    A 304 when the request's If-None-Match / If-Modified-Since match
+    ``etag`` / ``last_modified`` (a timestamp, or None to send no
+    Last-Modified), else ``build()``. Either way the validators are set on
+    the response.
+    """
+    if last_modified is not None:
+        last_modified = int(last_modified)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = build()
+    if response.status_code in (200, 304):
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def _response(page):
+    response = HttpResponse(page["content"], content_type="application/json")
+    if page["link"]:
+        response["Link"] = page["link"]
+    return response
+
+
+def cached_page(request, key, build):
+    """
+    Serve the page cached under ``key``, or call ``build()`` (which returns
+    a DRF Response, with a Last-Modified header when it can tell) to
+    render and cache it, answering revalidations with a 304. Only one
+    caller at a time builds a given key.
+    """
+    cache = catalog_cache()
+    page = cache.get(key)
+    if page is None:
+        page = _build_page(cache, key, build)
+        if isinstance(page, HttpResponse):
+            return page
+    return conditional_response(
+        request, page["etag"], page["modified"], lambda: _response(page)
+    )
+
+
+def _build_page(cache, key, build):
+    lock_key = f"{key}:lock"
+    if not cache.add(lock_key, 1, timeout=CATALOG_LOCK_TIMEOUT):
+        deadline = time.monotonic() + CATALOG_LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(CATALOG_LOCK_POLL)
+            page = cache.get(key)
+            if page is not None:
+                return page
+        # The builder is slow or gone; render without caching.
+        lock_key = None
+
+    try:
+        response = build()
+        if response.status_code != 200:
+            return response
+        content = JSONRenderer().render(response.data)
+        page = {
+            "content": content,
+            "link": response.get("Link"),
+            "etag": quote_etag(
+                hashlib.md5(
+                    content + (response.get("Link") or "").encode(),
+                    usedforsecurity=False,
+                ).hexdigest()
+            ),
+            "modified": parse_http_date_safe(response.get("Last-Modified")),
+        }
+        if lock_key is not None:
+            cache.set(key, page, CATALOG_CACHE_TIMEOUT)
+    finally:
+        if lock_key is not None:
+            cache.delete(lock_key)
+    return page
@@ -0,0 +1,70 @@
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+# Keyset orderings for ?sort=, each ending in the unique id and backed by
+# one of Product's composite indexes.
+PRODUCT_SORTS = {
+    "newest": ("-created_at", "-id"),
+    "oldest": ("created_at", "id"),
+    "price": ("price", "id"),
+    "-price": ("-price", "-id"),
+    "updated": ("-updated_at", "-id"),
+}
+
+
+class ProductFilterSerializer(serializers.Serializer):
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    merchant = serializers.CharField(required=False, help_text="Owner's username.")
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+    updated_after = serializers.DateTimeField(required=False)
+    updated_before = serializers.DateTimeField(required=False)
+    sort = serializers.ChoiceField(choices=list(PRODUCT_SORTS), default="newest")
+
+
+# Query parameter -> queryset lookup. Windows are half-open: after is
+# inclusive, before exclusive.
+PRODUCT_FILTERS = {
+    "min_price": "price__gte",
+    "max_price": "price__lte",
+    "merchant": "owner__user__username",
+    "created_after": "created_at__gte",
+    "created_before": "created_at__lt",
+    "updated_after": "updated_at__gte",
+    "updated_before": "updated_at__lt",
+}
+
+
+def product_params(request):
+    params = getattr(request, "product_params", None)
+    if params is None:
+        serializer = ProductFilterSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            raise ValidationError(serializer.errors)
+        params = request.product_params = serializer.validated_data
+    return params
+
+
+def product_ordering(request):
+    return PRODUCT_SORTS[product_params(request)["sort"]]
+
+
+class ProductFilter(BaseFilterBackend):
+    """
+    Filters products by price range, owning merchant and created/updated
+    windows. Views pair it with ``keyset_ordering = product_ordering(...)``
+    so ?sort= drives the keyset pagination.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = product_params(request)
+        return queryset.filter(
+            **{
+                lookup: params[name]
+                for name, lookup in PRODUCT_FILTERS.items()
+                if name in params
+            }
+        )
@@ -0,0 +1,75 @@
+"""
+Bulk product upsert for merchants with large inventories.
+
+Rows are matched to the merchant's existing products by SKU. Each chunk
+costs one lookup, one bulk_update and one bulk_create, and the whole
+import runs in one transaction. Rows whose fields did not change are left
+alone so their updated_at (and ETag) stay valid. The catalog version is
+bumped once, after commit. The search index is kept in sync by the
+database (merchant.search), so it needs no extra work here.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+
+from .catalog import bump_catalog_version
+from .models import Product
+from .serializers import ProductImportSerializer
+
+
+PRODUCT_IMPORT_CHUNK_SIZE = 500
+PRODUCT_IMPORT_FIELDS = ("name", "description", "price")
+
+
+def import_products(owner, rows, chunk_size=PRODUCT_IMPORT_CHUNK_SIZE):
+    """
+    Create or update ``owner``'s products from ``rows`` (dicts with sku,
+    name, description and price). Returns ``(created, updated, errors)``
+    where ``errors`` lists ``{"row": n, "errors": {...}}`` with 1-based
+    row numbers; bad rows are skipped.
+    """
+    errors = []
+    valid = {}
+    for number, row in enumerate(rows, 1):
+        if not isinstance(row, dict):
+            errors.append({"row": number, "errors": {"non_field_errors": ["Expected an object."]}})
+            continue
+        serializer = ProductImportSerializer(data=row)
+        if not serializer.is_valid():
+            errors.append({"row": number, "errors": serializer.errors})
+        elif serializer.validated_data["sku"] in valid:
+            errors.append(
+                {"row": number, "errors": {"sku": ["This SKU appears earlier in the file."]}}
+            )
+        else:
+            valid[serializer.validated_data["sku"]] = serializer.validated_data
+
+    created = updated = 0
+    items = list(valid.items())
+    with transaction.atomic():
+        for start in range(0, len(items), chunk_size):
+            chunk = dict(items[start : start + chunk_size])
+            existing = {
+                product.sku: product
+                for product in Product.objects.filter(owner=owner, sku__in=list(chunk))
+            }
+            now = timezone.now()
+            changed = []
+            new = []
+            for sku, data in chunk.items():
+                product = existing.get(sku)
+                if product is None:
+                    new.append(Product(owner=owner, **data))
+                elif any(getattr(product, field) != data[field] for field in PRODUCT_IMPORT_FIELDS):
+                    for field in PRODUCT_IMPORT_FIELDS:
+                        setattr(product, field, data[field])
+                    # bulk_update does not apply auto_now.
+                    product.updated_at = now
+                    changed.append(product)
+            Product.objects.bulk_update(changed, [*PRODUCT_IMPORT_FIELDS, "updated_at"])
+            Product.objects.bulk_create(new)
+            created += len(new)
+            updated += len(changed)
+        if created or updated:
+            transaction.on_commit(bump_catalog_version)
+    return created, updated, errors
@@ -0,0 +1,45 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from kft_backend.uploads import UPLOAD_FORMATS, read_rows
+from merchant.imports import PRODUCT_IMPORT_CHUNK_SIZE, import_products
+from merchant.models import MerchantBalance
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or update a merchant's products from a CSV (header row "
+        "sku,name,description,price) or a JSON list, matching on SKU. Bad "
+        "rows are reported and skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("merchant", help="Username of the owning merchant.")
+        parser.add_argument("path")
+        parser.add_argument(
+            "--format", choices=UPLOAD_FORMATS, help="Defaults to the file extension."
+        )
+        parser.add_argument("--chunk-size", type=int, default=PRODUCT_IMPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        owner = MerchantBalance.objects.filter(user__username=options["merchant"]).first()
+        if owner is None:
+            raise CommandError(f"No merchant named {options['merchant']!r}.")
+
+        format = options["format"] or os.path.splitext(options["path"])[1].lstrip(".").lower()
+        if format not in UPLOAD_FORMATS:
+            raise CommandError("Pass --format csv or --format json.")
+        try:
+            with open(options["path"], encoding="utf-8-sig", newline="") as stream:
+                rows = read_rows(stream, format)
+        except (OSError, ValueError) as exc:
+            raise CommandError(exc)
+
+        created, updated, errors = import_products(owner, rows, options["chunk_size"])
+        for error in errors:
+            self.stderr.write(f"Row {error['row']}: {json.dumps(error['errors'])}")
+        self.stdout.write(
+            f"Created {created} product(s), updated {updated}, {len(errors)} row(s) failed."
+        )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from merchant.search import install_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Recreate the product full-text index (and on SQLite its triggers) "
+        "and refill it from the product table."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            install_index(connection)
+        self.stdout.write(f"Rebuilt the product search index on {connection.vendor}.")
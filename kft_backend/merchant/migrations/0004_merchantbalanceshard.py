@@ -0,0 +1,30 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('merchant', '0003_rename_consumer_merchanttransactionhistory_merchant'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MerchantBalanceShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('merchant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='merchant.merchantbalance')),
+            ],
+            options={
+                'verbose_name': 'Merchant Balance Shard',
+                'verbose_name_plural': 'Merchant Balance Shards',
+                'db_table': 'merchant_balance_shard',
+                'constraints': [models.UniqueConstraint(fields=('merchant', 'shard'), name='unique_merchant_balance_shard')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('merchant', '0004_merchantbalanceshard'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='merchanttransactionhistory',
+            index=models.Index(fields=['merchant', '-created_at', '-id'], name='merchant_txn_merchant_recent'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from merchant.search import install_index, uninstall_index
+
+
+def install(apps, schema_editor):
+    install_index(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    uninstall_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("merchant", "0006_merchanttransactionhistory_balance_after_and_more"),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('merchant', '0007_product_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['created_at', 'id'], name='product_created'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['updated_at', 'id'], name='product_updated'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price', 'id'], name='product_price'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['owner', 'created_at', 'id'], name='product_owner_created'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['owner', 'updated_at', 'id'], name='product_owner_updated'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['owner', 'price', 'id'], name='product_owner_price'),
+        ),
+    ]
@@ -1,54 +1,112 @@
-from django.db import models
-from django.contrib.auth.models import User
-
-# Create your models here.
-
-
-class MerchantBalance(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    balance = models.DecimalField(max_digits=10, decimal_places=2)
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
-
-    def __str__(self):
-        return self.user.username
-
-    class Meta:
-        db_table = "merchant"
-        verbose_name = "Merchant"
-        verbose_name_plural = "Merchants"
-        ordering = ["-created_at"]
-
-
-class Product(models.Model):
-    name = models.CharField(max_length=100)
-    price = models.DecimalField(max_digits=10, decimal_places=2)
-    description = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
-    owner = models.ForeignKey(MerchantBalance, on_delete=models.CASCADE)
-
-    def __str__(self):
-        return self.name
-
-    class Meta:
-        db_table = "product"
-        verbose_name = "Product"
-        verbose_name_plural = "Products"
-        ordering = ["-created_at"]
-
-
-class MerchantTransactionHistory(models.Model):
-    merchant = models.ForeignKey(MerchantBalance, on_delete=models.CASCADE)
-    amount = models.DecimalField(max_digits=10, decimal_places=2)
-    transaction_type = models.CharField(max_length=50)
-    created_at = models.DateTimeField(auto_now_add=True)
-
-    def __str__(self):
-        return self.merchant.user.username
-
-    class Meta:
-        db_table = "merchant_transaction_history"
-        verbose_name = "Merchant Transaction History"
-        verbose_name_plural = "Merchant Transaction Histories"
-        ordering = ["-created_at"]
+from django.db import models
+from django.contrib.auth.models import User
+
+# Create your models here.
+
+
+class MerchantBalance(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    balance = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.user.username
+
+    class Meta:
+        db_table = "merchant"
+        verbose_name = "Merchant"
+        verbose_name_plural = "Merchants"
+        ordering = ["-created_at"]
+
+
+class MerchantBalanceShard(models.Model):
+    """
+    Part of a popular merchant's balance. When MERCHANT_BALANCE_SHARDS is
+    set, purchase credits land on a random shard instead of the single
+    MerchantBalance row; the merchant's balance is the row plus its shards.
+    """
+
+    merchant = models.ForeignKey(
+        MerchantBalance, on_delete=models.CASCADE, related_name="shards"
+    )
+    shard = models.PositiveSmallIntegerField()
+    balance = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.merchant} #{self.shard}"
+
+    class Meta:
+        db_table = "merchant_balance_shard"
+        verbose_name = "Merchant Balance Shard"
+        verbose_name_plural = "Merchant Balance Shards"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["merchant", "shard"], name="unique_merchant_balance_shard"
+            )
+        ]
+
+
+class Product(models.Model):
+    name = models.CharField(max_length=100)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    description = models.TextField()
+    # Merchant's own stock-keeping unit; bulk imports match on it.
+    sku = models.CharField(max_length=64, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    owner = models.ForeignKey(MerchantBalance, on_delete=models.CASCADE)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        db_table = "product"
+        verbose_name = "Product"
+        verbose_name_plural = "Products"
+        ordering = ["-created_at"]
+        # One per catalog sort (merchant.filters.PRODUCT_SORTS), alone and
+        # behind the owner for a merchant's own products.
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="product_created"),
+            models.Index(fields=["updated_at", "id"], name="product_updated"),
+            models.Index(fields=["price", "id"], name="product_price"),
+            models.Index(fields=["owner", "created_at", "id"], name="product_owner_created"),
+            models.Index(fields=["owner", "updated_at", "id"], name="product_owner_updated"),
+            models.Index(fields=["owner", "price", "id"], name="product_owner_price"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "sku"],
+                condition=models.Q(sku__isnull=False),
+                name="product_owner_sku",
+            )
+        ]
+
+
+class MerchantTransactionHistory(models.Model):
+    merchant = models.ForeignKey(MerchantBalance, on_delete=models.CASCADE)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    transaction_type = models.TextField()
+    signed_amount = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True
+    )
+    balance_after = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.merchant.user.username
+
+    class Meta:
+        db_table = "merchant_transaction_history"
+        verbose_name = "Merchant Transaction History"
+        verbose_name_plural = "Merchant Transaction Histories"
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["merchant", "-created_at", "-id"], name="merchant_txn_merchant_recent"
+            )
+        ]
@@ -0,0 +1,164 @@
+"""
+Ranked full-text search over product name and description.
+
+The index lives in the database and is kept in sync by it, so bulk
+writes are covered as well as save() and delete():
+
+- SQLite: an FTS5 table keyed by product id, filled by triggers, ranked
+  with bm25. Django drops the triggers when it rebuilds the product table
+  for an ALTER that SQLite cannot do in place; run rebuild_product_search
+  after such a migration.
+- PostgreSQL: a generated tsvector column with a GIN index, ranked with
+  ts_rank.
+- Other backends get no index and fall back to unranked LIKE matching.
+
+Names weigh ten times as much as descriptions. Every term must match and
+the last one also matches as a prefix, for search-as-you-type.
+"""
+
+import base64
+import binascii
+import json
+import re
+
+from django.db import connection
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+
+from kft_backend.pagination import KeysetPagination
+
+from .models import Product
+
+
+SEARCH_MAX_TERMS = 8
+
+SQLITE_INSTALL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5("
+    "name, description, tokenize = 'unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS product_search_insert AFTER INSERT ON product BEGIN "
+    "INSERT INTO product_search(rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS product_search_update "
+    "AFTER UPDATE OF name, description ON product BEGIN "
+    "UPDATE product_search SET name = new.name, description = new.description "
+    "WHERE rowid = new.id; END",
+    "CREATE TRIGGER IF NOT EXISTS product_search_delete AFTER DELETE ON product BEGIN "
+    "DELETE FROM product_search WHERE rowid = old.id; END",
+    "DELETE FROM product_search",
+    "INSERT INTO product_search(rowid, name, description) "
+    "SELECT id, name, description FROM product",
+]
+SQLITE_UNINSTALL = [
+    "DROP TRIGGER IF EXISTS product_search_insert",
+    "DROP TRIGGER IF EXISTS product_search_update",
+    "DROP TRIGGER IF EXISTS product_search_delete",
+    "DROP TABLE IF EXISTS product_search",
+]
+POSTGRESQL_INSTALL = [
+    "ALTER TABLE product ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B')) STORED",
+    "CREATE INDEX IF NOT EXISTS product_search_vector ON product USING GIN (search_vector)",
+]
+POSTGRESQL_UNINSTALL = [
+    "DROP INDEX IF EXISTS product_search_vector",
+    "ALTER TABLE product DROP COLUMN IF EXISTS search_vector",
+]
+
+
+
+def install_index(connection):
+    statements = {"sqlite": SQLITE_INSTALL, "postgresql": POSTGRESQL_INSTALL}
+    with connection.cursor() as cursor:
+        for statement in statements.get(connection.vendor, []):
+            cursor.execute(statement)
+
+
+def uninstall_index(connection):
+    statements = {"sqlite": SQLITE_UNINSTALL, "postgresql": POSTGRESQL_UNINSTALL}
+    with connection.cursor() as cursor:
+        for statement in statements.get(connection.vendor, []):
+            cursor.execute(statement)
+
+
+def search_terms(query):
+    return re.findall(r"\w+", query.lower())[:SEARCH_MAX_TERMS]
+
+
+def search(query, limit, after=None):
+    """
+    Ids and scores of the best ``limit`` products matching ``query``,
+    ordered by ``(score, id)`` where a lower score ranks higher. ``after``
+    is the ``(score, id)`` of the last hit of the previous page.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+    if connection.vendor == "sqlite":
+        match = " ".join(f'"{term}"' for term in terms) + "*"
+        inner = (
+            "SELECT rowid AS id, bm25(product_search, 10.0, 1.0) AS score "
+            "FROM product_search WHERE product_search MATCH %s"
+        )
+        return _ranked(inner, [match], limit, after)
+    if connection.vendor == "postgresql":
+        match = " & ".join(terms) + ":*"
+        inner = (
+            "SELECT id, -ts_rank('{0.1, 0.1, 0.1, 1.0}', search_vector, query) AS score "
+            "FROM product, to_tsquery('simple', %s) query WHERE search_vector @@ query"
+        )
+        return _ranked(inner, [match], limit, after)
+
+    products = Product.objects.all()
+    for term in terms:
+        products = products.filter(Q(name__icontains=term) | Q(description__icontains=term))
+    if after is not None:
+        products = products.filter(pk__gt=after[1])
+    return [(pk, 0.0) for pk in products.order_by("pk").values_list("pk", flat=True)[:limit]]
+
+
+def _ranked(inner, params, limit, after):
+    sql = f"SELECT id, score FROM ({inner}) hits"
+    if after is not None:
+        sql += " WHERE score > %s OR (score = %s AND id > %s)"
+        params = [*params, after[0], after[0], after[1]]
+    sql += " ORDER BY score, id LIMIT %s"
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*params, limit])
+        return cursor.fetchall()
+
+
+class SearchPagination(KeysetPagination):
+    """KeysetPagination over the ``(score, id)`` order of search() hits."""
+
+    ordering = ("score", "id")
+
+    def paginate_search(self, query, request):
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        after = self.decode_cursor(cursor, None) if cursor else None
+
+        hits = search(query, page_size + 1, after)
+        products = Product.objects.select_related("owner__user").in_bulk(
+            [pk for pk, _ in hits]
+        )
+        page = []
+        for pk, score in hits:
+            if pk in products:
+                products[pk].score = score
+                page.append(products[pk])
+
+        self.next_cursor = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_cursor = self.encode_cursor(page[-1])
+        return page
+
+    def decode_cursor(self, cursor, queryset):
+        try:
+            score, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return float(score), int(pk)
+        except (TypeError, ValueError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
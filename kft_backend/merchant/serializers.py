@@ -1,69 +1,121 @@
-from rest_framework import serializers
-from django.contrib.auth.models import User
-from .models import Product, MerchantBalance, MerchantTransactionHistory
-from custom_auth.models import Role
-
-
-class ProductListSerializer(serializers.ModelSerializer):
-    owner_username = serializers.CharField(source="owner.user.username", read_only=True)
-
-    class Meta:
-        model = Product
-        fields = [
-            "id",
-            "name",
-            "description",
-            "price",
-            "owner_username",
-            "created_at",
-            "updated_at",
-        ]
-        read_only_fields = ["id", "owner_username", "created_at", "updated_at"]
-
-
-class ProductSerializer(serializers.ModelSerializer):
-    owner_username = serializers.CharField(source="owner.user.username", read_only=True)
-
-    class Meta:
-        model = Product
-        fields = [
-            "id",
-            "name",
-            "description",
-            "price",
-            "owner",
-            "owner_username",
-            "created_at",
-            "updated_at",
-        ]
-        read_only_fields = ["id", "owner_username", "created_at", "updated_at", "owner"]
-
-
-class MerchantProfileSerializer(serializers.ModelSerializer):
-    balance = serializers.SerializerMethodField()
-    role = serializers.SerializerMethodField()
-
-    def get_balance(self, obj):
-        return MerchantBalance.objects.get(user=obj).balance
-
-    def get_role(self, obj):
-        return Role.objects.get(user=obj).type
-
-    class Meta:
-        model = User
-        fields = [
-            "id",
-            "username",
-            "email",
-            "first_name",
-            "last_name",
-            "balance",
-            "role",
-        ]
-
-
-class MerchantTransactionHistorySerializer(serializers.ModelSerializer):
-    class Meta:
-        model = MerchantTransactionHistory
-        fields = ["id", "amount", "transaction_type", "created_at"]
-        read_only_fields = ["id", "created_at"]
+from decimal import Decimal
+
+from rest_framework import serializers
+from django.contrib.auth.models import User
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Coalesce
+from .models import Product, MerchantBalance, MerchantTransactionHistory
+from custom_auth.models import Role
+
+
+class ProductListSerializer(serializers.ModelSerializer):
+    owner_username = serializers.CharField(source="owner.user.username", read_only=True)
+
+    class Meta:
+        model = Product
+        fields = [
+            "id",
+            "name",
+            "description",
+            "price",
+            "sku",
+            "owner_username",
+            "created_at",
+            "updated_at",
+        ]
+        read_only_fields = ["id", "owner_username", "created_at", "updated_at"]
+
+
+class ProductSerializer(serializers.ModelSerializer):
+    owner_username = serializers.CharField(source="owner.user.username", read_only=True)
+
+    def validate_sku(self, value):
+        if not value:
+            return None
+        if self.instance is not None:
+            products = Product.objects.filter(owner_id=self.instance.owner_id).exclude(
+                pk=self.instance.pk
+            )
+        else:
+            products = Product.objects.filter(owner__user=self.context["request"].user)
+        if products.filter(sku=value).exists():
+            raise serializers.ValidationError("You already have a product with this SKU.")
+        return value
+
+    class Meta:
+        model = Product
+        fields = [
+            "id",
+            "name",
+            "description",
+            "price",
+            "sku",
+            "owner",
+            "owner_username",
+            "created_at",
+            "updated_at",
+        ]
+        read_only_fields = ["id", "owner_username", "created_at", "updated_at", "owner"]
+
+
+class ProductImportSerializer(serializers.ModelSerializer):
+    """One row of a bulk product import, matched on ``sku``."""
+
+    class Meta:
+        model = Product
+        fields = ["sku", "name", "description", "price"]
+        extra_kwargs = {
+            "sku": {"required": True, "allow_null": False, "allow_blank": False},
+            "description": {"default": "", "allow_blank": True},
+        }
+
+
+class MerchantProfileSerializer(serializers.ModelSerializer):
+    balance = serializers.SerializerMethodField()
+    role = serializers.SerializerMethodField()
+
+    # MerchantProfileView annotates balance and role onto the user.
+    def get_balance(self, obj):
+        if hasattr(obj, "balance"):
+            return obj.balance
+        # Credits may be spread over shard rows; the balance is their sum.
+        return (
+            MerchantBalance.objects.filter(user=obj)
+            .annotate(
+                total=F("balance")
+                + Coalesce(Sum("shards__balance"), Value(Decimal("0.00")))
+            )
+            .values_list("total", flat=True)
+            .get()
+        )
+
+    def get_role(self, obj):
+        if hasattr(obj, "role"):
+            return obj.role
+        return Role.objects.get(user=obj).type
+
+    class Meta:
+        model = User
+        fields = [
+            "id",
+            "username",
+            "email",
+            "first_name",
+            "last_name",
+            "balance",
+            "role",
+        ]
+
+
+class MerchantTransactionHistorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MerchantTransactionHistory
+        fields = [
+            "id",
+            "amount",
+            "signed_amount",
+            "balance_after",
+            "transaction_type",
+            "created_at",
+        ]
+        read_only_fields = ["id", "created_at"]
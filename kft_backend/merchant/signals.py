@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .catalog import bump_catalog_version
+from .models import Product
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_catalog(sender, instance, **kwargs):
+    # After commit, or a rebuild could cache the old rows under the new version.
+    transaction.on_commit(bump_catalog_version)
@@ -1,3 +1,358 @@
-from django.test import TestCase
-
-# Create your tests here.
+import itertools
+import re
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils.http import http_date
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from custom_auth.authentication import principal_cache, token_for_user
+from custom_auth.models import Role
+from kft_backend.pagination import KeysetPagination
+
+from .catalog import (
+    CATALOG_VERSION_KEY,
+    bump_catalog_version,
+    catalog_cache,
+    catalog_version,
+)
+from .filters import PRODUCT_SORTS, ProductFilter, product_ordering
+from .imports import import_products
+from .models import (
+    MerchantBalance,
+    MerchantBalanceShard,
+    MerchantTransactionHistory,
+    Product,
+)
+from .serializers import ProductSerializer
+
+
+ROW_COUNTS = (1, 100, 1000)
+
+CATALOG_FILTERS = {
+    "min_price": "1",
+    "max_price": "50",
+    "merchant": "merchant",
+    "created_after": "2024-01-01T00:00:00Z",
+    "created_before": "2030-01-01T00:00:00Z",
+    "updated_after": "2024-01-01T00:00:00Z",
+}
+
+
+@override_settings(JWT_PRINCIPAL_CACHE_TIMEOUT=60)
+class QueryBudgetTests(APITestCase):
+    """Each endpoint runs a fixed number of queries however many rows it returns."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("merchant", "merchant@example.com", "x")
+        Role.objects.create(user=cls.user, type="merchant")
+        cls.balance = MerchantBalance.objects.create(user=cls.user, balance=100)
+        MerchantBalanceShard.objects.create(merchant=cls.balance, shard=0, balance=5)
+
+    def setUp(self):
+        cache.clear()
+        principal_cache().clear()
+        catalog_cache().clear()
+        access = token_for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def grow(self, count):
+        existing = Product.objects.count()
+        Product.objects.bulk_create(
+            Product(name=f"Product {n}", price=1, description="", owner=self.balance)
+            for n in range(existing, count)
+        )
+        bump_catalog_version()  # bulk_create sends no signals
+        existing = MerchantTransactionHistory.objects.count()
+        MerchantTransactionHistory.objects.bulk_create(
+            MerchantTransactionHistory(merchant=self.balance, amount=1, transaction_type="Test")
+            for _ in range(count - existing)
+        )
+
+    def assert_budget(self, url, budget):
+        self.client.get(url)  # caches the authenticated principal
+        for count in ROW_COUNTS:
+            with self.subTest(rows=count):
+                self.grow(count)
+                with self.assertNumQueries(budget):
+                    response = self.client.get(url, {"page_size": 500})
+                self.assertEqual(response.status_code, 200)
+
+    def test_profile(self):
+        self.assert_budget(reverse("merchant:merchant_profile"), 1)
+        self.assertEqual(self.client.get(reverse("merchant:merchant_profile")).data["balance"], 105)
+
+    def test_transaction_history(self):
+        self.assert_budget(reverse("merchant:merchant_transactions"), 2)
+
+    def test_product_catalog(self):
+        self.assert_budget(reverse("merchant:product_list_all_and_create"), 1)
+
+    def test_catalog_is_served_from_cache(self):
+        url = reverse("merchant:product_list_all_and_create")
+        self.grow(3)
+        first = self.client.get(url, {"page_size": 2})
+        with self.assertNumQueries(0):
+            cached = self.client.get(url, {"page_size": 2})
+        self.assertEqual(cached.content, first.content)
+        self.assertEqual(cached["Link"], first["Link"])
+        self.assertEqual(len(cached.json()), 2)
+
+        product = Product.objects.order_by("-created_at", "-id").first()
+        product.name = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertEqual(self.client.get(url, {"page_size": 2}).json()[0]["name"], "Renamed")
+
+    def test_catalog_revalidates_without_queries(self):
+        url = reverse("merchant:product_list_all_and_create")
+        self.grow(3)
+        response = self.client.get(url)
+        with self.assertNumQueries(0):
+            revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(revalidated.status_code, 304)
+        revalidated = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(revalidated.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.first().delete()
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(len(changed.json()), 2)
+
+    def test_last_modified_comes_from_the_page(self):
+        url = reverse("merchant:product_list_all_and_create")
+        self.grow(3)
+        newest = Product.objects.latest("updated_at").updated_at
+        response = self.client.get(url)
+        self.assertEqual(response["Last-Modified"], http_date(newest.timestamp()))
+        # A rebuild of unchanged products keeps the validator.
+        bump_catalog_version()
+        rebuilt = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(rebuilt.status_code, 304)
+
+    def test_workers_never_share_an_etag_for_different_pages(self):
+        url = reverse("merchant:product_list_all_and_create")
+        self.grow(3)
+        # Two workers with their own LocMem caches, started in the same second.
+        worker_a = LocMemCache("worker-a", {})
+        worker_b = LocMemCache("worker-b", {})
+        for worker in (worker_a, worker_b):
+            worker.set(CATALOG_VERSION_KEY, 1, timeout=None)
+
+        with mock.patch("merchant.catalog.catalog_cache", return_value=worker_a):
+            before = self.client.get(url)
+            product = Product.objects.order_by("-created_at", "-id").first()
+            product.name = "Renamed"
+            with self.captureOnCommitCallbacks(execute=True):
+                product.save()
+            after = self.client.get(url)
+        with mock.patch("merchant.catalog.catalog_cache", return_value=worker_b):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=before["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]["name"], "Renamed")
+        self.assertEqual(response["ETag"], after["ETag"])
+
+    def test_owned_products(self):
+        self.assert_budget(reverse("merchant:merchant_owned_products"), 2)
+
+    def test_product_detail(self):
+        self.grow(1)
+        product = Product.objects.get()
+        url = reverse("merchant:product_detail", args=[product.pk])
+        self.client.get(url)
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.data["owner_username"], "merchant")
+
+        with mock.patch.object(ProductSerializer, "to_representation") as serialize:
+            revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(revalidated.status_code, 304)
+        serialize.assert_not_called()
+
+        product.price = 2
+        product.save()
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200
+        )
+
+
+class ProductSearchTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user("shop", "shop@example.com", "x")
+        Role.objects.create(user=user, type="merchant")
+        cls.user = user
+        owner = MerchantBalance.objects.create(user=user, balance=0)
+        cls.shoe = Product.objects.create(
+            name="Red running shoe", price=10, description="Light trainer", owner=owner
+        )
+        cls.sock = Product.objects.create(
+            name="Wool sock", price=2, description="Goes with any shoe", owner=owner
+        )
+        Product.objects.create(name="Teapot", price=5, description="Ceramic", owner=owner)
+
+    def setUp(self):
+        cache.clear()
+        access = token_for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.url = reverse("merchant:product_search")
+
+    def names(self, **params):
+        return [product["name"] for product in self.client.get(self.url, params).json()]
+
+    def test_name_matches_rank_first(self):
+        self.assertEqual(self.names(q="shoe"), ["Red running shoe", "Wool sock"])
+        self.assertEqual(self.names(q="red sho"), ["Red running shoe"])
+        self.assertEqual(self.names(q="kettle"), [])
+
+    def test_index_follows_writes(self):
+        self.shoe.name = "Blue running boot"
+        self.shoe.save()
+        self.sock.delete()
+        self.assertEqual(self.names(q="shoe"), [])
+        self.assertEqual(self.names(q="boot"), ["Blue running boot"])
+        Product.objects.filter(pk=self.shoe.pk).update(description="Waterproof")
+        self.assertEqual(self.names(q="waterproof"), ["Blue running boot"])
+
+    def test_pages_follow_rank(self):
+        first = self.client.get(self.url, {"q": "shoe", "page_size": 1})
+        self.assertEqual([p["name"] for p in first.json()], ["Red running shoe"])
+        next_url = first["Link"].split(">")[0].lstrip("<")
+        second = self.client.get(next_url)
+        self.assertEqual([p["name"] for p in second.json()], ["Wool sock"])
+        self.assertNotIn("Link", second)
+
+    def test_query_is_required(self):
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"q": '"*'}).json(), [])
+
+
+class CatalogQueryPlanTests(APITestCase):
+    """Every filter/sort combination reads product through an index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user("merchant", "merchant@example.com", "x")
+        owner = MerchantBalance.objects.create(user=user, balance=0)
+        Product.objects.bulk_create(
+            Product(name=f"Product {n}", price=n % 90, description="", owner=owner)
+            for n in range(300)
+        )
+
+    def plan(self, params):
+        request = Request(APIRequestFactory().get("/", params))
+        paginator = KeysetPagination()
+        paginator.ordering = product_ordering(request)
+        products = ProductFilter().filter_queryset(request, Product.objects.all(), None)
+        products = products.order_by(*paginator.ordering)
+        first = products.first()
+        values = [getattr(first, name.lstrip("-")) for name in paginator.ordering]
+        return products.filter(paginator.after(values))[:51].explain()
+
+    def test_filters_and_sorts_use_indexes(self):
+        for sort in PRODUCT_SORTS:
+            for size in range(len(CATALOG_FILTERS) + 1):
+                for names in itertools.combinations(CATALOG_FILTERS, size):
+                    params = {name: CATALOG_FILTERS[name] for name in names}
+                    params["sort"] = sort
+                    with self.subTest(**params):
+                        plan = self.plan(params)
+                        accesses = re.findall(r"(?:SCAN|SEARCH) product\b.*", plan)
+                        self.assertTrue(accesses, plan)
+                        for access in accesses:
+                            self.assertIn("INDEX", access, plan)
+
+    def test_bad_filter_is_rejected(self):
+        user = User.objects.get()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {token_for_user(user).access_token}"
+        )
+        url = reverse("merchant:product_list_all_and_create")
+        self.assertEqual(self.client.get(url, {"sort": "name"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"min_price": "cheap"}).status_code, 400)
+
+
+class ProductImportTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("shop", "shop@example.com", "x")
+        Role.objects.create(user=cls.user, type="merchant")
+        cls.owner = MerchantBalance.objects.create(user=cls.user, balance=0)
+        cls.kettle = Product.objects.create(
+            name="Kettle", price=20, description="Steel", sku="K-1", owner=cls.owner
+        )
+
+    def setUp(self):
+        cache.clear()
+        catalog_cache().clear()
+        access = token_for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.url = reverse("merchant:product_import")
+
+    def test_upsert_by_sku(self):
+        version = catalog_version()
+        rows = [
+            {"sku": "K-1", "name": "Kettle", "description": "Steel", "price": "25.00"},
+            {"sku": "T-1", "name": "Teapot", "description": "Ceramic", "price": "9.50"},
+            {"sku": "T-1", "name": "Teapot again", "description": "", "price": "1"},
+            {"sku": "M-1", "name": "Mug", "description": "", "price": "cheap"},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, rows, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["created"], response.data["updated"]), (1, 1))
+        self.assertEqual([error["row"] for error in response.data["errors"]], [3, 4])
+
+        self.kettle.refresh_from_db()
+        self.assertEqual(self.kettle.price, Decimal("25.00"))
+        self.assertEqual(catalog_version(), version + 1)
+        search = self.client.get(reverse("merchant:product_search"), {"q": "teapot"})
+        self.assertEqual([product["sku"] for product in search.json()], ["T-1"])
+
+    def test_unchanged_rows_are_not_written(self):
+        updated_at = self.kettle.updated_at
+        created, updated, errors = import_products(
+            self.owner, [{"sku": "K-1", "name": "Kettle", "description": "Steel", "price": "20"}]
+        )
+        self.assertEqual((created, updated, errors), (0, 0, []))
+        self.kettle.refresh_from_db()
+        self.assertEqual(self.kettle.updated_at, updated_at)
+
+    def test_queries_per_chunk(self):
+        rows = [
+            {"sku": f"S-{n}", "name": f"Item {n}", "description": "", "price": "1"}
+            for n in range(200)
+        ]
+        # savepoint and release around the import, lookup and insert per chunk of 100
+        with self.assertNumQueries(2 + 2 * 2):
+            import_products(self.owner, rows, chunk_size=100)
+        self.assertEqual(Product.objects.filter(owner=self.owner).count(), 201)
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv") as source:
+            source.write("sku,name,description,price\nK-1,Kettle,Steel,30\nC-1,Cup,,2\n")
+            source.flush()
+            out = StringIO()
+            call_command("import_products", "shop", source.name, stdout=out)
+        self.assertIn("Created 1 product(s), updated 1, 0 row(s) failed.", out.getvalue())
+
+    def test_duplicate_sku_on_create(self):
+        response = self.client.post(
+            reverse("merchant:product_list_all_and_create"),
+            {"name": "Kettle 2", "price": "1", "description": "x", "sku": "K-1"},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("sku", response.data)
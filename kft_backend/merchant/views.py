@@ -1,107 +1,235 @@
-from rest_framework import generics, permissions
-from django.shortcuts import get_object_or_404
-from django.http import Http404
-from .models import Product, MerchantBalance, MerchantTransactionHistory
-from .serializers import (
-    ProductListSerializer,
-    ProductSerializer,
-    MerchantProfileSerializer,
-    MerchantTransactionHistorySerializer,
-)
-from custom_auth.models import Role
-from .permissions import IsProductOwner
-
-# Create your views here.
-
-
-class MerchantProfileView(generics.RetrieveAPIView):
-    """
-    Retrieve the authenticated merchant's profile and balance.
-    """
-
-    serializer_class = MerchantProfileSerializer
-    permission_classes = [permissions.IsAuthenticated]
-
-    def get_object(self):
-        if not Role.objects.filter(user=self.request.user, type="merchant").exists():
-            raise Http404("Merchant profile not found or user is not a merchant.")
-        return self.request.user
-
-
-class MerchantTransactionHistoryView(generics.ListAPIView):
-    """
-    Provides a list of an authenticated merchant's transaction history.
-    """
-
-    serializer_class = MerchantTransactionHistorySerializer
-    permission_classes = [permissions.IsAuthenticated]
-
-    def get_queryset(self):
-        merchant_user = self.request.user
-        if not Role.objects.filter(user=merchant_user, type="merchant").exists():
-            return MerchantTransactionHistory.objects.none()
-
-        try:
-            merchant_balance = MerchantBalance.objects.get(user=merchant_user)
-            return MerchantTransactionHistory.objects.filter(
-                merchant=merchant_balance
-            ).order_by("-created_at")
-        except MerchantBalance.DoesNotExist:
-            return MerchantTransactionHistory.objects.none()
-
-
-class MerchantOwnedProductListView(generics.ListAPIView):
-    """
-    Provides a list of products owned by the authenticated merchant.
-    """
-
-    serializer_class = ProductListSerializer
-    permission_classes = [permissions.IsAuthenticated]
-
-    def get_queryset(self):
-        user = self.request.user
-        if not Role.objects.filter(user=user, type="merchant").exists():
-            return Product.objects.none()
-
-        try:
-            merchant_balance = MerchantBalance.objects.get(user=user)
-            return Product.objects.filter(owner=merchant_balance).order_by(
-                "-created_at"
-            )
-        except MerchantBalance.DoesNotExist:
-            return Product.objects.none()
-
-
-class ProductListCreateView(generics.ListCreateAPIView):
-    """
-    Provides a list of ALL available merchant products (e.g., for consumers or general catalog).
-    Allows authenticated merchants to create new products.
-    """
-
-    queryset = Product.objects.all().order_by("-created_at")
-    permission_classes = [permissions.IsAuthenticated]
-
-    def get_serializer_class(self):
-        if self.request.method == "POST":
-            return ProductSerializer
-        return ProductListSerializer
-
-    def perform_create(self, serializer):
-        if not Role.objects.filter(user=self.request.user, type="merchant").exists():
-            from rest_framework.exceptions import PermissionDenied
-
-            raise PermissionDenied("Only merchants can create products.")
-
-        merchant_balance = get_object_or_404(MerchantBalance, user=self.request.user)
-        serializer.save(owner=merchant_balance)
-
-
-class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
-    """
-    Retrieve, update or delete a product instance.
-    Only the merchant who owns the product can update or delete it.
-    """
-
-    queryset = Product.objects.all()
-    serializer_class = ProductSerializer
-    permission_classes = [permissions.IsAuthenticated, IsProductOwner]
+from decimal import Decimal
+
+from rest_framework import generics, permissions, status
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.contrib.auth.models import User
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.shortcuts import get_object_or_404
+from django.http import Http404
+from django.utils.http import http_date, quote_etag
+from .models import (
+    Product,
+    MerchantBalance,
+    MerchantBalanceShard,
+    MerchantTransactionHistory,
+)
+from .serializers import (
+    ProductListSerializer,
+    ProductSerializer,
+    MerchantProfileSerializer,
+    MerchantTransactionHistorySerializer,
+)
+from custom_auth.authentication import get_roles
+from custom_auth.models import Role
+from custom_auth.permissions import IsMerchant
+from kft_backend.pagination import KeysetPagination
+from kft_backend.uploads import rows_from_request
+from ledger.exports import export_history
+from .catalog import cached_page, conditional_response, page_key
+from .filters import ProductFilter, product_ordering
+from .imports import import_products
+from .search import SearchPagination
+from .permissions import IsProductOwner
+
+# Create your views here.
+
+
+class MerchantProfileView(generics.RetrieveAPIView):
+    """
+    Retrieve the authenticated merchant's profile and balance.
+    """
+
+    serializer_class = MerchantProfileSerializer
+    permission_classes = [permissions.IsAuthenticated, IsMerchant]
+
+    def get_object(self):
+        shard_totals = (
+            MerchantBalanceShard.objects.filter(merchant=OuterRef("pk"))
+            .values("merchant")
+            .annotate(total=Sum("balance"))
+            .values("total")
+        )
+        balances = MerchantBalance.objects.filter(user=OuterRef("pk")).annotate(
+            total=F("balance") + Coalesce(Subquery(shard_totals), Value(Decimal("0.00")))
+        )
+        roles = Role.objects.filter(user=OuterRef("pk"), type="merchant")
+        return get_object_or_404(
+            User.objects.annotate(
+                balance=Subquery(balances.values("total")[:1]),
+                role=Subquery(roles.values("type")[:1]),
+            ),
+            pk=self.request.user.pk,
+        )
+
+
+class MerchantTransactionHistoryView(generics.ListAPIView):
+    """
+    Provides a list of an authenticated merchant's transaction history.
+    """
+
+    serializer_class = MerchantTransactionHistorySerializer
+    permission_classes = [permissions.IsAuthenticated, IsMerchant]
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        merchant_user = self.request.user
+        try:
+            merchant_balance = MerchantBalance.objects.get(user=merchant_user)
+            return MerchantTransactionHistory.objects.filter(
+                merchant=merchant_balance
+            ).order_by("-created_at")
+        except MerchantBalance.DoesNotExist:
+            return MerchantTransactionHistory.objects.none()
+
+
+class MerchantTransactionHistoryExportView(APIView):
+    """
+    Stream an authenticated merchant's full transaction history as CSV or NDJSON.
+    """
+
+    permission_classes = [permissions.IsAuthenticated, IsMerchant]
+
+    def get(self, request, *args, **kwargs):
+        merchant_balance = get_object_or_404(MerchantBalance, user=request.user)
+        return export_history(
+            request,
+            MerchantTransactionHistory.objects.filter(merchant=merchant_balance),
+            f"merchant-transactions-{request.user.username}",
+        )
+
+
+class MerchantOwnedProductListView(generics.ListAPIView):
+    """
+    Provides a list of products owned by the authenticated merchant.
+    Takes the same filter and ?sort= parameters as the catalog.
+    """
+
+    serializer_class = ProductListSerializer
+    permission_classes = [permissions.IsAuthenticated, IsMerchant]
+    pagination_class = KeysetPagination
+    filter_backends = [ProductFilter]
+
+    @property
+    def keyset_ordering(self):
+        return product_ordering(self.request)
+
+    def get_queryset(self):
+        user = self.request.user
+        try:
+            merchant_balance = MerchantBalance.objects.get(user=user)
+            return (
+                Product.objects.filter(owner=merchant_balance)
+                .select_related("owner__user")
+                .order_by("-created_at")
+            )
+        except MerchantBalance.DoesNotExist:
+            return Product.objects.none()
+
+
+class ProductListCreateView(generics.ListCreateAPIView):
+    """
+    Provides a list of ALL available merchant products (e.g., for consumers or general catalog).
+    Allows authenticated merchants to create new products.
+    The list is keyset-paginated and its pages are served pre-rendered
+    from the catalog cache (see merchant.catalog). See merchant.filters
+    for the filter and ?sort= parameters.
+    """
+
+    queryset = Product.objects.select_related("owner__user").order_by("-created_at")
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    filter_backends = [ProductFilter]
+
+    @property
+    def keyset_ordering(self):
+        return product_ordering(self.request)
+
+    def get_serializer_class(self):
+        if self.request.method == "POST":
+            return ProductSerializer
+        return ProductListSerializer
+
+    def list(self, request, *args, **kwargs):
+        return cached_page(request, page_key("catalog", request), self.render_page)
+
+    def render_page(self):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        serializer = self.get_serializer(page, many=True)
+        response = self.get_paginated_response(serializer.data)
+        if page:
+            modified = max(product.updated_at for product in page)
+            response["Last-Modified"] = http_date(modified.timestamp())
+        return response
+
+    def perform_create(self, serializer):
+        if "merchant" not in get_roles(self.request):
+            raise PermissionDenied("Only merchants can create products.")
+
+        merchant_balance = get_object_or_404(MerchantBalance, user=self.request.user)
+        serializer.save(owner=merchant_balance)
+
+
+class ProductImportView(APIView):
+    """
+    Create or update the authenticated merchant's products in bulk from a
+    JSON list body or an uploaded CSV/JSON ``file``, matching on ``sku``.
+    """
+
+    permission_classes = [permissions.IsAuthenticated, IsMerchant]
+    parser_classes = [JSONParser, MultiPartParser]
+
+    def post(self, request, *args, **kwargs):
+        rows = rows_from_request(request)
+        owner = get_object_or_404(MerchantBalance, user=request.user)
+        created, updated, errors = import_products(owner, rows)
+        return Response(
+            {"created": created, "updated": updated, "errors": errors},
+            status=status.HTTP_200_OK
+            if created or updated or not errors
+            else status.HTTP_400_BAD_REQUEST,
+        )
+
+
+class ProductSearchView(generics.ListAPIView):
+    """
+    Ranked full-text search over product names and descriptions, e.g.
+    /api/merchant/products/search/?q=red+shoe. Keyset-paginated by rank.
+    """
+
+    serializer_class = ProductListSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = SearchPagination
+
+    def list(self, request, *args, **kwargs):
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            raise ValidationError({"q": "This query parameter is required."})
+        paginator = self.paginator
+        page = paginator.paginate_search(query, request)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
+    """
+    Retrieve, update or delete a product instance.
+    Only the merchant who owns the product can update or delete it.
+    """
+
+    queryset = Product.objects.select_related("owner__user")
+    serializer_class = ProductSerializer
+    permission_classes = [permissions.IsAuthenticated, IsProductOwner]
+
+    def retrieve(self, request, *args, **kwargs):
+        # Validators come from updated_at, so a 304 skips the serializer.
+        instance = self.get_object()
+        return conditional_response(
+            request,
+            quote_etag(f"{instance.pk}-{instance.updated_at.timestamp()}"),
+            instance.updated_at.timestamp(),
+            lambda: Response(self.get_serializer(instance).data),
+        )